@@ -0,0 +1,44 @@
+"""Add tarifas_minimas_dia (per-day lowest fare index)
+
+Revision ID: 003_add_tarifas_minimas_dia
+Revises: 002_add_reservas_vuelo_amadeus_fields
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '003_add_tarifas_minimas_dia'
+down_revision = '002_add_reservas_vuelo_amadeus_fields'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tarifas_minimas_dia',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('origen', sa.String(length=3), nullable=False),
+        sa.Column('destino', sa.String(length=3), nullable=False),
+        sa.Column('fecha', sa.Date(), nullable=False),
+        sa.Column('adultos', sa.Integer(), nullable=False),
+        sa.Column('ninos', sa.Integer(), nullable=False),
+        sa.Column('bebes', sa.Integer(), nullable=False),
+        sa.Column('clase', sa.String(length=30), nullable=False),
+        sa.Column('precio', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=True),
+        sa.Column('offer_id', sa.String(length=100), nullable=True),
+        sa.Column('observed_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('origen', 'destino', 'fecha', 'adultos', 'ninos', 'bebes', 'clase', name='uq_tarifa_minima_dia'),
+    )
+    op.create_index('idx_tarifa_ruta_clase_fecha', 'tarifas_minimas_dia', ['origen', 'destino', 'clase', 'fecha'])
+    op.create_index('ix_tarifas_minimas_dia_observed_at', 'tarifas_minimas_dia', ['observed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tarifas_minimas_dia_observed_at', table_name='tarifas_minimas_dia')
+    op.drop_index('idx_tarifa_ruta_clase_fecha', table_name='tarifas_minimas_dia')
+    op.drop_table('tarifas_minimas_dia')
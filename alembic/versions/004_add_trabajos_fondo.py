@@ -0,0 +1,45 @@
+"""Add trabajos_fondo (durable background job queue)
+
+Revision ID: 004_add_trabajos_fondo
+Revises: 003_add_tarifas_minimas_dia
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '004_add_trabajos_fondo'
+down_revision = '003_add_tarifas_minimas_dia'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'trabajos_fondo',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=200), nullable=True),
+        sa.Column('intentos', sa.Integer(), nullable=False),
+        sa.Column('max_intentos', sa.Integer(), nullable=False),
+        sa.Column('disponible_en', sa.DateTime(), nullable=False),
+        sa.Column('bloqueado_por', sa.String(length=100), nullable=True),
+        sa.Column('bloqueado_hasta', sa.DateTime(), nullable=True),
+        sa.Column('ultimo_error', sa.Text(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(), nullable=False),
+        sa.Column('fecha_actualizacion', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key'),
+    )
+    op.create_index('idx_trabajo_estado_disponible', 'trabajos_fondo', ['estado', 'disponible_en'])
+    op.create_index('idx_trabajo_tipo_estado', 'trabajos_fondo', ['tipo', 'estado'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_trabajo_tipo_estado', table_name='trabajos_fondo')
+    op.drop_index('idx_trabajo_estado_disponible', table_name='trabajos_fondo')
+    op.drop_table('trabajos_fondo')
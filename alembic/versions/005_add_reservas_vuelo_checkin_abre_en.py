@@ -0,0 +1,27 @@
+"""Add reservas_vuelo.checkin_abre_en (indexed check-in open time)
+
+Revision ID: 005_add_reservas_vuelo_checkin_abre_en
+Revises: 004_add_trabajos_fondo
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '005_add_reservas_vuelo_checkin_abre_en'
+down_revision = '004_add_trabajos_fondo'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('reservas_vuelo', sa.Column('checkin_abre_en', sa.DateTime(), nullable=True))
+    op.create_index('idx_reserva_estado_checkin', 'reservas_vuelo', ['estado', 'checkin_abre_en'])
+    # Las reservas existentes se rellenan de forma incremental desde el monitor de auto-checkin
+
+
+def downgrade() -> None:
+    op.drop_index('idx_reserva_estado_checkin', table_name='reservas_vuelo')
+    op.drop_column('reservas_vuelo', 'checkin_abre_en')
@@ -1,8 +1,11 @@
 import os
 import json
+import asyncio
+import concurrent.futures
 import logging
 import time
 import threading
+import atexit
 import requests
 import re
 from decimal import Decimal
@@ -17,10 +20,22 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from psycopg2.extras import RealDictCursor
 from core.scraper_motor import MotorBusqueda
+from core.duffel_async import MotorBusquedaAsync
+from core.rate_budget import prioridad, PRIORIDAD_INTERACTIVA, PRIORIDAD_SEGUNDO_PLANO
+from core.offer_model import ModeloCompacto, offer_blobs
+from core.fare_index import indice_tarifas
+from core.calendar_refresh import PlanificadorCalendario
+from core.scheduler_leader import scheduler_coordinator
+from core.job_queue import cola_trabajos
 from core.amadeus_adapter import AmadeusAdapter
 from core.email_utils import EmailManager
 from core.nomad_optimizer import NomadOptimizer
-from core.autocomplete_i18n import construir_terminos_busqueda, buscar_fallback_es
+from core.autocomplete_i18n import indice_aeropuertos
+from core.autocomplete_pipeline import PipelineAutocompletado
+from core.tour_facets import facetas_tours, registrar_eventos as registrar_eventos_facetas
+from core.tours_pagination import (
+    CursorInvalido, claves_orden, codificar_cursor, contador_tours, decodificar_cursor, huella_filtros, pagina_keyset
+)
 from core.feature_flags import is_feature_enabled, parse_rollout_percentage, get_rollout_bucket
 # ==========================================
 # IMPORTS ADICIONALES PARA MODERNIZACIÓN
@@ -45,15 +60,21 @@ except ImportError:
 # 0. INICIALIZACIÓN GLOBAL
 # ==========================================
 motor = MotorBusqueda()
-amadeus_motor = AmadeusAdapter()
+motor_async = MotorBusquedaAsync(motor)  # Fan-out concurrente (calendario, lotes) sobre el mismo estado/caché
+amadeus_motor = AmadeusAdapter()  # Compartido por todas las rutas /api/amadeus/* (token OAuth reutilizado)
 email_manager = EmailManager()
 nomad_optimizer = NomadOptimizer(motor)
+autocompletado_remoto = PipelineAutocompletado(motor.autocompletar_aeropuerto)  # Duffel cacheado, solo si el índice local no sabe
+registrar_eventos_facetas()  # Commits que cambian tours -> recálculo de facetas en segundo plano
 # CUSTOM JSON PROVIDER FOR DECIMAL
 # ==========================================
 class CustomJSONProvider(DefaultJSONProvider):
     def default(self, obj):
         if isinstance(obj, Decimal):
             return float(obj)
+        if isinstance(obj, ModeloCompacto):
+            # Ofertas compactas de la caché: formato JSON de siempre solo en el borde de la respuesta
+            return obj.to_dict()
         return super().default(obj)
 
 # ==========================================
@@ -88,10 +109,30 @@ CALENDAR_PRICE_CACHE_TTL = int(os.getenv('CALENDAR_PRICE_CACHE_TTL_SECONDS', '86
 CALENDAR_REFRESH_HOUR = int(os.getenv('CALENDAR_REFRESH_HOUR_UTC', '3'))
 CALENDAR_REFRESH_MINUTE = int(os.getenv('CALENDAR_REFRESH_MINUTE_UTC', '15'))
 CALENDAR_ENABLE_DAILY_REFRESH = os.getenv('CALENDAR_ENABLE_DAILY_REFRESH', 'true').lower() == 'true'
+# Refresco incremental continuo (sustituye al diario en bloque salvo que se desactive)
+CALENDAR_INCREMENTAL_REFRESH_ENABLED = os.getenv('CALENDAR_INCREMENTAL_REFRESH_ENABLED', 'true').lower() == 'true'
 CALENDAR_PREWARM_ROUTES = os.getenv('CALENDAR_PREWARM_ROUTES', '')
 CALENDAR_PREWARM_TOP_ROUTES_LIMIT = int(os.getenv('CALENDAR_PREWARM_TOP_ROUTES_LIMIT', '40'))
 CALENDAR_TRACKED_ROUTES = set()
 CALENDAR_TRACKED_ROUTES_LOCK = threading.Lock()
+CALENDAR_BUILD_CONCURRENCY = int(os.getenv('CALENDAR_BUILD_CONCURRENCY', '6'))
+CALENDAR_BUILD_DEADLINE_SECONDS = float(os.getenv('CALENDAR_BUILD_DEADLINE_SECONDS', '8'))
+CALENDAR_PARTIAL_CACHE_TTL = int(os.getenv('CALENDAR_PARTIAL_CACHE_TTL_SECONDS', '300'))
+# Stale-while-revalidate: un mes caducado se sirve durante este margen mientras se reconstruye en segundo plano
+CALENDAR_STALE_GRACE_SECONDS = int(os.getenv('CALENDAR_STALE_GRACE_SECONDS', '21600'))
+CALENDAR_NEGATIVE_CACHE_TTL = int(os.getenv('CALENDAR_NEGATIVE_CACHE_TTL_SECONDS', '30'))
+# Índice de tarifas: antigüedad máxima para dar un día por bueno sin volver a buscarlo, y rango máximo por consulta
+CALENDAR_INDEX_MAX_AGE_SECONDS = int(os.getenv('CALENDAR_INDEX_MAX_AGE_SECONDS', str(CALENDAR_PRICE_CACHE_TTL)))
+CALENDAR_MAX_RANGE_DAYS = int(os.getenv('CALENDAR_MAX_RANGE_DAYS', '93'))
+CALENDAR_BUILDS_IN_FLIGHT = {}
+CALENDAR_BUILDS_LOCK = threading.Lock()
+# Prewarm de búsquedas: combinaciones con más probabilidad de buscarse en la próxima hora (historial DuffelSearch)
+FLIGHT_PREWARM_ENABLED = os.getenv('FLIGHT_PREWARM_ENABLED', 'true').lower() == 'true'
+FLIGHT_PREWARM_INTERVAL_MINUTES = int(os.getenv('FLIGHT_PREWARM_INTERVAL_MINUTES', '15'))
+FLIGHT_PREWARM_TOP_QUERIES = int(os.getenv('FLIGHT_PREWARM_TOP_QUERIES', '30'))
+FLIGHT_PREWARM_HISTORY_DAYS = int(os.getenv('FLIGHT_PREWARM_HISTORY_DAYS', '14'))
+FLIGHT_PREWARM_TIMEOUT_SECONDS = float(os.getenv('FLIGHT_PREWARM_TIMEOUT_SECONDS', '240'))
+FLIGHT_PREWARM_STATS = {'runs': 0, 'last_run': None, 'queries': 0, 'warmed': 0, 'skipped_rate_limit': 0}
 
 # 🔒 Rate Limiting Configuration
 limiter = Limiter(
@@ -124,6 +165,10 @@ DUFFEL_ENVIRONMENT = "live"
 DUFFEL_DASHBOARD_URL = f"https://app.duffel.com/{DUFFEL_ACCOUNT_ID}/{DUFFEL_ENVIRONMENT}/orders"
 AUTO_CHECKIN_ENABLED = os.getenv('AUTO_CHECKIN_ENABLED', 'true').lower() == 'true'
 AUTO_CHECKIN_SCAN_MINUTES = int(os.getenv('AUTO_CHECKIN_SCAN_MINUTES', '15'))
+AUTO_CHECKIN_PAGE_SIZE = int(os.getenv('AUTO_CHECKIN_PAGE_SIZE', '200'))
+AUTO_CHECKIN_MAX_PAGES = int(os.getenv('AUTO_CHECKIN_MAX_PAGES', '25'))
+# Último id revisado al rellenar checkin_abre_en en reservas anteriores a la columna
+_auto_checkin_backfill_last_id = 0
 DUFFEL_PRIORITY_DELTA_PERCENT = float(os.getenv('DUFFEL_PRIORITY_DELTA_PERCENT', '5'))
 SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', '10'))
 
@@ -294,27 +339,23 @@ def autocomplete_api():
     if not termino or len(termino) < 2:
         return jsonify([])
 
-    sugerencias = []
-    
-    # 1. Intentar con Duffel (Prioridad)
-    if MotorBusqueda:
-        search_terms = construir_terminos_busqueda(termino)
+    # 1. Índice local en memoria (aeropuertos/ciudades precargados, sin red)
+    sugerencias = indice_aeropuertos.buscar(termino)
+    if sugerencias:
+        return jsonify(sugerencias)
 
-        for term in search_terms:
-            try:
-                logger.info(f"🔮 Autocomplete API: Intentando buscar '{term}' con Duffel...")
-                # motor = MotorBusqueda() (YA GLOBAL)
-                sugerencias = motor.autocompletar_aeropuerto(term)
-                logger.info(f"🔮 Duffel devolvió: {len(sugerencias) if sugerencias else 0} resultados")
-                if sugerencias:
-                    return jsonify(sugerencias)
-            except Exception as e:
-                logger.error(f"❌ Error en Autocomplete API: {e}")
+    # 2. Duffel solo para lo que el índice local no conoce (expansiones en paralelo + caché por prefijo)
+    sugerencias = autocompletado_remoto.sugerir(termino)
+    if sugerencias:
+        return jsonify(sugerencias)
+
+    # 3. Último recurso: corrección de erratas contra el índice local
+    sugerencias = indice_aeropuertos.corregir(termino)
+    if sugerencias:
+        return jsonify(sugerencias)
 
-    # 2. Fallback local mejorado (ES/EN)
-    resultados_fallback = buscar_fallback_es(termino)
-    logger.info(f"📍 Autocomplete fallback local: {len(resultados_fallback)} resultados para '{termino}'")
-    return jsonify(resultados_fallback)
+    logger.info(f"📍 Autocomplete: sin resultados para '{termino}'")
+    return jsonify([])
 
 @app.route('/api/buscar-vuelos', methods=['POST'])
 @limiter.limit("10 per minute")
@@ -461,7 +502,12 @@ def buscar_vuelos_api():
 @app.route('/api/precios-calendario', methods=['GET'])
 @limiter.limit("30 per minute")
 def precios_calendario_api():
-    """Devuelve precio mínimo por día para un mes (formato YYYY-MM-DD -> precio)."""
+    """
+    Devuelve precio mínimo por día (formato YYYY-MM-DD -> precio) para un mes (year/month)
+    o un rango arbitrario (desde/hasta, YYYY-MM-DD), con la antigüedad de cada día en `freshness`.
+    Responde desde el índice persistente de tarifas; solo los días sin observación reciente
+    pasan por la caché de calendario / búsquedas en Duffel.
+    """
     if motor is None or not DUFFEL_TOKEN:
         return jsonify({'error': 'Motor de búsqueda no disponible'}), 503
 
@@ -469,15 +515,26 @@ def precios_calendario_api():
     destino = (request.args.get('destino') or '').strip().upper()
     year_raw = request.args.get('year')
     month_raw = request.args.get('month')
+    desde_raw = request.args.get('desde')
+    hasta_raw = request.args.get('hasta')
 
     if len(origen) != 3 or len(destino) != 3:
         return jsonify({'prices': {}})
 
+    year = month = None
     try:
-        year = int(year_raw)
-        month = int(month_raw)
-        if month < 1 or month > 12:
-            raise ValueError('Mes inválido')
+        if desde_raw or hasta_raw:
+            desde = datetime.strptime(desde_raw or hasta_raw, '%Y-%m-%d').date()
+            hasta = datetime.strptime(hasta_raw or desde_raw, '%Y-%m-%d').date()
+            if hasta < desde or (hasta - desde).days + 1 > CALENDAR_MAX_RANGE_DAYS:
+                raise ValueError('Rango inválido')
+            days = _calendar_range_days(desde, hasta)
+        else:
+            year = int(year_raw)
+            month = int(month_raw)
+            if month < 1 or month > 12:
+                raise ValueError('Mes inválido')
+            days = _calendar_month_days(year, month)
     except Exception:
         return jsonify({'error': 'Parámetros de fecha inválidos'}), 400
 
@@ -486,18 +543,61 @@ def precios_calendario_api():
     bebes = int(request.args.get('bebes', 0) or 0)
     clase = (request.args.get('clase') or 'economy').strip().lower()
 
-    _register_calendar_route(origen, destino, adultos, ninos, bebes, clase)
+    if not days:
+        return jsonify({'prices': {}, 'freshness': {}, 'cached': True, 'partial': False})
 
-    cache_key = _calendar_query_key(origen, destino, year, month, adultos, ninos, bebes, clase)
+    _register_calendar_route(origen, destino, adultos, ninos, bebes, clase)
 
-    cached_prices = _get_calendar_prices_from_cache(cache_key)
-    if cached_prices is not None:
-        return jsonify({'prices': cached_prices, 'cached': True})
+    indexados = indice_tarifas.consultar(origen, destino, days[0], days[-1], adultos, ninos, bebes, clase)
+    faltan = [d for d in days if indexados.get(d, {}).get('age_seconds', CALENDAR_INDEX_MAX_AGE_SECONDS) >= CALENDAR_INDEX_MAX_AGE_SECONDS]
+
+    respuesta = {'cached': True, 'partial': False}
+    complementarios = {}
+    if faltan and year is not None:
+        cache_key = _calendar_query_key(origen, destino, year, month, adultos, ninos, bebes, clase)
+        cached_prices, stale = _get_calendar_prices_from_cache(cache_key)
+        # Los días frescos del índice no se vuelven a buscar; entran en el mes cacheado tal cual
+        conocidos = {d: int(v['precio']) for d, v in indexados.items() if d not in faltan}
+        if cached_prices is not None:
+            if stale:
+                # Se sirve lo cacheado y el mes se reconstruye en segundo plano (una sola construcción por clave)
+                _start_calendar_build(
+                    cache_key, origen, destino, year, month, adultos, ninos, bebes, clase,
+                    prioridad_nombre=PRIORIDAD_SEGUNDO_PLANO, days=faltan, base=conocidos
+                )
+            complementarios = cached_prices
+            respuesta['stale'] = stale
+        else:
+            # Fan-out concurrente con deadline sobre los días que faltan: si no termina a tiempo se
+            # devuelve lo disponible y el resto se completa en segundo plano (y se cachea el mes)
+            complementarios, partial = _build_calendar_prices(
+                origen, destino, year, month, adultos, ninos, bebes, clase,
+                deadline=CALENDAR_BUILD_DEADLINE_SECONDS, days=faltan, base=conocidos
+            )
+            respuesta.update({'cached': False, 'partial': partial})
+    elif faltan:
+        # Rango libre: solo se buscan los días sin observación reciente (el índice los persiste)
+        complementarios, partial = _build_calendar_prices(
+            origen, destino, None, None, adultos, ninos, bebes, clase,
+            deadline=CALENDAR_BUILD_DEADLINE_SECONDS, days=faltan
+        )
+        respuesta.update({'cached': False, 'partial': partial})
+        indexados = indice_tarifas.consultar(origen, destino, days[0], days[-1], adultos, ninos, bebes, clase)
 
-    prices = _build_calendar_prices(origen, destino, year, month, adultos, ninos, bebes, clase)
-    _set_calendar_prices_cache(cache_key, prices)
+    prices = {}
+    freshness = {}
+    for dia in days:
+        indexado = indexados.get(dia)
+        # Observación reciente del índice > caché/construcción del calendario > observación antigua del índice
+        if indexado is not None and (indexado['age_seconds'] < CALENDAR_INDEX_MAX_AGE_SECONDS or dia not in complementarios):
+            prices[dia] = int(indexado['precio'])
+            freshness[dia] = {'observed_at': indexado['observed_at'], 'age_seconds': indexado['age_seconds']}
+        elif dia in complementarios:
+            prices[dia] = complementarios[dia]
+            freshness[dia] = None
 
-    return jsonify({'prices': prices, 'cached': False})
+    respuesta.update({'prices': prices, 'freshness': freshness})
+    return jsonify(respuesta)
 
 
 def _calendar_query_key(origen, destino, year, month, adultos, ninos, bebes, clase):
@@ -526,7 +626,8 @@ def _register_calendar_route(origen, destino, adultos, ninos, bebes, clase):
 
 
 def _load_top_calendar_routes_from_history(limit=40):
-    routes = set()
+    """Rutas más buscadas en 30 días: {(origen, destino, 1, 0, 0, 'economy'): búsquedas}."""
+    routes = {}
 
     if limit <= 0:
         return routes
@@ -555,7 +656,8 @@ def _load_top_calendar_routes_from_history(limit=40):
                 origen = (item.origen or '').strip().upper()
                 destino = (item.destino or '').strip().upper()
                 if len(origen) == 3 and len(destino) == 3:
-                    routes.add((origen, destino, 1, 0, 0, 'economy'))
+                    route = (origen, destino, 1, 0, 0, 'economy')
+                    routes[route] = routes.get(route, 0) + int(item.total or 0)
         finally:
             db.close()
     except Exception as err:
@@ -572,6 +674,31 @@ def _list_tracked_calendar_routes():
     return observed.union(seeded).union(top_history)
 
 
+def _calendar_route_demand():
+    """Rutas seguidas con su demanda (búsquedas en 30 días; las observadas o sembradas sin historial cuentan 0)."""
+    with CALENDAR_TRACKED_ROUTES_LOCK:
+        demanda = {route: 0 for route in CALENDAR_TRACKED_ROUTES}
+    for route in _parse_seeded_calendar_routes():
+        demanda.setdefault(route, 0)
+    demanda.update(_load_top_calendar_routes_from_history(CALENDAR_PREWARM_TOP_ROUTES_LIMIT))
+    return demanda
+
+
+calendar_refresher = PlanificadorCalendario(
+    motor_async,
+    indice_tarifas,
+    _calendar_route_demand,
+    max_age_seconds=CALENDAR_INDEX_MAX_AGE_SECONDS
+)
+
+
+def refresh_calendar_incremental():
+    """Tick del refresco incremental del calendario (cada minuto, presupuesto CALENDAR_REFRESH_CALLS_PER_MINUTE)."""
+    if motor is None or not DUFFEL_TOKEN:
+        return
+    calendar_refresher.tick()
+
+
 def _extract_flight_price(value):
     if isinstance(value, (int, float)):
         return float(value)
@@ -588,28 +715,60 @@ def _extract_flight_price(value):
     return None
 
 
-def _build_calendar_prices(origen, destino, year, month, adultos, ninos, bebes, clase):
+def _calendar_month_days(year, month):
+    """Días del mes (YYYY-MM-DD) desde hoy en adelante."""
     first_day = datetime(year, month, 1)
     next_month = datetime(year + (1 if month == 12 else 0), 1 if month == 12 else month + 1, 1)
-    last_day = next_month - timedelta(days=1)
     today = datetime.now().date()
 
-    prices = {}
+    days = []
     cursor = first_day
+    while cursor < next_month:
+        if cursor.date() >= today:
+            days.append(cursor.date().isoformat())
+        cursor += timedelta(days=1)
+    return days
+
+
+def _calendar_range_days(desde, hasta):
+    """Días (YYYY-MM-DD) del rango [desde, hasta] desde hoy en adelante."""
+    cursor = max(desde, datetime.now().date())
+    days = []
+    while cursor <= hasta:
+        days.append(cursor.isoformat())
+        cursor += timedelta(days=1)
+    return days
 
-    while cursor <= last_day:
-        fecha_date = cursor.date()
-        if fecha_date >= today:
-            fecha_iso = fecha_date.isoformat()
-            try:
-                if hasattr(motor, 'is_rate_limited') and motor.is_rate_limited():
-                    remaining = motor.get_rate_limit_remaining_seconds() if hasattr(motor, 'get_rate_limit_remaining_seconds') else 0
-                    logger.warning(
-                        f"⏳ Calendario detenido temporalmente por rate limit de Duffel ({remaining}s restantes) para {origen}->{destino}"
-                    )
-                    break
 
-                resultados = motor.buscar_vuelos(
+def _min_calendar_price(resultados):
+    if not isinstance(resultados, list) or not resultados:
+        return None
+    precios_validos = []
+    for vuelo in resultados:
+        precio = _extract_flight_price(vuelo.get('precio'))
+        if precio is not None:
+            precios_validos.append(precio)
+    return int(min(precios_validos)) if precios_validos else None
+
+
+async def _build_calendar_prices_async(origen, destino, days, adultos, ninos, bebes, clase, prices,
+                                       prioridad_nombre=PRIORIDAD_INTERACTIVA):
+    """
+    Rellena `prices` (fecha -> precio mínimo) con concurrencia acotada.
+    Deja de lanzar días en cuanto Duffel entra en cooldown. Retorna True si se detuvo por rate limit.
+    Las llamadas consumen del presupuesto Duffel con `prioridad_nombre` (heredada por las subtareas).
+    """
+    semaforo = asyncio.Semaphore(CALENDAR_BUILD_CONCURRENCY)
+    estado = {'rate_limited': False}
+
+    async def _precio_dia(fecha_iso):
+        async with semaforo:
+            # is_rate_limited consulta el cooldown en Redis: fuera del loop compartido
+            if estado['rate_limited'] or await motor_async._en_hilo(motor.is_rate_limited):
+                estado['rate_limited'] = True
+                return
+            try:
+                resultados = await motor_async.buscar_vuelos(
                     origen,
                     destino,
                     fecha_iso,
@@ -618,51 +777,162 @@ def _build_calendar_prices(origen, destino, year, month, adultos, ninos, bebes,
                     bebes=bebes,
                     clase=clase
                 )
-
-                if isinstance(resultados, list) and resultados:
-                    precios_validos = []
-                    for vuelo in resultados:
-                        precio = _extract_flight_price(vuelo.get('precio'))
-                        if precio is not None:
-                            precios_validos.append(precio)
-
-                    if precios_validos:
-                        prices[fecha_iso] = int(min(precios_validos))
+                precio = _min_calendar_price(resultados)
+                if precio is not None:
+                    prices[fecha_iso] = precio
             except Exception as err:
                 logger.warning(f"⚠️ Error precio calendario {origen}->{destino} {fecha_iso}: {err}")
 
-        cursor += timedelta(days=1)
+    with prioridad(prioridad_nombre):
+        await asyncio.gather(*(_precio_dia(fecha_iso) for fecha_iso in days))
+
+    if estado['rate_limited']:
+        remaining = await motor_async._en_hilo(motor.get_rate_limit_remaining_seconds)
+        logger.warning(
+            f"⏳ Calendario detenido temporalmente por rate limit de Duffel ({remaining}s restantes) para {origen}->{destino}"
+        )
+    return estado['rate_limited']
+
+
+def _start_calendar_build(cache_key, origen, destino, year, month, adultos, ninos, bebes, clase,
+                          prioridad_nombre=PRIORIDAD_INTERACTIVA, days=None, base=None):
+    """
+    Lanza la construcción del mes en el loop de fondo de motor_async (o reutiliza la que ya esté en curso).
+    Con `days` solo se buscan esos días. Al terminar, un mes (year/month) se guarda en la caché de
+    calendario junto con `base` (precios ya conocidos) aunque nadie esté esperando; los rangos
+    libres no se cachean, ya quedan en el índice de tarifas.
+    """
+    with CALENDAR_BUILDS_LOCK:
+        build = CALENDAR_BUILDS_IN_FLIGHT.get(cache_key)
+        if build is not None:
+            return build
+
+        prices = {}
+        future = motor_async.lanzar(
+            _build_calendar_prices_async(
+                origen, destino, days if days is not None else _calendar_month_days(year, month),
+                adultos, ninos, bebes, clase, prices,
+                prioridad_nombre=prioridad_nombre
+            )
+        )
+        build = {'prices': prices, 'future': future}
+        CALENDAR_BUILDS_IN_FLIGHT[cache_key] = build
+
+    def _on_done(fut):
+        with CALENDAR_BUILDS_LOCK:
+            CALENDAR_BUILDS_IN_FLIGHT.pop(cache_key, None)
+        try:
+            rate_limited = fut.result()
+        except Exception as err:
+            logger.warning(f"⚠️ Error construyendo calendario {cache_key}: {err}")
+            rate_limited = True
+        if year is None:
+            return
+
+        nuevos = {**(base or {}), **prices}
+        if rate_limited or not nuevos:
+            anteriores, _ = _get_calendar_prices_from_cache(cache_key)
+            if anteriores:
+                if not nuevos:
+                    # Un refresco fallido no sustituye la entrada stale que se está sirviendo
+                    return
+                nuevos = {**anteriores, **nuevos}
+        # Un mes incompleto por rate limit se cachea poco tiempo para reintentarlo pronto
+        _set_calendar_prices_cache(
+            cache_key,
+            nuevos,
+            ttl=CALENDAR_PARTIAL_CACHE_TTL if rate_limited else None
+        )
 
-    return prices
+    future.add_done_callback(_on_done)
+    return build
+
+
+def _build_calendar_prices(origen, destino, year, month, adultos, ninos, bebes, clase, deadline=None,
+                           prioridad_nombre=PRIORIDAD_INTERACTIVA, days=None, base=None):
+    """
+    Construye los precios del mes (o solo de `days`) con fan-out concurrente.
+    Retorna (prices, partial) con los días buscados: partial=True si venció el deadline o Duffel
+    cortó por rate limit. Con deadline=None espera a que termine la construcción completa.
+    """
+    if year is not None:
+        cache_key = _calendar_query_key(origen, destino, year, month, adultos, ninos, bebes, clase)
+        etiqueta = f"{year}-{month:02d}"
+    else:
+        cache_key = _calendar_query_key(origen, destino, days[0], days[-1], adultos, ninos, bebes, clase)
+        etiqueta = f"{days[0]}..{days[-1]}"
+    build = _start_calendar_build(
+        cache_key, origen, destino, year, month, adultos, ninos, bebes, clase,
+        prioridad_nombre=prioridad_nombre, days=days, base=base
+    )
+
+    try:
+        rate_limited = build['future'].result(timeout=deadline)
+    except concurrent.futures.TimeoutError:
+        prices = dict(build['prices'])
+        logger.info(
+            f"⏱️ Calendario {origen}->{destino} {etiqueta}: deadline {deadline}s, "
+            f"{len(prices)} días listos, resto en segundo plano"
+        )
+        return prices, True
+    except Exception as err:
+        logger.warning(f"⚠️ Error construyendo calendario {origen}->{destino}: {err}")
+        return dict(build['prices']), True
+
+    return dict(build['prices']), bool(rate_limited)
 
 
 def _get_calendar_prices_from_cache(cache_key):
+    """
+    Retorna (prices, stale). prices=None si no hay entrada utilizable; stale=True si la entrada
+    ya caducó pero sigue dentro de CALENDAR_STALE_GRACE_SECONDS (solo entradas con precios).
+    """
+    entradas = []
     redis_key = _calendar_redis_key(cache_key)
     if shared_redis_cache and getattr(shared_redis_cache, 'available', False):
         try:
             cached = shared_redis_cache.get(redis_key)
             if isinstance(cached, dict):
-                return cached
+                if 'prices' not in cached or 'ts' not in cached:
+                    return cached, False  # Formato anterior (solo fecha -> precio)
+                entradas.append(cached)
         except Exception as err:
             logger.warning(f"⚠️ Error leyendo caché Redis calendario: {err}")
 
-    now_ts = time.time()
     cached_local = CALENDAR_PRICE_CACHE.get(cache_key)
-    if cached_local and (now_ts - cached_local['ts']) < CALENDAR_PRICE_CACHE_TTL:
-        return cached_local['prices']
-
-    return None
+    if cached_local:
+        entradas.append(cached_local)
 
+    now_ts = time.time()
+    stale_prices = None
+    for entrada in entradas:
+        edad = now_ts - entrada['ts']
+        ttl = entrada.get('ttl', CALENDAR_PRICE_CACHE_TTL)
+        if edad < ttl:
+            return entrada['prices'], False
+        if stale_prices is None and entrada['prices'] and edad < ttl + CALENDAR_STALE_GRACE_SECONDS:
+            stale_prices = entrada['prices']
+
+    return stale_prices, stale_prices is not None
+
+
+def _set_calendar_prices_cache(cache_key, prices, ttl=None):
+    # Un mes sin ningún precio (errores / 429) se recuerda poco tiempo y sin margen stale
+    if prices:
+        ttl = ttl or CALENDAR_PRICE_CACHE_TTL
+        ttl_almacen = ttl + CALENDAR_STALE_GRACE_SECONDS
+    else:
+        ttl = ttl_almacen = min(ttl or CALENDAR_NEGATIVE_CACHE_TTL, CALENDAR_NEGATIVE_CACHE_TTL)
 
-def _set_calendar_prices_cache(cache_key, prices):
+    entrada = {'ts': time.time(), 'prices': prices, 'ttl': ttl}
     redis_key = _calendar_redis_key(cache_key)
     if shared_redis_cache and getattr(shared_redis_cache, 'available', False):
         try:
-            shared_redis_cache.set(redis_key, prices, ttl=CALENDAR_PRICE_CACHE_TTL)
+            shared_redis_cache.set(redis_key, entrada, ttl=ttl_almacen)
         except Exception as err:
             logger.warning(f"⚠️ Error guardando caché Redis calendario: {err}")
 
-    CALENDAR_PRICE_CACHE[cache_key] = {'ts': time.time(), 'prices': prices}
+    CALENDAR_PRICE_CACHE[cache_key] = entrada
 
 
 def refresh_calendar_prices_daily():
@@ -686,13 +956,156 @@ def refresh_calendar_prices_daily():
 
     for (origen, destino, adultos, ninos, bebes, clase) in routes:
         for (year, month) in targets:
-            cache_key = _calendar_query_key(origen, destino, year, month, adultos, ninos, bebes, clase)
-            prices = _build_calendar_prices(origen, destino, year, month, adultos, ninos, bebes, clase)
-            _set_calendar_prices_cache(cache_key, prices)
+            # Espera el mes completo; el resultado se guarda en caché al terminar la construcción.
+            # Prioridad baja: solo consume presupuesto Duffel que no necesite el tráfico interactivo
+            _build_calendar_prices(
+                origen, destino, year, month, adultos, ninos, bebes, clase,
+                prioridad_nombre=PRIORIDAD_SEGUNDO_PLANO
+            )
 
     logger.info("✅ Refresh diario de calendario completado")
 
 
+def _predict_prewarm_flight_queries(limit, now=None):
+    """
+    Combinaciones (ruta, fecha, pasajeros, clase) con más probabilidad de buscarse en la próxima hora.
+    Puntuación sobre el historial de DuffelSearch: total de búsquedas + peso extra a las de las
+    últimas 24h y a las hechas en la misma franja horaria (hora actual y siguiente, UTC).
+    """
+    if limit <= 0:
+        return []
+
+    now = now or datetime.utcnow()
+    hoy = now.date()
+    franja = [now.hour, (now.hour + 1) % 24]
+    scores = {}
+
+    try:
+        from sqlalchemy import case, extract, func
+        from database import DuffelSearch, get_db_session
+
+        db = get_db_session()
+        try:
+            rows = (
+                db.query(
+                    DuffelSearch.origen,
+                    DuffelSearch.destino,
+                    DuffelSearch.fecha,
+                    DuffelSearch.adultos,
+                    DuffelSearch.ninos,
+                    DuffelSearch.bebes,
+                    DuffelSearch.clase,
+                    func.count(DuffelSearch.id).label('total'),
+                    func.sum(case((DuffelSearch.fecha_creacion >= now - timedelta(hours=24), 1), else_=0)).label('recientes'),
+                    func.sum(case((extract('hour', DuffelSearch.fecha_creacion).in_(franja), 1), else_=0)).label('franja'),
+                )
+                .filter(DuffelSearch.fecha_creacion >= now - timedelta(days=FLIGHT_PREWARM_HISTORY_DAYS))
+                .group_by(
+                    DuffelSearch.origen, DuffelSearch.destino, DuffelSearch.fecha,
+                    DuffelSearch.adultos, DuffelSearch.ninos, DuffelSearch.bebes, DuffelSearch.clase
+                )
+                .all()
+            )
+        finally:
+            db.close()
+    except Exception as err:
+        logger.warning(f"⚠️ No se pudo cargar historial para prewarm de búsquedas: {err}")
+        return []
+
+    for row in rows:
+        origen = (row.origen or '').strip().upper()
+        destino = (row.destino or '').strip().upper()
+        fecha = motor._normalizar_fecha((row.fecha or '').strip()) if row.fecha else None
+        if len(origen) != 3 or len(destino) != 3 or not fecha:
+            continue
+        try:
+            if datetime.strptime(fecha, '%Y-%m-%d').date() < hoy:
+                continue
+        except ValueError:
+            continue
+
+        # Mismo formato de clave que buscar_vuelos (fechas DD/MM/YYYY y YYYY-MM-DD se agregan juntas)
+        consulta = (origen, destino, fecha, int(row.adultos or 1), int(row.ninos or 0), int(row.bebes or 0),
+                    (row.clase or 'economy').strip().lower())
+        score = int(row.total or 0) + 2 * int(row.recientes or 0) + 3 * int(row.franja or 0)
+        scores[consulta] = scores.get(consulta, 0) + score
+
+    top = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [
+        {
+            'origen': origen, 'destino': destino, 'fecha': fecha,
+            'adultos': adultos, 'ninos': ninos, 'bebes': bebes, 'clase': clase
+        }
+        for (origen, destino, fecha, adultos, ninos, bebes, clase), _score in top
+    ]
+
+
+def prewarm_flight_searches():
+    """Precalienta la caché de búsquedas con las consultas previstas para la próxima hora."""
+    if motor is None or not DUFFEL_TOKEN:
+        return
+
+    if motor.is_rate_limited():
+        FLIGHT_PREWARM_STATS['skipped_rate_limit'] += 1
+        logger.info("⏳ Prewarm de búsquedas omitido: Duffel en cooldown")
+        return
+
+    consultas = _predict_prewarm_flight_queries(FLIGHT_PREWARM_TOP_QUERIES)
+    if not consultas:
+        logger.info("ℹ️ Prewarm de búsquedas: sin historial suficiente")
+        return
+
+    async def _lote():
+        # Prioridad baja: las entradas ya en caché no llaman a Duffel y el resto solo usa
+        # el presupuesto que no necesita el tráfico interactivo
+        with prioridad(PRIORIDAD_SEGUNDO_PLANO):
+            return await motor_async.buscar_vuelos_lote_async(consultas)
+
+    inicio = time.time()
+    try:
+        resultados = motor_async.ejecutar(_lote(), timeout=FLIGHT_PREWARM_TIMEOUT_SECONDS)
+    except Exception as err:
+        logger.warning(f"⚠️ Prewarm de búsquedas interrumpido: {err}")
+        return
+
+    calientes = sum(1 for r in resultados if r)
+    FLIGHT_PREWARM_STATS['runs'] += 1
+    FLIGHT_PREWARM_STATS['last_run'] = datetime.utcnow().isoformat()
+    FLIGHT_PREWARM_STATS['queries'] = len(consultas)
+    FLIGHT_PREWARM_STATS['warmed'] = calientes
+    logger.info(
+        f"🔥 Prewarm de búsquedas: {calientes}/{len(consultas)} consultas en caché ({time.time() - inicio:.1f}s)"
+    )
+
+
+def _backfill_checkin_open_times(db, estado):
+    """Rellena por páginas checkin_abre_en de reservas creadas antes de la columna (una sola pasada por proceso)."""
+    global _auto_checkin_backfill_last_id
+    from database import ReservaVuelo
+
+    rellenadas = 0
+    while True:
+        pendientes = (
+            db.query(ReservaVuelo)
+            .filter(
+                ReservaVuelo.estado == estado,
+                ReservaVuelo.checkin_abre_en.is_(None),
+                ReservaVuelo.id > _auto_checkin_backfill_last_id,
+            )
+            .order_by(ReservaVuelo.id)
+            .limit(AUTO_CHECKIN_PAGE_SIZE)
+            .all()
+        )
+        if not pendientes:
+            return rellenadas
+        for reserva in pendientes:
+            # Las que no tienen fecha parseable quedan a NULL y no se revisan otra vez
+            if reserva.actualizar_checkin_abre_en():
+                rellenadas += 1
+        _auto_checkin_backfill_last_id = pendientes[-1].id
+        db.commit()
+
+
 def process_auto_checkin_queue():
     """Monitoriza reservas listas para check-in y notifica al abrirse la ventana de 24h."""
     if not AUTO_CHECKIN_ENABLED:
@@ -704,34 +1117,55 @@ def process_auto_checkin_queue():
         now = datetime.utcnow()
         procesadas = 0
 
-        reservas = db.query(ReservaVuelo).filter(ReservaVuelo.estado == 'LISTO PARA CHECK-IN').all()
-        for reserva in reservas:
-            checkin_open = _extract_checkin_open_datetime(reserva)
-            if not checkin_open or now < checkin_open:
-                continue
+        rellenadas = _backfill_checkin_open_times(db, 'LISTO PARA CHECK-IN')
+        if rellenadas:
+            logger.info(f"🗂️ Auto-checkin: apertura de check-in calculada para {rellenadas} reservas existentes")
+
+        # Solo las reservas cuya ventana ya se abrió (índice estado + checkin_abre_en), por páginas:
+        # al pasar a 'CHECK-IN ABIERTO' salen del filtro, así que cada página es la siguiente
+        for _pagina in range(AUTO_CHECKIN_MAX_PAGES):
+            reservas = (
+                db.query(ReservaVuelo)
+                .filter(
+                    ReservaVuelo.estado == 'LISTO PARA CHECK-IN',
+                    ReservaVuelo.checkin_abre_en <= now,
+                )
+                .order_by(ReservaVuelo.checkin_abre_en, ReservaVuelo.id)
+                .limit(AUTO_CHECKIN_PAGE_SIZE)
+                .all()
+            )
+            if not reservas:
+                break
+
+            for reserva in reservas:
+                booking_ref = _extract_booking_reference(reserva)
+                checkin_url = _resolve_airline_checkin_url(reserva)
+                reserva.estado = 'CHECK-IN ABIERTO'
+                nota = f"[AUTO_CHECKIN] Ventana de check-in abierta el {now.strftime('%d/%m/%Y %H:%M')} UTC."
+                reserva.notas = f"{nota} {reserva.notas or ''}".strip()
+
+                if getattr(reserva, 'email_cliente', None):
+                    asunto = f"✅ Check-in abierto para tu reserva {reserva.codigo_reserva}"
+                    html = f"""
+                    <h2>Tu check-in ya está disponible</h2>
+                    <p>Reserva: <strong>{reserva.codigo_reserva}</strong></p>
+                    <p>Localizador aerolínea: <strong>{booking_ref or 'N/A'}</strong></p>
+                    <p>Ya puedes completar el check-in en la web de la aerolínea o en nuestra sección de check-in.</p>
+                    {f'<p><a href="{checkin_url}" target="_blank" rel="noopener">Ir al check-in de la aerolínea</a></p>' if checkin_url else ''}
+                    <p><a href=\"{os.getenv('APP_URL', 'http://localhost:8000')}/checkin\">Ir a Check-in</a></p>
+                    """
+                    # La clave evita un segundo email si el commit de abajo falla y la reserva se reprocesa
+                    cola_trabajos.encolar(
+                        'email',
+                        {'to_email': reserva.email_cliente, 'subject': asunto, 'body_html': html},
+                        idempotency_key=f"auto_checkin:{reserva.codigo_reserva}"
+                    )
 
-            booking_ref = _extract_booking_reference(reserva)
-            checkin_url = _resolve_airline_checkin_url(reserva)
-            reserva.estado = 'CHECK-IN ABIERTO'
-            nota = f"[AUTO_CHECKIN] Ventana de check-in abierta el {now.strftime('%d/%m/%Y %H:%M')} UTC."
-            reserva.notas = f"{nota} {reserva.notas or ''}".strip()
-
-            if getattr(reserva, 'email_cliente', None):
-                asunto = f"✅ Check-in abierto para tu reserva {reserva.codigo_reserva}"
-                html = f"""
-                <h2>Tu check-in ya está disponible</h2>
-                <p>Reserva: <strong>{reserva.codigo_reserva}</strong></p>
-                <p>Localizador aerolínea: <strong>{booking_ref or 'N/A'}</strong></p>
-                <p>Ya puedes completar el check-in en la web de la aerolínea o en nuestra sección de check-in.</p>
-                {f'<p><a href="{checkin_url}" target="_blank" rel="noopener">Ir al check-in de la aerolínea</a></p>' if checkin_url else ''}
-                <p><a href=\"{os.getenv('APP_URL', 'http://localhost:8000')}/checkin\">Ir a Check-in</a></p>
-                """
-                email_manager.send_email(reserva.email_cliente, asunto, html)
-
-            procesadas += 1
+                procesadas += 1
 
-        if procesadas:
             db.commit()
+
+        if procesadas:
             logger.info(f"✅ Auto-checkin monitor: {procesadas} reservas actualizadas")
         db.close()
 
@@ -740,18 +1174,36 @@ def process_auto_checkin_queue():
 
 
 def _init_calendar_scheduler():
+    # Cada worker de gunicorn tiene su scheduler; scheduler_coordinator decide quién ejecuta cada job
     scheduler = APScheduler()
     scheduler.init_app(app)
 
     jobs_added = 0
 
-    if CALENDAR_ENABLE_DAILY_REFRESH:
+    if CALENDAR_INCREMENTAL_REFRESH_ENABLED:
+        scheduler.add_job(
+            id='refresh-calendar-incremental',
+            func=scheduler_coordinator.envolver('refresh-calendar-incremental', refresh_calendar_incremental),
+            trigger='interval',
+            minutes=1,
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        jobs_added += 1
+        logger.info(
+            f"✅ Refresco incremental de calendario activo ({calendar_refresher.llamadas_por_minuto} llamadas/min, "
+            f"horizonte {calendar_refresher.horizonte_dias} días)"
+        )
+    elif CALENDAR_ENABLE_DAILY_REFRESH:
         scheduler.add_job(
             id='refresh-calendar-prices-daily',
-            func=refresh_calendar_prices_daily,
+            func=scheduler_coordinator.envolver('refresh-calendar-prices-daily', refresh_calendar_prices_daily),
             trigger='cron',
             hour=CALENDAR_REFRESH_HOUR,
             minute=CALENDAR_REFRESH_MINUTE,
+            max_instances=1,
+            coalesce=True,
             replace_existing=True
         )
         jobs_added += 1
@@ -759,14 +1211,33 @@ def _init_calendar_scheduler():
             f"✅ Job diario precios calendario activo ({CALENDAR_REFRESH_HOUR:02d}:{CALENDAR_REFRESH_MINUTE:02d} UTC, TTL {CALENDAR_PRICE_CACHE_TTL}s)"
         )
     else:
-        logger.info("ℹ️ Refresh diario de calendario deshabilitado por configuración")
+        logger.info("ℹ️ Refresh diario de calendario deshabilitado (incremental activo o desactivado por configuración)")
+
+    if FLIGHT_PREWARM_ENABLED:
+        scheduler.add_job(
+            id='prewarm-flight-searches',
+            func=scheduler_coordinator.envolver('prewarm-flight-searches', prewarm_flight_searches),
+            trigger='interval',
+            minutes=FLIGHT_PREWARM_INTERVAL_MINUTES,
+            # Primera pasada poco después del arranque: la caché empieza fría tras cada deploy
+            next_run_time=datetime.now() + timedelta(seconds=30),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        jobs_added += 1
+        logger.info(
+            f"✅ Prewarm de búsquedas activo (cada {FLIGHT_PREWARM_INTERVAL_MINUTES} min, top {FLIGHT_PREWARM_TOP_QUERIES})"
+        )
 
     if AUTO_CHECKIN_ENABLED:
         scheduler.add_job(
             id='monitor-auto-checkin',
-            func=process_auto_checkin_queue,
+            func=scheduler_coordinator.envolver('monitor-auto-checkin', process_auto_checkin_queue),
             trigger='interval',
             minutes=AUTO_CHECKIN_SCAN_MINUTES,
+            max_instances=1,
+            coalesce=True,
             replace_existing=True
         )
         jobs_added += 1
@@ -776,6 +1247,10 @@ def _init_calendar_scheduler():
         logger.info("ℹ️ Sin jobs de scheduler activos")
         return
 
+    from apscheduler.events import EVENT_JOB_SUBMITTED
+    scheduler.add_listener(scheduler_coordinator.on_job_submitted, EVENT_JOB_SUBMITTED)
+    scheduler_coordinator.iniciar()
+    atexit.register(scheduler_coordinator.renunciar)
     scheduler.start()
 
 
@@ -820,25 +1295,17 @@ def obtener_detalles_vuelo(offer_id):
         
         if detalles:
             return jsonify({'success': True, 'data': detalles})
-        for cache_data in getattr(motor, 'cache', {}).values():
-            if not isinstance(cache_data, tuple) or not cache_data:
-                continue
-
-            cached_results = cache_data[0]
-            if not isinstance(cached_results, list):
-                continue
-
-            for vuelo in cached_results:
-                if vuelo.get('id') == offer_id:
-                    available_services = vuelo.get('available_services') or []
-                    return jsonify({
-                        'success': True,
-                        'data': {
-                            'id': offer_id,
-                            'available_services': available_services
-                        },
-                        'fallback_cache': True
-                    })
+        # Fallback: servicios guardados con la oferta al buscar (sin loader, ya falló Duffel)
+        blob = offer_blobs.get(offer_id)
+        if blob is not None:
+            return jsonify({
+                'success': True,
+                'data': {
+                    'id': offer_id,
+                    'available_services': blob.get('available_services') or []
+                },
+                'fallback_cache': True
+            })
 
         return jsonify({'success': False, 'error': 'No se pudieron obtener detalles'}), 404
             
@@ -1090,6 +1557,7 @@ def confirmar_vuelo_directo():
             reserva.estado = 'CONFIRMADO'
             reserva.fecha_pago = datetime.now()
             reserva.fecha_confirmacion = datetime.now()
+            reserva.actualizar_checkin_abre_en()
             reserva.notas = f"Booking Ref: {resultado['booking_reference']} (Directo)"
             session.commit()
             
@@ -1432,22 +1900,27 @@ def confirmar_pago_tarjeta():
             reserva.estado = 'CONFIRMADO'
             reserva.fecha_pago = datetime.now()
             reserva.fecha_confirmacion = datetime.now()
+            reserva.actualizar_checkin_abre_en()
             reserva.notas = f"Booking Ref: {resultado['booking_reference']} (Pago Tarjeta Exitoso)"
             session.commit()
             session.close()
             
             logger.info(f"✅ Vuelo confirmado con tarjeta: {resultado['booking_reference']}")
             
-            # 3. ENVIAR EMAIL DE CONFIRMACIÓN (Automation)
+            # 3. ENVIAR EMAIL DE CONFIRMACIÓN (cola de trabajos: la respuesta no espera al SMTP)
             try:
-                email_manager.send_order_confirmation(
-                    to_email=reserva.email_cliente,
-                    booking_ref=resultado['booking_reference'],
-                    amount=amount,
-                    currency=currency
+                cola_trabajos.encolar(
+                    'email_confirmacion_pedido',
+                    {
+                        'to_email': reserva.email_cliente,
+                        'booking_ref': resultado['booking_reference'],
+                        'amount': str(amount),
+                        'currency': currency
+                    },
+                    idempotency_key=f"email_pedido:{resultado['booking_reference']}"
                 )
             except Exception as e_mail:
-                logger.error(f"⚠️ Error enviando email: {e_mail}")
+                logger.error(f"⚠️ Error encolando email: {e_mail}")
 
             return jsonify({
                 'success': True,
@@ -1692,14 +2165,15 @@ def stripe_webhook():
                 session.close()
                 return jsonify({'status': 'ok'}), 200
 
-            # Iniciar emisión automática en background
-            threading.Thread(
-                target=_emitir_amadeus_background,
-                args=(codigo_reserva, reserva, session)
-            ).start()
-
             session.close()
-            return jsonify({'status': 'ok'}), 200
+
+            # Emisión automática en la cola de trabajos (Stripe reintenta webhooks: la clave lo deduplica)
+            job_id = cola_trabajos.encolar(
+                'emitir_amadeus',
+                {'codigo_reserva': codigo_reserva},
+                idempotency_key=f"emitir_amadeus:{codigo_reserva}"
+            )
+            return jsonify({'status': 'ok', 'job_id': job_id}), 200
 
         elif event_type == 'payment_intent.payment_failed':
             intent_obj = event.get('data', {}).get('object', {})
@@ -1727,7 +2201,7 @@ def stripe_webhook():
         return jsonify({'error': str(e)}), 500
 
 
-def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
+def _emitir_amadeus_background(codigo_reserva, reserva=None, db_session=None):
     """
     Emite Amadeus PNR de forma asintrónica post-pago con validación de precio.
     Pasos:
@@ -1751,6 +2225,12 @@ def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
             new_session.close()
             return
 
+        # Reejecución tras reciclar un worker: no crear una segunda orden
+        if reserva.estado != 'PAGADO_PENDIENTE_EMISION' or reserva.amadeus_order_id:
+            logger.warning(f"⚠️ {codigo_reserva} ya en estado {reserva.estado}, emisión omitida")
+            new_session.close()
+            return
+
         # Parsear JSON si es necesario
         try:
             datos_vuelo = json.loads(reserva.datos_vuelo) if isinstance(reserva.datos_vuelo, str) else (reserva.datos_vuelo or {})
@@ -1768,7 +2248,6 @@ def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
             new_session.close()
             return
 
-        amadeus_motor = AmadeusAdapter()
 
         # Obtener la oferta completa (debe estar guardada)
         try:
@@ -1891,6 +2370,7 @@ def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
 
         # PASO 4: Actualizar estado a EMITIDO
         reserva.estado = 'EMITIDO'
+        reserva.actualizar_checkin_abre_en()
         reserva.notas = (reserva.notas or '') + f" | ✅ Emitido - Tickets: {','.join(ticket_nums)}"
 
         new_session.commit()
@@ -1922,6 +2402,63 @@ def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
             pass
 
 
+# ==========================================
+# COLA DE TRABAJOS EN SEGUNDO PLANO
+# ==========================================
+JOB_QUEUE_ENABLED = cola_trabajos.habilitada  # false: sin pool, encolar ejecuta en hilo local
+
+
+def _job_enviar_email(to_email, subject, body_html):
+    # Sin credenciales SMTP no tiene sentido reintentar; un fallo real del servidor sí se reintenta
+    if not email_manager.send_email(to_email, subject, body_html, wait=True) and email_manager.smtp_user:
+        # Sin la dirección: el error se guarda en la tabla de trabajos
+        raise RuntimeError(f"SMTP no entregó el email '{subject}'")
+
+
+def _job_email_confirmacion_pedido(to_email, booking_ref, amount, currency):
+    if not email_manager.send_order_confirmation(to_email, booking_ref, amount, currency, wait=True) and email_manager.smtp_user:
+        raise RuntimeError(f"SMTP no entregó la confirmación {booking_ref}")
+
+
+def _job_scrape_tours():
+    from core.scraper_tours import ScraperToursB2B
+    total = ScraperToursB2B().ejecutar_scraping_completo()
+    logger.info(f"✅ Scraping de tours completado: {total} tours")
+
+
+def _job_refrescar_referencias_amadeus(tipos=None):
+    refrescadas = amadeus_motor.refrescar_referencias(tipos)
+    logger.info(f"✅ Datos de referencia Amadeus refrescados: {refrescadas}")
+
+
+# La emisión no se reintenta sola: crear órdenes Amadeus no es idempotente (errores -> EMITIDO_CON_ERROR)
+cola_trabajos.registrar('emitir_amadeus', _emitir_amadeus_background, concurrencia=2, max_intentos=1, lease_segundos=1800)
+cola_trabajos.registrar('email', _job_enviar_email, concurrencia=4, max_intentos=5, backoff_segundos=60)
+cola_trabajos.registrar('email_confirmacion_pedido', _job_email_confirmacion_pedido, concurrencia=4, max_intentos=5, backoff_segundos=60)
+cola_trabajos.registrar('scrape_tours', _job_scrape_tours, concurrencia=1, max_intentos=1, lease_segundos=3600)
+cola_trabajos.registrar('refrescar_referencias_amadeus', _job_refrescar_referencias_amadeus, concurrencia=1, max_intentos=1, lease_segundos=3600)
+
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Estado de un trabajo en segundo plano (sin payload). Solo ADMIN."""
+    try:
+        trabajo = cola_trabajos.estado(job_id, detalle=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 503
+    if trabajo is None:
+        return jsonify({'error': 'Trabajo no encontrado'}), 404
+    return jsonify(trabajo), 200
+
+
+@app.route('/jobs-stats')
+@login_required
+def jobs_stats():
+    """Trabajos por tipo y estado + contadores de este worker (incluye el buzón SMTP)"""
+    return jsonify({'status': 'ok', 'queue': cola_trabajos.get_stats(), 'mail': email_manager.get_stats()}), 200
+
+
 # ==========================================
 # ELIMINADO: Stripe legacy - 19/02/2026
 # Flujo actual: solo Duffel Payments o reserva pendiente
@@ -1955,7 +2492,6 @@ def _emitir_amadeus_background(codigo_reserva, reserva, db_session):
 def amadeus_seatmap(offer_id):
     """Obtiene el mapa de asientos disponibles para una oferta."""
     try:
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.obtener_seatmap(offer_id, 'DEPARTURE')
         return jsonify(result)
     except Exception as e:
@@ -1968,7 +2504,6 @@ def amadeus_seatmap(offer_id):
 def amadeus_upsell(offer_id):
     """Obtiene ofertas de upgrade disponibles para una oferta."""
     try:
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.obtener_ofertas_upsell(offer_id)
         return jsonify(result)
     except Exception as e:
@@ -1990,7 +2525,6 @@ def amadeus_availability():
         if not all([origen, destino, fecha_salida]):
             return jsonify({'error': 'origen, destino, fecha_salida requeridos'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.buscar_disponibilidad(
             origen, destino, fecha_salida,
             fecha_regreso if fecha_regreso else None,
@@ -2017,7 +2551,6 @@ def amadeus_locations():
         if not keyword or len(keyword) < 2:
             return jsonify({'error': 'keyword debe tener al menos 2 caracteres'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.buscar_aeropuertos(keyword, subtype)
         return jsonify(result)
     except Exception as e:
@@ -2037,7 +2570,6 @@ def amadeus_nearest_airports():
         if not latitude or not longitude:
             return jsonify({'error': 'latitude y longitude requeridos'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.aeropuertos_cercanos(latitude, longitude, radius)
         return jsonify(result)
     except Exception as e:
@@ -2054,7 +2586,6 @@ def amadeus_routes(codigo_aeropuerto):
         if not codigo_aeropuerto or len(codigo_aeropuerto) != 3:
             return jsonify({'error': 'Código de aeropuerto inválido'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.rutas_directas(codigo_aeropuerto)
         return jsonify(result)
     except Exception as e:
@@ -2073,7 +2604,6 @@ def amadeus_airlines():
 
         codigos_list = [c.strip().upper() for c in codigos.split(',')]
         
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.obtener_aerolineas(codigos_list)
         return jsonify(result)
     except Exception as e:
@@ -2097,7 +2627,6 @@ def amadeus_flight_status():
         if not all([carrier_code, flight_number, departure_date]):
             return jsonify({'error': 'carrier_code, flight_number, departure_date requeridos'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.obtener_estado_vuelo(carrier_code, flight_number, departure_date)
         return jsonify(result)
     except Exception as e:
@@ -2114,7 +2643,6 @@ def amadeus_checkin_links(codigo_aerolinea):
         if not codigo_aerolinea or len(codigo_aerolinea) != 2:
             return jsonify({'error': 'Código de aerolínea inválido'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.obtener_links_checkin(codigo_aerolinea)
         return jsonify(result)
     except Exception as e:
@@ -2135,7 +2663,6 @@ def amadeus_get_order(order_id):
         if not order_id:
             return jsonify({'error': 'order_id requerido'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.recuperar_orden_amadeus(order_id)
         return jsonify(result)
     except Exception as e:
@@ -2152,7 +2679,6 @@ def amadeus_cancel_order(order_id):
         if not order_id:
             return jsonify({'error': 'order_id requerido'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.cancelar_orden_amadeus(order_id)
         return jsonify(result)
     except Exception as e:
@@ -2171,7 +2697,6 @@ def amadeus_price_check():
         if not flight_offers:
             return jsonify({'error': 'flight_offers requerido'}), 400
 
-        amadeus_motor = AmadeusAdapter()
         result = amadeus_motor.validar_pricing_amadeus(flight_offers)
         return jsonify(result)
     except Exception as e:
@@ -2277,11 +2802,12 @@ def api_buscar_tours():
     """
     API de búsqueda avanzada de tours con filtros múltiples y paginación
     Query params: search, continente, pais, proveedor, precio_max, duracion_min, 
-                  duracion_max, tipo, sort, page, per_page
+                  duracion_max, tipo, sort, page, per_page,
+                  cursor (paginación keyset: valor de next_cursor de la respuesta anterior),
+                  count (exact | cached | estimated | none; por defecto cached)
     """
     try:
         from database import get_db_session, Tour
-        from sqlalchemy import or_, and_
         
         db = get_db_session()
         
@@ -2290,6 +2816,7 @@ def api_buscar_tours():
         
         # FILTROS DINÁMICOS
         search = request.args.get('search', '').strip()
+        rank = None
         if search:
             # ✅ OPTIMIZADO: Full-text search con ranking (100x más rápido)
             from sqlalchemy import func as sqlfunc
@@ -2299,9 +2826,9 @@ def api_buscar_tours():
             
             query = query.filter(
                 sqlfunc.to_tsquery('spanish', search_query).op('@@')(Tour.search_vector)
-            ).order_by(
-                sqlfunc.ts_rank(Tour.search_vector, sqlfunc.to_tsquery('spanish', search_query)).desc()
             )
+            # El ranking es la primera clave del orden (y del cursor)
+            rank = sqlfunc.ts_rank(Tour.search_vector, sqlfunc.to_tsquery('spanish', search_query))
         
         # Filtro por continente
         continente = request.args.get('continente')
@@ -2352,32 +2879,37 @@ def api_buscar_tours():
         if categoria:
             query = query.filter_by(categoria=categoria)
         
-        # ORDENAMIENTO
+        # ORDENAMIENTO (claves del keyset; Tour.id desempata)
         sort = request.args.get('sort', 'relevancia')
-        if sort == 'precio-asc':
-            query = query.order_by(Tour.precio_desde.asc())
-        elif sort == 'precio-desc':
-            query = query.order_by(Tour.precio_desde.desc())
-        elif sort == 'duracion-asc':
-            query = query.order_by(Tour.duracion_dias.asc())
-        elif sort == 'duracion-desc':
-            query = query.order_by(Tour.duracion_dias.desc())
-        elif sort == 'popular':
-            query = query.order_by(Tour.num_solicitudes.desc(), Tour.num_visitas.desc())
-        elif sort == 'nuevo':
-            query = query.order_by(Tour.fecha_creacion.desc())
-        else:  # relevancia (default)
-            query = query.order_by(Tour.destacado.desc(), Tour.num_solicitudes.desc(), Tour.num_visitas.desc())
+        claves = claves_orden(Tour, sort, rank)
         
         # PAGINACIÓN
-        page = int(request.args.get('page', 1))
+        page = max(1, int(request.args.get('page', 1)))
         per_page = int(request.args.get('per_page', 24))
         per_page = min(per_page, 100)  # Máximo 100 por página
+        huella = huella_filtros(request.args)
+        
+        valores_cursor = None
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                valores_cursor = decodificar_cursor(cursor, huella, len(claves))
+            except CursorInvalido as e:
+                db.close()
+                return jsonify({'error': str(e)}), 400
         
-        total_tours = query.count()
-        total_pages = (total_tours + per_page - 1) // per_page
+        # Sin cursor, ?page=N salta con OFFSET (enlaces directos); la navegación normal sigue next_cursor
+        offset = 0 if cursor else (page - 1) * per_page
+        tours, siguiente = pagina_keyset(query, claves, per_page, valores_cursor, offset=offset)
         
-        tours = query.offset((page - 1) * per_page).limit(per_page).all()
+        # TOTAL: exacto cacheado por filtros (por defecto), estimado, exacto o ninguno
+        modo_total = request.args.get('count', 'cached')
+        if modo_total not in contador_tours.MODOS:
+            modo_total = 'cached'
+        total_tours, total_estimado = contador_tours.contar(
+            query, modo_total, huella_filtros(request.args, ignorar=('page', 'per_page', 'cursor', 'count', 'sort'))
+        )
+        total_pages = (total_tours + per_page - 1) // per_page if total_tours is not None else None
         
         # Incrementar contador de visitas para cada tour mostrado
         # (opcional, descomenta si quieres tracking)
@@ -2388,11 +2920,13 @@ def api_buscar_tours():
         result = {
             'tours': [t.to_dict() for t in tours],
             'total': total_tours,
+            'total_is_estimate': total_estimado,
             'page': page,
             'total_pages': total_pages,
             'per_page': per_page,
-            'has_next': page < total_pages,
-            'has_prev': page > 1
+            'has_next': siguiente is not None,
+            'has_prev': page > 1 or bool(cursor),
+            'next_cursor': codificar_cursor(huella, siguiente) if siguiente is not None else None
         }
         
         db.close()
@@ -2476,72 +3010,8 @@ def api_filtros_disponibles():
     Útil para poblar el sidebar de filtros con counts
     """
     try:
-        from database import get_db_session, Tour
-        from sqlalchemy import func
-        
-        db = get_db_session()
-        
-        # Continentes con count
-        continentes = db.query(
-            Tour.continente,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.continente.isnot(None)
-        ).group_by(Tour.continente).all()
-        
-        # Países con count
-        paises = db.query(
-            Tour.pais,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.pais.isnot(None)
-        ).group_by(Tour.pais).order_by(func.count(Tour.id).desc()).limit(20).all()
-        
-        # Proveedores con count
-        proveedores = db.query(
-            Tour.proveedor,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.proveedor.isnot(None)
-        ).group_by(Tour.proveedor).order_by(func.count(Tour.id).desc()).all()
-        
-        # Tipos de viaje con count
-        tipos = db.query(
-            Tour.tipo_viaje,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.tipo_viaje.isnot(None)
-        ).group_by(Tour.tipo_viaje).all()
-        
-        # Rangos de precio
-        precio_max_db = db.query(func.max(Tour.precio_desde)).scalar() or 5000
-        precio_min_db = db.query(func.min(Tour.precio_desde)).scalar() or 0
-        
-        # Rangos de duración
-        duracion_max_db = db.query(func.max(Tour.duracion_dias)).scalar() or 30
-        duracion_min_db = db.query(func.min(Tour.duracion_dias)).scalar() or 1
-        
-        # Total de tours activos
-        total_tours = db.query(Tour).filter_by(activo=True).count()
-        
-        result = {
-            'continentes': [{'nombre': c[0], 'count': c[1]} for c in continentes],
-            'paises': [{'nombre': p[0], 'count': p[1]} for p in paises],
-            'proveedores': [{'nombre': pr[0], 'count': pr[1]} for pr in proveedores],
-            'tipos': [{'nombre': t[0], 'count': t[1]} for t in tipos],
-            'precio_max': int(precio_max_db),
-            'precio_min': int(precio_min_db),
-            'duracion_max': int(duracion_max_db),
-            'duracion_min': int(duracion_min_db),
-            'total_tours': total_tours
-        }
-        
-        db.close()
-        return jsonify(result)
+        # Instantánea precalculada en memoria (se recalcula al cambiar el catálogo)
+        return jsonify(facetas_tours.filtros_disponibles())
         
     except Exception as e:
         logger.error(f"Error obteniendo filtros disponibles: {e}")
@@ -2638,9 +3108,44 @@ def cache_stats():
     return jsonify({
         'status': 'ok',
         'cache': stats,
-        'cache_duration_minutes': motor.TIEMPO_CACHE_MINUTOS
+        'cache_duration_minutes': motor.TIEMPO_CACHE_MINUTOS,
+        'cache_l2_duration_seconds': motor.TIEMPO_CACHE_L2_SEGUNDOS,
+        'duffel_budget': motor.budget.get_stats(),
+        'offer_blobs': offer_blobs.get_stats(),
+        'amadeus_token': amadeus_motor.get_token_stats(),
+        'amadeus_reference': amadeus_motor.referencias.get_stats(),
+        'flight_prewarm': FLIGHT_PREWARM_STATS,
+        'fare_index': indice_tarifas.get_stats(),
+        'airport_index': indice_aeropuertos.get_stats(),
+        'autocomplete_remote': autocompletado_remoto.get_stats(),
+        'tours_count': contador_tours.get_stats(),
+        'tour_facets': facetas_tours.get_stats()
     }), 200
 
+@app.route('/calendar-refresh-status')
+@login_required
+def calendar_refresh_status():
+    """Cobertura y frescura del índice de tarifas por ruta + progreso del refresco incremental"""
+    detalle = request.args.get('routes', 'true').lower() != 'false'
+    return jsonify({
+        'status': 'ok',
+        'enabled': CALENDAR_INCREMENTAL_REFRESH_ENABLED,
+        'refresh': calendar_refresher.get_status(detalle_rutas=detalle)
+    }), 200
+
+@app.route('/scheduler-status')
+@login_required
+def scheduler_status():
+    """Liderazgo del scheduler entre workers y métricas de duración/lag por job"""
+    return jsonify({'status': 'ok', 'scheduler': scheduler_coordinator.get_stats()}), 200
+
+@app.route('/http-stats')
+@login_required
+def http_stats():
+    """Estadísticas del pool HTTP compartido (reutilización de conexiones y esperas)"""
+    from core.http_transport import http_transport
+    return jsonify({'status': 'ok', 'http': http_transport.get_stats()}), 200
+
 @app.route('/')
 def home():
     """Página principal: Carga catálogo desde DB + Tours Destacados"""
@@ -2718,50 +3223,8 @@ from sqlalchemy.sql.expression import func
 def destinos():
     """Página de Destinos: Proporciona datos para filtros"""
     try:
-        from database import get_db_session, Tour
-        from sqlalchemy import func
-        
-        db = get_db_session()
-        
-        # Obtener estadísticas para filtros
-        filtros = {}
-        
-        # Continentes
-        continentes = db.query(
-            Tour.continente,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.continente.isnot(None)
-        ).group_by(Tour.continente).all()
-        filtros['continentes'] = [{'nombre': c[0], 'count': c[1]} for c in continentes]
-        
-        # Proveedores top 10
-        proveedores = db.query(
-            Tour.proveedor,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.proveedor.isnot(None)
-        ).group_by(Tour.proveedor).order_by(func.count(Tour.id).desc()).limit(10).all()
-        filtros['proveedores'] = [{'nombre': p[0], 'count': p[1]} for p in proveedores]
-        
-        # Tipos de viaje
-        tipos = db.query(
-            Tour.tipo_viaje,
-            func.count(Tour.id).label('count')
-        ).filter(
-            Tour.activo == True,
-            Tour.tipo_viaje.isnot(None)
-        ).group_by(Tour.tipo_viaje).all()
-        filtros['tipos'] = [{'nombre': t[0], 'count': t[1]} for t in tipos]
-        
-        # Rangos
-        filtros['precio_max'] = int(db.query(func.max(Tour.precio_desde)).scalar() or 5000)
-        filtros['duracion_max'] = int(db.query(func.max(Tour.duracion_dias)).scalar() or 30)
-        filtros['total_tours'] = db.query(Tour).filter_by(activo=True).count()
-        
-        db.close()
+        # Mismas facetas precalculadas que /api/tours/filtros-disponibles
+        filtros = facetas_tours.filtros_destinos()
         
     except Exception as e:
         logger.error(f"Error en destinos: {e}")
@@ -2826,42 +3289,14 @@ def _extract_booking_reference(reserva):
 
 
 def _extract_checkin_open_datetime(reserva):
-    if not reserva or not getattr(reserva, 'datos_vuelo', None):
-        return None
-
-    try:
-        datos = json.loads(reserva.datos_vuelo) if isinstance(reserva.datos_vuelo, str) else reserva.datos_vuelo
-        if not isinstance(datos, dict):
-            return None
-
-        fecha = (
-            datos.get('fecha_ida')
-            or datos.get('fecha_salida')
-            or datos.get('departure_date')
-        )
-        if not fecha:
-            return None
-
-        hora = datos.get('hora_salida') or datos.get('departure_time') or '00:00'
-
-        flight_dt = None
-        for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y'):
-            try:
-                if fmt in ('%Y-%m-%d', '%d/%m/%Y'):
-                    flight_dt = datetime.strptime(fecha, fmt)
-                else:
-                    combined = f"{fecha} {hora}" if ' ' not in str(fecha).strip() else str(fecha)
-                    flight_dt = datetime.strptime(combined, fmt)
-                break
-            except Exception:
-                continue
-
-        if not flight_dt:
-            return None
-
-        return flight_dt - timedelta(hours=24)
-    except Exception:
+    if not reserva:
         return None
+    # Columna indexada calculada al confirmar; las reservas antiguas se calculan al vuelo
+    stored = getattr(reserva, 'checkin_abre_en', None)
+    if stored:
+        return stored
+    calcular = getattr(reserva, 'calcular_checkin_abre_en', None)
+    return calcular() if calcular else None
 
 
 def _normalize_passengers_for_checkin(reserva):
@@ -3052,6 +3487,8 @@ def save_identity():
             
         if results and all(results):
             reserva.estado = 'LISTO PARA CHECK-IN'
+            if reserva.checkin_abre_en is None:
+                reserva.actualizar_checkin_abre_en()
             reserva.notas = f"[AUTO_CHECKIN] Documentación verificada el {datetime.utcnow().strftime('%d/%m/%Y %H:%M')} UTC. {reserva.notas or ''}".strip()
             db.commit()
             db.close()
@@ -4043,15 +4480,35 @@ try:
     def admin_scrape_tours():
         """Ejecuta el scraping de tours"""
         try:
-            from core.scraper_tours import ScraperToursB2B
-            scraper = ScraperToursB2B()
-            total = scraper.ejecutar_scraping_completo()
-            return jsonify({'success': True, 'total_tours': total})
+            # Puede tardar minutos: se encola y el admin consulta /jobs/<id>
+            job_id = cola_trabajos.encolar('scrape_tours')
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}' if job_id else None
+            }), 202
 
         except Exception as e:
             logger.error(f"Error en scraping: {e}")
             return jsonify({'error': str(e)}), 500
 
+    @app.route('/admin/amadeus/refresh-reference-data', methods=['POST'])
+    @login_required
+    def admin_refresh_amadeus_reference():
+        """Refresca en bloque los datos de referencia Amadeus cacheados (aeropuertos, aerolíneas, rutas...)"""
+        try:
+            tipos = (request.get_json(silent=True) or {}).get('types')
+            job_id = cola_trabajos.encolar('refrescar_referencias_amadeus', {'tipos': tipos})
+            return jsonify({
+                'success': True,
+                'job_id': job_id,
+                'status_url': f'/jobs/{job_id}' if job_id else None
+            }), 202
+
+        except Exception as e:
+            logger.error(f"Error refrescando datos de referencia Amadeus: {e}")
+            return jsonify({'error': str(e)}), 500
+
     @app.cli.command('init-db')
     def init_db_command():
         """Inicializa la base de datos"""
@@ -4170,4 +4627,10 @@ try:
 except Exception as e:
     logger.warning(f"⚠️ No se pudo iniciar scheduler de precios calendario: {e}")
 
+if JOB_QUEUE_ENABLED:
+    try:
+        cola_trabajos.iniciar()
+    except Exception as e:
+        logger.warning(f"⚠️ No se pudo iniciar la cola de trabajos: {e}")
+
 print("✅ Proyecto limpio sin Stripe")
@@ -7,7 +7,8 @@ from decimal import Decimal
 import logging
 import json
 from datetime import datetime
-from core.autocomplete_i18n import construir_terminos_busqueda, buscar_fallback_es
+from core.autocomplete_i18n import indice_aeropuertos
+from core.autocomplete_pipeline import PipelineAutocompletado
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +17,7 @@ flights_bp = Blueprint('flights', __name__, url_prefix='/api/vuelos')
 
 def init_flights_blueprint(motor_busqueda, limiter):
     """Inicializa el blueprint con dependencias"""
+    autocompletado_remoto = PipelineAutocompletado(motor_busqueda.autocompletar_aeropuerto)
     
     @flights_bp.route('/autocomplete', methods=['GET'])
     @limiter.limit("30 per minute")
@@ -27,22 +29,13 @@ def init_flights_blueprint(motor_busqueda, limiter):
         if not termino or len(termino) < 2:
             return jsonify([])
 
-        search_terms = construir_terminos_busqueda(termino)
+        # Índice local primero; Duffel solo si no hay coincidencias
+        sugerencias = indice_aeropuertos.buscar(termino)
+        if sugerencias:
+            return jsonify(sugerencias)
 
-        for term in search_terms:
-            try:
-                logger.info(f"🔮 Autocomplete API: Intentando buscar '{term}' con Duffel...")
-                sugerencias = motor_busqueda.autocompletar_aeropuerto(term)
-                logger.info(f"🔮 Duffel devolvió: {len(sugerencias) if sugerencias else 0} resultados")
-                
-                if sugerencias:
-                    return jsonify(sugerencias)
-            except Exception as e:
-                logger.error(f"❌ Error en Autocomplete API: {e}")
-        
-        # Fallback local mejorado (ES/EN)
-        resultados_fallback = buscar_fallback_es(termino)
-        return jsonify(resultados_fallback)
+        # Erratas solo si Duffel tampoco conoce el término
+        return jsonify(autocompletado_remoto.sugerir(termino) or indice_aeropuertos.corregir(termino))
     
     @flights_bp.route('/buscar', methods=['POST'])
     @limiter.limit("10 per minute")
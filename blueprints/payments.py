@@ -158,6 +158,7 @@ def init_payments_blueprint(motor_busqueda, email_manager):
                         reserva.order_id_duffel = resultado['order_id']
                         reserva.estado = 'CONFIRMADO'
                         reserva.fecha_confirmacion = datetime.now()
+                        reserva.actualizar_checkin_abre_en()
                         reserva.notas = f"Booking Ref: {resultado['booking_reference']}"
                         db.commit()
                         
@@ -8,6 +8,8 @@ from .redis_cache import (
     cached,
     cache_flight_search,
     get_cached_flight_search,
+    cache_multi_city_search,
+    get_cached_multi_city_search,
     cache_airport_suggestions,
     get_cached_airport_suggestions,
     clear_flight_cache,
@@ -20,6 +22,8 @@ __all__ = [
     'cached',
     'cache_flight_search',
     'get_cached_flight_search',
+    'cache_multi_city_search',
+    'get_cached_multi_city_search',
     'cache_airport_suggestions',
     'get_cached_airport_suggestions',
     'clear_flight_cache',
@@ -9,6 +9,7 @@ from datetime import timedelta
 from functools import wraps
 import pickle
 import hashlib
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +118,38 @@ class RedisCache:
             logger.error(f"Error verificando existencia: {e}")
             return False
     
+    def acquire_lock(self, key, ttl=30):
+        """Adquiere un lock corto (SET NX EX). Retorna el token del dueño o None si está ocupado"""
+        if not self.available:
+            return None
+        
+        token = uuid.uuid4().hex
+        try:
+            if self.redis_client.set(key, token, nx=True, ex=max(1, int(ttl))):
+                logger.debug(f"🔒 Lock adquirido: {key} (TTL: {ttl}s)")
+                return token
+            return None
+        except Exception as e:
+            logger.error(f"Error adquiriendo lock: {e}")
+            return None
+    
+    def release_lock(self, key, token):
+        """Libera un lock solo si sigue perteneciendo al token indicado"""
+        if not self.available or not token:
+            return False
+        
+        script = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+        """
+        try:
+            return bool(self.redis_client.eval(script, 1, key, token))
+        except Exception as e:
+            logger.error(f"Error liberando lock: {e}")
+            return False
+    
     def clear_all(self):
         """Limpia toda la caché (¡usar con precaución!)"""
         if not self.available:
@@ -222,6 +255,23 @@ def get_cached_flight_search(origen, destino, fecha, adultos, ninos, bebes, clas
     return redis_cache.get(key)
 
 
+def _multi_city_key(slices, adultos, ninos, bebes, clase):
+    tramos = "|".join(
+        f"{s.get('origin')}-{s.get('destination')}-{s.get('departure_date')}" for s in (slices or [])
+    )
+    return f"vuelos:multi:{tramos}:{adultos}:{ninos}:{bebes}:{clase}"
+
+
+def cache_multi_city_search(slices, adultos, ninos, bebes, clase, results, ttl=300):
+    """Cachea resultados de búsqueda multi-city"""
+    redis_cache.set(_multi_city_key(slices, adultos, ninos, bebes, clase), results, ttl)
+
+
+def get_cached_multi_city_search(slices, adultos, ninos, bebes, clase):
+    """Obtiene resultados cacheados de búsqueda multi-city"""
+    return redis_cache.get(_multi_city_key(slices, adultos, ninos, bebes, clase))
+
+
 def cache_airport_suggestions(query, suggestions, ttl=3600):
     """Cachea sugerencias de aeropuertos (TTL largo, datos estáticos)"""
     key = f"airports:{query.lower()}"
@@ -234,6 +284,19 @@ def get_cached_airport_suggestions(query):
     return redis_cache.get(key)
 
 
+def get_cached_airport_suggestions_many(queries):
+    """Sugerencias cacheadas de varios términos en un solo MGET. Retorna {query: valor} solo de los aciertos"""
+    if not redis_cache.available or not queries:
+        return {}
+
+    try:
+        values = redis_cache.redis_client.mget([f"airports:{q.lower()}" for q in queries])
+        return {q: pickle.loads(v) for q, v in zip(queries, values) if v}
+    except Exception as e:
+        logger.error(f"Error obteniendo sugerencias de aeropuertos: {e}")
+        return {}
+
+
 def clear_flight_cache():
     """Limpia toda la caché de vuelos"""
     return redis_cache.delete_pattern("vuelos:*")
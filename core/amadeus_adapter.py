@@ -1,13 +1,210 @@
+import hashlib
+import json
 import logging
 import os
-from datetime import datetime, timedelta
+import threading
+import time
+from datetime import datetime
 
-import requests
+from core.http_transport import http_transport
+from core.offer_model import OfertaCompacta, SegmentoCompacto, TrayectoCompacto
+from core.reference_cache import referencias_amadeus
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
 
 
 logger = logging.getLogger(__name__)
 
 
+class TokenAmadeus:
+    """
+    Token OAuth2 (client_credentials) compartido por todo el proceso y, vía Redis, entre workers.
+    - Renovación anticipada: en los últimos `margen` segundos de vida se renueva en segundo
+      plano mientras las peticiones siguen usando el token vigente.
+    - Single-flight: una sola llamada al TOKEN_URL por proceso (lock) y por clúster (lock en
+      Redis); el resto espera y reutiliza el token publicado.
+    - Invalidación: un 401 (token revocado o credenciales rotadas) descarta la copia local y
+      la de Redis para que ningún worker siga usándolo hasta que caduque.
+    """
+
+    REDIS_PREFIX = "amadeus:token:"
+
+    def __init__(self, token_url, api_key, api_secret, redis_cache=None, margen_segundos=None):
+        self.token_url = token_url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.margen = int(margen_segundos or os.getenv('AMADEUS_TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        # La clave no incluye el secreto: solo identifica entorno + API key
+        self._clave = self.REDIS_PREFIX + hashlib.sha256(f"{token_url}|{api_key}".encode('utf-8')).hexdigest()[:16]
+
+        self._token = None
+        self._expira = 0.0
+        self._lock = threading.Lock()
+        self._renovando = False
+
+        self.peticiones = 0
+        self.desde_redis = 0
+        self.renovaciones_anticipadas = 0
+        self.invalidaciones = 0
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    def obtener(self):
+        ahora = time.time()
+        if self._token and ahora < self._expira:
+            if self._expira - ahora < self.margen:
+                self._renovar_en_segundo_plano()
+            return self._token
+
+        with self._lock:
+            if self._token and time.time() < self._expira:
+                return self._token
+            self._cargar_o_pedir(vida_minima=5)
+            return self._token
+
+    def _renovar_en_segundo_plano(self):
+        with self._lock:
+            if self._renovando:
+                return
+            self._renovando = True
+
+        def _renovar():
+            try:
+                with self._lock:
+                    if self._expira - time.time() < self.margen:
+                        self._cargar_o_pedir(vida_minima=self.margen)
+                        self.renovaciones_anticipadas += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Renovación anticipada del token Amadeus fallida: {e}")
+            finally:
+                self._renovando = False
+
+        threading.Thread(target=_renovar, name='amadeus-token', daemon=True).start()
+
+    # ==========================================
+    # TOKEN COMPARTIDO (Redis) Y PETICIÓN (con self._lock tomado)
+    # ==========================================
+    def _adoptar_de_redis(self, vida_minima):
+        client = self._redis()
+        if client is None:
+            return False
+        try:
+            data = client.get(self._clave)
+            if not data:
+                return False
+            compartido = json.loads(data)
+            if compartido['expira'] - time.time() <= vida_minima:
+                return False
+            self._token, self._expira = compartido['token'], float(compartido['expira'])
+            self.desde_redis += 1
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ Token Amadeus en Redis no disponible: {e}")
+            return False
+
+    def _cargar_o_pedir(self, vida_minima):
+        if self._adoptar_de_redis(vida_minima):
+            return
+
+        lock_token = None
+        if self._redis() is not None:
+            lock_token = self.redis_cache.acquire_lock(f"{self._clave}:lock", ttl=15)
+            if lock_token is None:
+                # Otro worker está pidiendo el token: esperar a que lo publique
+                limite = time.time() + 5
+                while time.time() < limite:
+                    time.sleep(0.2)
+                    if self._adoptar_de_redis(vida_minima):
+                        return
+                if self._token and time.time() < self._expira:
+                    return
+
+        try:
+            if self._adoptar_de_redis(vida_minima):
+                return
+            self._pedir()
+        finally:
+            if lock_token:
+                self.redis_cache.release_lock(f"{self._clave}:lock", lock_token)
+
+    def _pedir(self):
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": self.api_key,
+            "client_secret": self.api_secret,
+        }
+        self.peticiones += 1
+        response = http_transport.post(self.token_url, data=payload, endpoint='amadeus_auth')
+        response.raise_for_status()
+
+        body = response.json()
+        expires_in = int(body.get("expires_in", 1200))
+        self._token = body.get("access_token")
+        self._expira = time.time() + max(60, expires_in - 30)
+        logger.info(f"🔑 Token Amadeus renovado (válido {expires_in}s)")
+
+        client = self._redis()
+        if client is not None and self._token:
+            try:
+                client.setex(
+                    self._clave, max(1, int(self._expira - time.time())),
+                    json.dumps({'token': self._token, 'expira': self._expira})
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo publicar el token Amadeus en Redis: {e}")
+
+    def invalidar(self, rechazado=None):
+        """
+        Descarta el token local y el publicado en Redis. Con `rechazado`, solo si siguen siendo
+        ese token: si otro hilo/worker ya lo renovó, el nuevo se conserva.
+        """
+        with self._lock:
+            if rechazado is None or self._token == rechazado:
+                self._token, self._expira = None, 0.0
+            self.invalidaciones += 1
+
+        client = self._redis()
+        if client is None:
+            return
+        try:
+            data = client.get(self._clave)
+            if data and (rechazado is None or json.loads(data).get('token') == rechazado):
+                client.delete(self._clave)
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo invalidar el token Amadeus en Redis: {e}")
+
+    def get_stats(self):
+        return {
+            'valid_seconds': max(0, int(self._expira - time.time())) if self._token else 0,
+            'token_requests': self.peticiones,
+            'from_redis': self.desde_redis,
+            'proactive_refreshes': self.renovaciones_anticipadas,
+            'invalidations': self.invalidaciones,
+            'refresh_margin_seconds': self.margen,
+        }
+
+
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+def token_compartido(token_url, api_key, api_secret):
+    """Un TokenAmadeus por (endpoint, credenciales) en todo el proceso."""
+    with _tokens_lock:
+        token = _tokens.get((token_url, api_key, api_secret))
+        if token is None:
+            token = TokenAmadeus(token_url, api_key, api_secret)
+            _tokens[(token_url, api_key, api_secret)] = token
+        return token
+
+
 class AmadeusAdapter:
     """Adaptador mínimo de búsqueda de vuelos en Amadeus Self-Service."""
 
@@ -43,8 +240,11 @@ class AmadeusAdapter:
         self.currency = os.getenv("AMADEUS_DEFAULT_CURRENCY", "EUR").strip().upper() or "EUR"
         self.max_results = int(os.getenv("AMADEUS_MAX_RESULTS", "40"))
 
-        self._access_token = None
-        self._token_expires_at = None
+        # Token compartido: instancias nuevas del adaptador no repiten el OAuth
+        self._token = token_compartido(self.TOKEN_URL, self.api_key, self.api_secret)
+        # Datos de referencia (aeropuertos, aerolíneas, rutas...) con TTL de días
+        self.referencias = referencias_amadeus
+        self._registrar_referencias()
 
         if self.is_configured():
             logger.info("✅ AmadeusAdapter configurado para fallback secundario")
@@ -55,22 +255,29 @@ class AmadeusAdapter:
         return bool(self.api_key and self.api_secret)
 
     def _get_access_token(self):
-        if self._access_token and self._token_expires_at and datetime.utcnow() < self._token_expires_at:
-            return self._access_token
+        return self._token.obtener()
 
-        payload = {
-            "grant_type": "client_credentials",
-            "client_id": self.api_key,
-            "client_secret": self.api_secret,
-        }
-        response = requests.post(self.TOKEN_URL, data=payload, timeout=15)
-        response.raise_for_status()
-
-        body = response.json()
-        self._access_token = body.get("access_token")
-        expires_in = int(body.get("expires_in", 1200))
-        self._token_expires_at = datetime.utcnow() + timedelta(seconds=max(60, expires_in - 30))
-        return self._access_token
+    def _amadeus_request(self, method, url, endpoint, headers=None, **kwargs):
+        """
+        Toda llamada autenticada a Amadeus pasa por aquí. Ante un 401 invalida el token
+        compartido (proceso + Redis) y reintenta una sola vez con uno nuevo.
+        """
+        token = self._get_access_token()
+        response = getattr(http_transport, method)(
+            url, headers=dict(headers or {}, Authorization=f"Bearer {token}"), endpoint=endpoint, **kwargs
+        )
+        if response.status_code != 401:
+            return response
+
+        logger.warning(f"🔑 Amadeus respondió 401 en {endpoint}: token invalidado, reintentando una vez")
+        self._token.invalidar(rechazado=token)
+        token = self._get_access_token()
+        return getattr(http_transport, method)(
+            url, headers=dict(headers or {}, Authorization=f"Bearer {token}"), endpoint=endpoint, **kwargs
+        )
+
+    def get_token_stats(self):
+        return self._token.get_stats()
 
     def _parse_iso_duration(self, iso_duration):
         if not iso_duration:
@@ -144,8 +351,6 @@ class AmadeusAdapter:
         }
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             fecha_normalizada = self._normalize_date(fecha)
 
@@ -168,7 +373,7 @@ class AmadeusAdapter:
             if bebes_int > 0:
                 params["infants"] = bebes_int
 
-            response = requests.get(self.SEARCH_URL, headers=headers, params=params, timeout=20)
+            response = self._amadeus_request('get', self.SEARCH_URL, params=params, endpoint='amadeus_search')
             if response.status_code >= 400:
                 logger.error(f"❌ Amadeus error {response.status_code}: {response.text}")
             response.raise_for_status()
@@ -203,63 +408,58 @@ class AmadeusAdapter:
                     flight_number = segment.get("number", "")
                     full_flight = f"{carrier_code}{flight_number}" if flight_number else carrier_code
 
-                    segmentos.append({
-                        "salida": (segment.get("departure") or {}).get("iataCode", ""),
-                        "llegada": (segment.get("arrival") or {}).get("iataCode", ""),
-                        "ciudad_salida": (segment.get("departure") or {}).get("iataCode", ""),
-                        "ciudad_llegada": (segment.get("arrival") or {}).get("iataCode", ""),
-                        "hora_salida": dep_at.strftime("%H:%M") if dep_at else "N/A",
-                        "hora_llegada": arr_at.strftime("%H:%M") if arr_at else "N/A",
-                        "fecha_salida": dep_at.strftime("%d %b") if dep_at else "N/A",
-                        "fecha_llegada": arr_at.strftime("%d %b") if arr_at else "N/A",
-                        "aerolinea": carrier_code,
-                        "vuelo": full_flight,
-                        "duracion": self._parse_iso_duration(segment.get("duration")),
-                        "avion": (segment.get("aircraft") or {}).get("code", "Avión"),
-                        "img_logo": f"https://pics.avs.io/64/64/{carrier_code}.png",
-                        "escala_duracion": escala_duracion,
-                    })
+                    segmentos.append(SegmentoCompacto(
+                        salida=(segment.get("departure") or {}).get("iataCode", ""),
+                        llegada=(segment.get("arrival") or {}).get("iataCode", ""),
+                        ciudad_salida=(segment.get("departure") or {}).get("iataCode", ""),
+                        ciudad_llegada=(segment.get("arrival") or {}).get("iataCode", ""),
+                        salida_dt=dep_at,
+                        llegada_dt=arr_at,
+                        aerolinea=carrier_code,
+                        carrier=carrier_code,
+                        vuelo=full_flight,
+                        duracion=self._parse_iso_duration(segment.get("duration")),
+                        avion=(segment.get("aircraft") or {}).get("code", "Avión"),
+                        escala_duracion=escala_duracion,
+                    ))
 
                 first_segment = segmentos[0]
                 last_segment = segmentos[-1]
+                origen_oferta = first_segment.salida or (origen or "").upper()
+                destino_oferta = last_segment.llegada or (destino or "").upper()
+                duracion_itinerario = self._parse_iso_duration(itinerary.get("duration"))
                 validating_carrier = ((offer.get("validatingAirlineCodes") or [""])[0] or "XX").upper()
                 price_obj = offer.get("price") or {}
                 total_amount = float(price_obj.get("grandTotal") or 0)
                 currency = price_obj.get("currency") or self.currency
                 con_maleta = self._has_checked_bag(offer)
 
-                resultados.append({
-                    "id": f"amadeus_{offer.get('id')}",
-                    "source": "Amadeus",
-                    "amadeus_full_offer": offer,
-                    "aerolinea": validating_carrier,
-                    "img_logo": f"https://pics.avs.io/200/200/{validating_carrier}.png",
-                    "origen": first_segment.get("salida") or (origen or "").upper(),
-                    "destino": last_segment.get("llegada") or (destino or "").upper(),
-                    "trayectos": [{
-                        "origen": first_segment.get("salida") or (origen or "").upper(),
-                        "destino": last_segment.get("llegada") or (destino or "").upper(),
-                        "duracion": self._parse_iso_duration(itinerary.get("duration")),
-                        "segmentos": segmentos,
-                    }],
-                    "hora_salida": first_segment.get("hora_salida", "N/A"),
-                    "hora_llegada": last_segment.get("hora_llegada", "N/A"),
-                    "duracion": self._parse_iso_duration(itinerary.get("duration")) or first_segment.get("duracion", "N/A"),
-                    "precio_base": total_amount,
-                    "precio": total_amount,
-                    "currency": currency,
-                    "escala": max(0, len(segmentos) - 1),
-                    "segmentos": segmentos,
-                    "passengers": [],
-                    "condiciones": {},
-                    "con_maleta": con_maleta,
-                    "available_services": [],
-                    "familia_tarifaria": "Basic",
-                    "reservable": True,
-                    "motivo_no_reservable": "",
-                })
-
-            resultados.sort(key=lambda x: x.get("precio", 0))
+                offer_id = f"amadeus_{offer.get('id')}"
+
+                resultados.append(OfertaCompacta(
+                    id=offer_id,
+                    source="Amadeus",
+                    aerolinea=validating_carrier,
+                    carrier=validating_carrier,
+                    origen=origen_oferta,
+                    destino=destino_oferta,
+                    duracion=duracion_itinerario or first_segment.duracion or "N/A",
+                    trayectos=[TrayectoCompacto(
+                        origen=origen_oferta,
+                        destino=destino_oferta,
+                        duracion=duracion_itinerario,
+                        segmentos=segmentos,
+                    )],
+                    precio_base=total_amount,
+                    precio=total_amount,
+                    currency=currency,
+                    con_maleta=con_maleta,
+                    familia_tarifaria="Basic",
+                    # La oferta completa es necesaria para pricing/booking: va en línea, no como blob
+                    extra={"reservable": True, "motivo_no_reservable": "", "passengers": [], "amadeus_full_offer": offer},
+                ))
+
+            resultados.sort(key=lambda x: x.precio)
             logger.info(f"✅ Amadeus retornó {len(resultados)} ofertas para fallback {origen}->{destino}")
             return resultados
 
@@ -286,11 +486,7 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            headers = {"Content-Type": "application/json"}
 
             # Construir payload de orden con oferta completa
             order_payload = {
@@ -400,11 +596,11 @@ class AmadeusAdapter:
 
             # Enviar crear orden
             logger.info(f"📝 Creando orden Amadeus para {len(pasajeros)} viajeros con oferta validada...")
-            response = requests.post(
-                self.ORDER_URL,
+            response = self._amadeus_request(
+                'post', self.ORDER_URL,
                 json=order_payload,
                 headers=headers,
-                timeout=30
+                endpoint='amadeus_booking'
             )
 
             if response.status_code >= 400:
@@ -448,11 +644,7 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            headers = {"Content-Type": "application/json"}
 
             # Payload para emisión - intentar múltiples variantes
             # Variante 1: Solo queuingOfficeId (PNR)
@@ -463,11 +655,11 @@ class AmadeusAdapter:
             }
 
             logger.info(f"🎫 Emitiendo eTickets para orden {order_id} (PNR: {pnr})...")
-            response = requests.post(
-                self.TICKET_URL,
+            response = self._amadeus_request(
+                'post', self.TICKET_URL,
                 json=ticket_payload,
                 headers=headers,
-                timeout=30
+                endpoint='amadeus_booking'
             )
 
             # Si falla con 404, intentar con order_id en URL
@@ -477,11 +669,11 @@ class AmadeusAdapter:
                 if order_data.get('data', {}).get('associatedRecords'):
                     ticket_payload["data"]["associatedRecords"] = order_data["data"].get("associatedRecords", [])
                 
-                response = requests.post(
-                    self.TICKET_URL,
+                response = self._amadeus_request(
+                    'post', self.TICKET_URL,
                     json=ticket_payload,
                     headers=headers,
-                    timeout=30
+                    endpoint='amadeus_booking'
                 )
 
             if response.status_code >= 400:
@@ -524,11 +716,7 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            headers = {"Content-Type": "application/json"}
 
             # Payload de validación
             pricing_payload = {
@@ -538,11 +726,11 @@ class AmadeusAdapter:
             }
 
             logger.info(f"💰 Validando precio para {len(flight_offers)} oferta(s)...")
-            response = requests.post(
-                self.PRICING_URL,
+            response = self._amadeus_request(
+                'post', self.PRICING_URL,
                 json=pricing_payload,
                 headers=headers,
-                timeout=30
+                endpoint='amadeus_booking'
             )
 
             if response.status_code >= 400:
@@ -596,14 +784,11 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             logger.info(f"🔍 Recuperando orden {order_id}...")
-            response = requests.get(
-                f"{self.ORDER_URL}/{order_id}",
-                headers=headers,
-                timeout=30
+            response = self._amadeus_request(
+                'get', f"{self.ORDER_URL}/{order_id}",
+                endpoint='amadeus_booking'
             )
 
             if response.status_code >= 400:
@@ -642,14 +827,11 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             logger.info(f"🛑 Cancelando orden {order_id}...")
-            response = requests.delete(
-                f"{self.ORDER_URL}/{order_id}",
-                headers=headers,
-                timeout=30
+            response = self._amadeus_request(
+                'delete', f"{self.ORDER_URL}/{order_id}",
+                endpoint='amadeus_booking'
             )
 
             if response.status_code not in [200, 204]:
@@ -688,19 +870,16 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             params = {
                 "flightOfferId": flight_offer_id.replace('amadeus_', '')
             }
 
             logger.info(f"🪑 Obteniendo mapa de asientos para {flight_offer_id}...")
-            response = requests.get(
-                self.SEATMAP_URL,
-                headers=headers,
+            response = self._amadeus_request(
+                'get', self.SEATMAP_URL,
                 params=params,
-                timeout=30
+                endpoint='amadeus_shopping'
             )
 
             if response.status_code >= 400:
@@ -738,19 +917,16 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             params = {
                 "flightOfferId": flight_offer_id.replace('amadeus_', '')
             }
 
             logger.info(f"⬆️ Obteniendo ofertas de upsell para {flight_offer_id}...")
-            response = requests.get(
-                self.UPSELL_URL,
-                headers=headers,
+            response = self._amadeus_request(
+                'get', self.UPSELL_URL,
                 params=params,
-                timeout=30
+                endpoint='amadeus_shopping'
             )
 
             if response.status_code >= 400:
@@ -788,11 +964,7 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            headers = {"Content-Type": "application/json"}
 
             availability_payload = {
                 "originLocationCode": origen,
@@ -807,11 +979,11 @@ class AmadeusAdapter:
 
             logger.info(f"📅 Buscando disponibilidad: {origen}->{destino} "
                        f"en cabina {cabina}...")
-            response = requests.post(
-                self.AVAILABILITY_URL,
+            response = self._amadeus_request(
+                'post', self.AVAILABILITY_URL,
                 json=availability_payload,
                 headers=headers,
-                timeout=30
+                endpoint='amadeus_shopping'
             )
 
             if response.status_code >= 400:
@@ -853,32 +1025,10 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
-            params = {
-                "keyword": keyword,
-                "subType": subtype,
-                "page": {"limit": 50}
-            }
-
-            logger.info(f"🌍 Buscando ubicaciones para '{keyword}'...")
-            response = requests.get(
-                self.LOCATIONS_URL,
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-
-            if response.status_code >= 400:
-                logger.warning(f"⚠️ Location search error {response.status_code}")
-                return {'success': True, 'locations': []}
-
-            locations_data = response.json()
+            clave = f"{(keyword or '').strip().upper()}|{subtype}"
+            locations_data = self.referencias.obtener('locations', clave)
             locations = locations_data.get('data', [])
 
-            logger.info(f"✅ Ubicaciones encontradas: {len(locations)}")
-            
             return {
                 'success': True,
                 'locations': locations,
@@ -902,33 +1052,11 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
-            params = {
-                "latitude": latitud,
-                "longitude": longitud,
-                "radius": radio,
-                "page": {"limit": 50}
-            }
-
-            logger.info(f"📍 Buscando aeropuertos cercanos a ({latitud}, {longitud})...")
-            response = requests.get(
-                self.NEAREST_AIRPORTS_URL,
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-
-            if response.status_code >= 400:
-                logger.warning(f"⚠️ Nearest airports error {response.status_code}")
-                return {'success': True, 'airports': []}
-
-            airports_data = response.json()
+            # Redondeo a ~1 km: posiciones casi iguales comparten entrada de caché
+            clave = f"{round(float(latitud), 2)}|{round(float(longitud), 2)}|{int(radio)}"
+            airports_data = self.referencias.obtener('nearest_airports', clave)
             airports = airports_data.get('data', [])
 
-            logger.info(f"✅ Aeropuertos cercanos: {len(airports)}")
-            
             return {
                 'success': True,
                 'airports': airports,
@@ -951,25 +1079,9 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
-            logger.info(f"✈️ Buscando rutas directas desde {codigo_aeropuerto}...")
-            response = requests.get(
-                f"{self.ROUTES_URL}/{codigo_aeropuerto}",
-                headers=headers,
-                timeout=30
-            )
-
-            if response.status_code >= 400:
-                logger.warning(f"⚠️ Routes error {response.status_code}")
-                return {'success': True, 'destinations': []}
-
-            routes_data = response.json()
+            routes_data = self.referencias.obtener('direct_routes', (codigo_aeropuerto or '').strip().upper())
             destinations = routes_data.get('data', [])
 
-            logger.info(f"✅ Rutas directas encontradas: {len(destinations)}")
-            
             return {
                 'success': True,
                 'destinations': destinations,
@@ -992,44 +1104,90 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
             # Si es string, convertir a list
             if isinstance(codigos_aerolinea, str):
                 codigos_aerolinea = [codigos_aerolinea]
+            codigos = [c.strip().upper() for c in codigos_aerolinea if c and c.strip()]
 
-            params = {
-                "airlineCodes": ",".join(codigos_aerolinea)
-            }
+            # Solo los códigos que no están en caché van a la API, todos en una llamada
+            por_codigo = self.referencias.obtener_muchos('airlines', codigos)
+            airlines = [por_codigo[c] for c in dict.fromkeys(codigos) if por_codigo.get(c)]
 
-            logger.info(f"🚁 Obteniendo info de aerolíneas: {', '.join(codigos_aerolinea)}")
-            response = requests.get(
-                self.AIRLINES_URL,
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-
-            if response.status_code >= 400:
-                logger.warning(f"⚠️ Airlines lookup error {response.status_code}")
-                return {'success': True, 'airlines': []}
-
-            airlines_data = response.json()
-            airlines = airlines_data.get('data', [])
-
-            logger.info(f"✅ Aerolíneas obtenidas: {len(airlines)}")
-            
             return {
                 'success': True,
                 'airlines': airlines,
-                'airlines_data': airlines_data
+                'airlines_data': {'data': airlines}
             }
 
         except Exception as exc:
             logger.warning(f"⚠️ Error obteniendo aerolíneas: {exc}")
             return {'success': True, 'airlines': []}
 
+    # ============================================================================
+    # CARGADORES DE DATOS DE REFERENCIA (usados por referencias_amadeus)
+    # ============================================================================
+
+    def _registrar_referencias(self):
+        def _ttl(nombre, defecto):
+            return int(os.getenv(f'AMADEUS_REF_TTL_{nombre}_SECONDS', str(defecto)))
+
+        dia = 86400
+        # Palabras clave y coordenadas vienen del usuario: se cachean pero no se refrescan en bloque
+        self.referencias.registrar('locations', self._cargar_por_clave(self._cargar_ubicaciones), _ttl('LOCATIONS', 7 * dia))
+        self.referencias.registrar('nearest_airports', self._cargar_por_clave(self._cargar_cercanos), _ttl('NEAREST', 7 * dia))
+        self.referencias.registrar('direct_routes', self._cargar_por_clave(self._cargar_rutas), _ttl('ROUTES', dia),
+                                   refrescable=True)
+        self.referencias.registrar('checkin_links', self._cargar_por_clave(self._cargar_links_checkin),
+                                   _ttl('CHECKIN_LINKS', 7 * dia), refrescable=True)
+        self.referencias.registrar('airlines', self._cargar_aerolineas, _ttl('AIRLINES', 30 * dia), tam_lote=50,
+                                   refrescable=True)
+
+    @staticmethod
+    def _cargar_por_clave(cargador):
+        return lambda claves: {clave: cargador(clave) for clave in claves}
+
+    def _get_referencia(self, url, params=None, etiqueta='reference'):
+        """GET autenticado a un endpoint de referencia; un error HTTP lanza excepción (no se cachea)."""
+        response = self._amadeus_request('get', url, params=params, endpoint='amadeus_reference')
+        if response.status_code >= 400:
+            raise RuntimeError(f"{etiqueta} error {response.status_code}")
+        return response.json()
+
+    def _cargar_ubicaciones(self, clave):
+        keyword, subtype = clave.split('|', 1)
+        logger.info(f"🌍 Buscando ubicaciones para '{keyword}'...")
+        return self._get_referencia(
+            self.LOCATIONS_URL, {"keyword": keyword, "subType": subtype, "page": {"limit": 50}}, 'Location search'
+        )
+
+    def _cargar_cercanos(self, clave):
+        latitud, longitud, radio = clave.split('|')
+        logger.info(f"📍 Buscando aeropuertos cercanos a ({latitud}, {longitud})...")
+        return self._get_referencia(
+            self.NEAREST_AIRPORTS_URL,
+            {"latitude": latitud, "longitude": longitud, "radius": radio, "page": {"limit": 50}},
+            'Nearest airports'
+        )
+
+    def _cargar_rutas(self, codigo_aeropuerto):
+        logger.info(f"✈️ Buscando rutas directas desde {codigo_aeropuerto}...")
+        return self._get_referencia(f"{self.ROUTES_URL}/{codigo_aeropuerto}", etiqueta='Routes')
+
+    def _cargar_links_checkin(self, codigo_aerolinea):
+        logger.info(f"🔗 Obteniendo enlaces de check-in para {codigo_aerolinea}...")
+        return self._get_referencia(self.CHECKIN_LINKS_URL, {"airlineCode": codigo_aerolinea}, 'Check-in links')
+
+    def _cargar_aerolineas(self, codigos):
+        logger.info(f"🚁 Obteniendo info de aerolíneas: {', '.join(codigos)}")
+        airlines = self._get_referencia(self.AIRLINES_URL, {"airlineCodes": ",".join(codigos)}, 'Airlines lookup').get('data', [])
+        return {a.get('iataCode'): a for a in airlines if a.get('iataCode')}
+
+    def refrescar_referencias(self, tipos=None):
+        """Refresco en bloque (admin) de todos los datos de referencia conocidos."""
+        if not self.is_configured():
+            return {}
+        return self.referencias.refrescar(tipos)
+
     # ============================================================================
     # TIER 4: POST-BOOKING
     # ============================================================================
@@ -1048,8 +1206,6 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
 
             params = {
                 "carrierCode": codigo_aerolinea,
@@ -1059,11 +1215,10 @@ class AmadeusAdapter:
 
             logger.info(f"📊 Obteniendo estado de vuelo {codigo_aerolinea}{numero_vuelo} "
                        f"el {fecha_salida}...")
-            response = requests.get(
-                self.FLIGHT_STATUS_URL,
-                headers=headers,
+            response = self._amadeus_request(
+                'get', self.FLIGHT_STATUS_URL,
                 params=params,
-                timeout=30
+                endpoint='amadeus_reference'
             )
 
             if response.status_code >= 400:
@@ -1099,30 +1254,9 @@ class AmadeusAdapter:
             return {'success': False, 'error': 'Amadeus no configurado'}
 
         try:
-            token = self._get_access_token()
-            headers = {"Authorization": f"Bearer {token}"}
-
-            params = {
-                "airlineCode": codigo_aerolinea
-            }
-
-            logger.info(f"🔗 Obteniendo enlaces de check-in para {codigo_aerolinea}...")
-            response = requests.get(
-                self.CHECKIN_LINKS_URL,
-                headers=headers,
-                params=params,
-                timeout=30
-            )
-
-            if response.status_code >= 400:
-                logger.warning(f"⚠️ Check-in links error {response.status_code}")
-                return {'success': True, 'checkin_links': []}
-
-            checkin_data = response.json()
+            checkin_data = self.referencias.obtener('checkin_links', (codigo_aerolinea or '').strip().upper())
             checkin_links = checkin_data.get('data', [])
 
-            logger.info(f"✅ Enlaces de check-in obtenidos: {len(checkin_links)}")
-            
             return {
                 'success': True,
                 'checkin_links': checkin_links,
@@ -1131,4 +1265,4 @@ class AmadeusAdapter:
 
         except Exception as exc:
             logger.warning(f"⚠️ Error obteniendo enlaces de check-in: {exc}")
-            return {'success': True, 'checkin_links': []}
\ No newline at end of file
+            return {'success': True, 'checkin_links': []}
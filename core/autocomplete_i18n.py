@@ -1,5 +1,11 @@
-import unicodedata
+import json
+import logging
+import os
 import re
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
 
 
 def normalizar_texto(texto: str) -> str:
@@ -338,22 +344,244 @@ def construir_terminos_busqueda(termino_raw: str) -> list[str]:
     return terminos
 
 
-def buscar_fallback_es(termino_raw: str, limit: int = 10):
-    termino_norm = normalizar_texto(termino_raw)
-    if len(termino_norm) < 2:
-        return []
+def distancia_edicion(a: str, b: str, maximo: int) -> int:
+    """Distancia Damerau-Levenshtein (transposiciones adyacentes); corta en cuanto supera `maximo`."""
+    if abs(len(a) - len(b)) > maximo:
+        return maximo + 1
+    anterior2 = None
+    anterior = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        actual = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            coste = 0 if ca == cb else 1
+            actual[j] = min(anterior[j] + 1, actual[j - 1] + 1, anterior[j - 1] + coste)
+            if anterior2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                actual[j] = min(actual[j], anterior2[j - 2] + 1)
+        if min(actual) > maximo:
+            return maximo + 1
+        anterior2, anterior = anterior, actual
+    return anterior[-1]
+
+
+class IndiceDifuso:
+    """
+    Corrector de erratas estilo SymSpell ("barcelna", "frncfort", "londers").
+
+    Al construir se generan todas las variantes de cada término con hasta `distancia_max`
+    letras borradas; una consulta genera sus propios borrados y solo verifica con
+    Damerau-Levenshtein los términos que comparten alguno. Sin red y sin recorrer el vocabulario.
+    """
+
+    def __init__(self, distancia_max=2, longitud_max=24):
+        self.distancia_max = distancia_max
+        self.longitud_max = longitud_max
+        self._terminos = {}
+        self._borrados = {}
+
+    def _variantes(self, termino, distancia):
+        variantes = {termino}
+        frontera = {termino}
+        for _ in range(distancia):
+            frontera = {t[:i] + t[i + 1:] for t in frontera if len(t) > 1 for i in range(len(t))}
+            variantes |= frontera
+        return variantes
+
+    def agregar(self, termino, valor):
+        if len(termino) > self.longitud_max:
+            return
+        nuevo = termino not in self._terminos
+        self._terminos.setdefault(termino, set()).add(valor)
+        if nuevo:
+            for variante in self._variantes(termino, self.distancia_max):
+                self._borrados.setdefault(variante, []).append(termino)
+
+    def buscar(self, termino):
+        """{valor: distancia} de los términos a distancia <= límite (1 para términos de hasta 4 letras)."""
+        maximo = 1 if len(termino) <= 4 else self.distancia_max
+        if len(termino) > self.longitud_max + maximo:
+            return {}
+        candidatos = set()
+        for variante in self._variantes(termino, maximo):
+            candidatos.update(self._borrados.get(variante, ()))
+
+        resultado = {}
+        for candidato in candidatos:
+            distancia = distancia_edicion(termino, candidato, maximo)
+            if distancia > maximo:
+                continue
+            for valor in self._terminos[candidato]:
+                if distancia < resultado.get(valor, maximo + 1):
+                    resultado[valor] = distancia
+        return resultado
+
+    def __len__(self):
+        return len(self._terminos)
+
+
+AIRPORTS_DATASET_PATH = os.path.join(os.path.dirname(__file__), 'data', 'airports.json')
+
+
+class IndiceAeropuertos:
+    """
+    Índice en memoria de aeropuertos/ciudades para el autocompletado.
+
+    Se construye una vez al arrancar: cada nombre y palabra clave se normaliza una sola vez
+    y se inserta en un trie de prefijos (frases completas y cada palabra), más un mapa
+    palabra -> entradas. Cada nodo guarda sus entradas ya ordenadas por popularidad, así que
+    una consulta es recorrer tantos nodos como letras tiene el término.
 
-    resultados = []
-    vistos = set()
+    El corrector de erratas (IndiceDifuso) va aparte, en `corregir`: con un dataset pequeño
+    un aeropuerto real que no está en él ("split", "cork") se "corregiría" a otra ciudad, así
+    que solo debe usarse cuando la búsqueda remota tampoco encuentra nada.
+    """
 
-    for aeropuerto in FALLBACK_AIRPORTS:
-        label_norm = normalizar_texto(aeropuerto['label'])
-        keywords_norm = [normalizar_texto(k) for k in aeropuerto.get('keywords', [])]
+    _IDS = None  # clave del nodo del trie con las entradas que cuelgan de él
 
-        if termino_norm in label_norm or any(termino_norm in kw for kw in keywords_norm):
-            key = (aeropuerto['label'], aeropuerto['value'])
-            if key not in vistos:
-                resultados.append({'label': aeropuerto['label'], 'value': aeropuerto['value']})
-                vistos.add(key)
+    def __init__(self, entradas=()):
+        self._entradas = []
+        self._popularidad = []
+        self._trie = {}
+        self._palabras = {}
+        self._por_codigo = {}
+        self._difuso = IndiceDifuso()
+        self.nodos = 0
+        self.construido_ms = 0.0
+        self.consultas = 0
+        self.corregidas = 0
+        self.sin_resultado = 0
+        self.construir(entradas)
 
-    return resultados[:limit]
+    @classmethod
+    def desde_fichero(cls, ruta=None):
+        """Carga el dataset empaquetado (core/data/airports.json); si falta, usa FALLBACK_AIRPORTS."""
+        ruta = ruta or os.getenv('AIRPORTS_DATASET_PATH') or AIRPORTS_DATASET_PATH
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                entradas = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Dataset de aeropuertos no disponible ({e}), usando lista básica")
+            entradas = FALLBACK_AIRPORTS
+        return cls(entradas)
+
+    # ==========================================
+    # CONSTRUCCIÓN
+    # ==========================================
+    def construir(self, entradas):
+        inicio = time.perf_counter()
+        for entrada in entradas:
+            idx = len(self._entradas)
+            codigo = entrada['value'].upper()
+            self._entradas.append({'label': entrada['label'], 'value': codigo})
+            self._popularidad.append(entrada.get('popularity', 0))
+            self._por_codigo[codigo.lower()] = idx
+
+            # Nombre sin el "(MAD)" final + palabras clave ES/EN/CA + el propio código
+            nombre = re.sub(r'\([A-Z0-9]{3}\)\s*$', '', entrada['label'])
+            textos = {normalizar_texto(t) for t in [nombre, codigo, *entrada.get('keywords', [])]}
+            for texto in filter(None, textos):
+                self._insertar(texto, idx)
+                self._difuso.agregar(texto, idx)
+                for palabra in texto.split():
+                    self._insertar(palabra, idx)
+                    self._palabras.setdefault(palabra, set()).add(idx)
+                    self._difuso.agregar(palabra, idx)
+
+        self._ordenar(self._trie)
+        self.construido_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        logger.info(f"🗺️ Índice de aeropuertos: {len(self._entradas)} entradas, {self.nodos} nodos ({self.construido_ms} ms)")
+
+    def _insertar(self, texto, idx):
+        nodo = self._trie
+        for letra in texto:
+            hijo = nodo.get(letra)
+            if hijo is None:
+                hijo = nodo[letra] = {self._IDS: set()}
+                self.nodos += 1
+            hijo[self._IDS].add(idx)
+            nodo = hijo
+
+    def _ordenar(self, raiz):
+        pendientes = [raiz]
+        while pendientes:
+            nodo = pendientes.pop()
+            for letra, hijo in nodo.items():
+                if letra is self._IDS:
+                    continue
+                hijo[self._IDS] = tuple(sorted(hijo[self._IDS], key=lambda i: -self._popularidad[i]))
+                pendientes.append(hijo)
+
+    # ==========================================
+    # CONSULTA
+    # ==========================================
+    def _prefijo(self, texto):
+        nodo = self._trie
+        for letra in texto:
+            nodo = nodo.get(letra)
+            if nodo is None:
+                return ()
+        return nodo[self._IDS]
+
+    def buscar(self, termino_raw: str, limit: int = 10):
+        """Sugerencias {'label', 'value'} por prefijo, ordenadas por popularidad (código IATA exacto primero)."""
+        termino = normalizar_texto(termino_raw)
+        if len(termino) < 2:
+            return []
+        self.consultas += 1
+
+        ids = self._prefijo(termino)
+        if not ids and ' ' in termino:
+            # "paris orly", "de gaulle paris": cada palabra es prefijo de alguna palabra de la entrada
+            comunes = None
+            for palabra in termino.split():
+                encontrados = set(self._prefijo(palabra))
+                comunes = encontrados if comunes is None else comunes & encontrados
+                if not comunes:
+                    break
+            ids = sorted(comunes or (), key=lambda i: -self._popularidad[i])
+
+        exacto = self._por_codigo.get(termino)
+        if exacto is not None:
+            ids = [exacto] + [i for i in ids if i != exacto]
+
+        if not ids:
+            self.sin_resultado += 1
+        return [dict(self._entradas[i]) for i in ids[:limit]]
+
+    def corregir(self, termino_raw: str, limit: int = 10):
+        """
+        Entradas a distancia de edición <= 2 del término (menor distancia primero y, a igualdad,
+        más popular). Último recurso: llamar solo si ni el índice ni Duffel encontraron nada.
+        """
+        termino = normalizar_texto(termino_raw)
+        if len(termino) < 3:
+            return []
+        distancias = self._difuso.buscar(termino)
+        ids = sorted(distancias, key=lambda i: (distancias[i], -self._popularidad[i]))
+        if ids:
+            self.corregidas += 1
+        return [dict(self._entradas[i]) for i in ids[:limit]]
+
+    def get_stats(self):
+        return {
+            'entries': len(self._entradas),
+            'trie_nodes': self.nodos,
+            'words': len(self._palabras),
+            'fuzzy_terms': len(self._difuso),
+            'fuzzy_deletes': len(self._difuso._borrados),
+            'build_ms': self.construido_ms,
+            'queries': self.consultas,
+            'corrected': self.corregidas,
+            'no_match': self.sin_resultado,
+        }
+
+
+# Índice global, construido una vez al importar el módulo
+indice_aeropuertos = IndiceAeropuertos.desde_fichero()
+
+
+def buscar_fallback_es(termino_raw: str, limit: int = 10):
+    """
+    Búsqueda local por prefijo (compatibilidad). No corrige erratas: `corregir` solo debe
+    aplicarse después de que Duffel no encuentre nada (ver IndiceAeropuertos).
+    """
+    return indice_aeropuertos.buscar(termino_raw, limit)
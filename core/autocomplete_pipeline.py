@@ -0,0 +1,165 @@
+"""
+Autocompletado remoto (Duffel) con caché compartida y reutilización de prefijos.
+
+Solo se llega aquí cuando el índice local de aeropuertos no tiene coincidencias:
+- las expansiones de `construir_terminos_busqueda` se lanzan en paralelo y gana la primera
+  respuesta no vacía (antes se probaban una tras otra);
+- el resultado se guarda por término normalizado en L1 (proceso) y Redis (`airports:<término>`);
+- si el usuario alarga un término ya cacheado ("mad" tras "ma") se filtra localmente
+  el superconjunto en lugar de volver a preguntar a Duffel.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core.autocomplete_i18n import construir_terminos_busqueda, normalizar_texto
+from core.lru_cache import CacheLRU
+
+try:
+    from cache.redis_cache import cache_airport_suggestions, get_cached_airport_suggestions_many
+except ImportError:
+    cache_airport_suggestions = None
+    get_cached_airport_suggestions_many = None
+
+logger = logging.getLogger(__name__)
+
+# Duffel devuelve como mucho 10 sugerencias: con menos, la respuesta es completa
+LIMITE_SUGERENCIAS = 10
+
+
+class PipelineAutocompletado:
+    """Sugerencias remotas cacheadas por término normalizado, con carrera entre expansiones."""
+
+    def __init__(self, buscar, ttl=None, ttl_vacio=None, timeout=None, max_workers=None, max_entries=None):
+        self.buscar = buscar
+        self.ttl = int(ttl or os.getenv('AUTOCOMPLETE_CACHE_TTL_SECONDS', '86400'))
+        self.ttl_vacio = int(ttl_vacio or os.getenv('AUTOCOMPLETE_EMPTY_TTL_SECONDS', '600'))
+        self.timeout = float(timeout or os.getenv('AUTOCOMPLETE_UPSTREAM_TIMEOUT_SECONDS', '8'))
+        self._pool = ThreadPoolExecutor(
+            max_workers=int(max_workers or os.getenv('AUTOCOMPLETE_WORKERS', '8')),
+            thread_name_prefix='autocomplete'
+        )
+        self._l1 = CacheLRU(max_entries=int(max_entries or os.getenv('AUTOCOMPLETE_L1_ENTRIES', '2000')), default_ttl=self.ttl)
+
+        self.hits = 0
+        self.hits_prefijo = 0
+        self.llamadas = 0
+
+    # ==========================================
+    # CACHÉ
+    # ==========================================
+    def _leer(self, claves):
+        """{clave: entrada} desde L1 y, para lo que falte, un único MGET a Redis."""
+        encontradas = {}
+        faltan = []
+        for clave in claves:
+            entrada = self._l1.get(clave)
+            if entrada is not None:
+                encontradas[clave] = entrada
+            else:
+                faltan.append(clave)
+
+        if faltan and get_cached_airport_suggestions_many:
+            for clave, entrada in get_cached_airport_suggestions_many(faltan).items():
+                if isinstance(entrada, dict) and 'sugerencias' in entrada:
+                    encontradas[clave] = entrada
+                    self._l1.put(clave, entrada, ttl=self.ttl if entrada['sugerencias'] else self.ttl_vacio)
+        return encontradas
+
+    def _guardar(self, clave, entrada):
+        ttl = self.ttl if entrada['sugerencias'] else self.ttl_vacio
+        self._l1.put(clave, entrada, ttl=ttl)
+        if cache_airport_suggestions:
+            cache_airport_suggestions(clave, entrada, ttl=ttl)
+
+    @staticmethod
+    def _filtrar(sugerencias, termino):
+        """Sugerencias cuyo label contiene todas las palabras del término como prefijo de alguna palabra."""
+        palabras = termino.split()
+        filtradas = []
+        for sugerencia in sugerencias:
+            palabras_label = normalizar_texto(sugerencia.get('label', '')).split()
+            if all(any(pl.startswith(p) for pl in palabras_label) for p in palabras):
+                filtradas.append(sugerencia)
+        return filtradas
+
+    def _desde_prefijo(self, termino, entradas):
+        # El prefijo cacheado más largo cuyo término ganador también es prefijo de lo tecleado
+        for longitud in range(len(termino) - 1, 1, -1):
+            entrada = entradas.get(termino[:longitud])
+            if not entrada or not termino.startswith(entrada.get('termino', '')):
+                continue
+            filtradas = self._filtrar(entrada['sugerencias'], termino)
+            # Superconjunto completo: el filtrado es exacto (aunque quede vacío).
+            # Truncado a 10: solo sirve si aún queda algo.
+            if entrada.get('completo') or filtradas:
+                return {'termino': entrada['termino'], 'sugerencias': filtradas, 'completo': bool(entrada.get('completo'))}
+        return None
+
+    # ==========================================
+    # CONSULTA
+    # ==========================================
+    def sugerir(self, termino_raw):
+        termino = normalizar_texto(termino_raw)
+        if len(termino) < 2:
+            return []
+
+        entradas = self._leer([termino[:n] for n in range(len(termino), 1, -1)])
+        entrada = entradas.get(termino)
+        if entrada is not None:
+            self.hits += 1
+            return entrada['sugerencias']
+
+        entrada = self._desde_prefijo(termino, entradas)
+        if entrada is not None:
+            self.hits_prefijo += 1
+            self._l1.put(termino, entrada, ttl=self.ttl if entrada['sugerencias'] else self.ttl_vacio)
+            return entrada['sugerencias']
+
+        ganador, sugerencias, errores = self._carrera(construir_terminos_busqueda(termino_raw))
+        # Si todas las expansiones fallaron no se cachea el vacío: el siguiente intento vuelve a Duffel
+        if sugerencias or not errores:
+            self._guardar(termino, {
+                'termino': normalizar_texto(ganador) if sugerencias else termino,
+                'sugerencias': sugerencias,
+                'completo': len(sugerencias) < LIMITE_SUGERENCIAS,
+            })
+        return sugerencias
+
+    def _carrera(self, expansiones):
+        """Lanza todas las expansiones a la vez; retorna (término, sugerencias, errores) de la primera no vacía."""
+        self.llamadas += len(expansiones)
+        logger.info(f"🔮 Autocomplete remoto: {len(expansiones)} expansiones en paralelo {expansiones}")
+        pendientes = {self._pool.submit(self.buscar, term): term for term in expansiones}
+        errores = 0
+        try:
+            while pendientes:
+                hechos, _ = wait(pendientes, timeout=self.timeout, return_when=FIRST_COMPLETED)
+                if not hechos:
+                    logger.warning(f"⚠️ Autocomplete remoto sin respuesta en {self.timeout}s")
+                    errores += len(pendientes)
+                    break
+                for futuro in hechos:
+                    term = pendientes.pop(futuro)
+                    try:
+                        sugerencias = futuro.result()
+                    except Exception as e:
+                        errores += 1
+                        logger.error(f"❌ Error en Autocomplete API ({term}): {e}")
+                        continue
+                    if sugerencias:
+                        return term, sugerencias, errores
+        finally:
+            for futuro in pendientes:
+                futuro.cancel()
+        return None, [], errores
+
+    def get_stats(self):
+        return {
+            'entries': len(self._l1),
+            'hits': self.hits,
+            'prefix_hits': self.hits_prefijo,
+            'upstream_calls': self.llamadas,
+            'ttl_seconds': self.ttl,
+        }
@@ -0,0 +1,263 @@
+"""
+Refresco incremental del calendario de precios con presupuesto por minuto.
+
+Sustituye la reconstrucción diaria en bloque (todas las rutas x dos meses a una hora fija)
+por un goteo continuo: en cada tick se puntúan las celdas (ruta, día) del horizonte según
+demanda de la ruta, antigüedad de su tarifa en el índice y cercanía de la fecha de viaje,
+y solo se buscan las N mejores (N = llamadas por minuto configuradas).
+
+El progreso vive en el propio índice de tarifas (persistente) más un registro de intentos
+recientes en Redis (o en memoria), para no reintentar cada minuto los días sin vuelos.
+"""
+
+import logging
+import math
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from core.rate_budget import prioridad, PRIORIDAD_SEGUNDO_PLANO
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+
+class PlanificadorCalendario:
+    """
+    Elige y refresca las celdas (ruta, día) más valiosas dentro de un presupuesto de llamadas.
+    `rutas_demanda()` retorna {(origen, destino, adultos, ninos, bebes, clase): búsquedas recientes}.
+    """
+
+    REDIS_INTENTOS = "calendar_refresh:attempts"
+    REDIS_ESTADO = "calendar_refresh:state"
+
+    def __init__(self, motor_async, indice, rutas_demanda, llamadas_por_minuto=None, horizonte_dias=None,
+                 max_age_seconds=None, redis_cache=None):
+        self.motor_async = motor_async
+        self.indice = indice
+        self.rutas_demanda = rutas_demanda
+        self.llamadas_por_minuto = int(llamadas_por_minuto or os.getenv('CALENDAR_REFRESH_CALLS_PER_MINUTE', '20'))
+        self.horizonte_dias = int(horizonte_dias or os.getenv('CALENDAR_REFRESH_HORIZON_DAYS', '60'))
+        self.max_age_seconds = int(max_age_seconds or os.getenv('CALENDAR_INDEX_MAX_AGE_SECONDS', '86400'))
+        # Una celda con tarifa más nueva que esto no compite por presupuesto
+        self.min_age_seconds = int(os.getenv('CALENDAR_REFRESH_MIN_AGE_SECONDS', str(self.max_age_seconds // 4)))
+        # Tras intentar una celda (haya o no vuelos) no se reintenta hasta pasado este tiempo
+        self.reintento_seconds = int(os.getenv('CALENDAR_REFRESH_RETRY_SECONDS', '3600'))
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        # get_status consulta el índice una vez por ruta: el resumen se reutiliza unos segundos
+        self.status_cache_seconds = int(os.getenv('CALENDAR_REFRESH_STATUS_CACHE_SECONDS', '60'))
+        self._status_cache = {}
+
+        self._lock = threading.Lock()
+        self._intentos_local = {}
+        self._estado_local = {'ticks': 0, 'calls': 0, 'warmed': 0, 'last_tick': None, 'last_tick_calls': 0}
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    @staticmethod
+    def _clave_celda(ruta, dia):
+        return "|".join(str(v) for v in ruta) + f"|{dia}"
+
+    # ==========================================
+    # PROGRESO (intentos recientes y contadores)
+    # ==========================================
+    def _intentos_recientes(self):
+        """{clave_celda: timestamp} de los intentos dentro de la ventana de reintento."""
+        limite = time.time() - self.reintento_seconds
+        client = self._redis()
+        if client is not None:
+            try:
+                intentos = {
+                    (k.decode() if isinstance(k, bytes) else k): float(v)
+                    for k, v in client.hgetall(self.REDIS_INTENTOS).items()
+                }
+                caducados = [k for k, ts in intentos.items() if ts < limite]
+                if caducados:
+                    client.hdel(self.REDIS_INTENTOS, *caducados)
+                return {k: ts for k, ts in intentos.items() if ts >= limite}
+            except Exception as e:
+                logger.warning(f"⚠️ Progreso del refresco de calendario no disponible en Redis: {e}")
+
+        with self._lock:
+            self._intentos_local = {k: ts for k, ts in self._intentos_local.items() if ts >= limite}
+            return dict(self._intentos_local)
+
+    def _anotar(self, celdas, calientes):
+        ahora = time.time()
+        intentos = {self._clave_celda(ruta, dia): ahora for ruta, dia, _score in celdas}
+        incrementos = {'ticks': 1, 'calls': len(celdas), 'warmed': calientes}
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                if intentos:
+                    pipe.hset(self.REDIS_INTENTOS, mapping=intentos)
+                    pipe.expire(self.REDIS_INTENTOS, self.reintento_seconds * 2)
+                for campo, valor in incrementos.items():
+                    pipe.hincrby(self.REDIS_ESTADO, campo, valor)
+                pipe.hset(self.REDIS_ESTADO, mapping={
+                    'last_tick': datetime.utcnow().isoformat(),
+                    'last_tick_calls': len(celdas),
+                })
+                pipe.execute()
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo guardar el progreso del refresco de calendario: {e}")
+
+        with self._lock:
+            self._intentos_local.update(intentos)
+            for campo, valor in incrementos.items():
+                self._estado_local[campo] += valor
+            self._estado_local['last_tick'] = datetime.utcnow().isoformat()
+            self._estado_local['last_tick_calls'] = len(celdas)
+
+    def _estado(self):
+        client = self._redis()
+        if client is not None:
+            try:
+                datos = {
+                    (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                    for k, v in client.hgetall(self.REDIS_ESTADO).items()
+                }
+                return {
+                    'ticks': int(datos.get('ticks', 0)),
+                    'calls': int(datos.get('calls', 0)),
+                    'warmed': int(datos.get('warmed', 0)),
+                    'last_tick': datos.get('last_tick'),
+                    'last_tick_calls': int(datos.get('last_tick_calls', 0)),
+                }
+            except Exception as e:
+                logger.warning(f"⚠️ Estado del refresco de calendario no disponible en Redis: {e}")
+        with self._lock:
+            return dict(self._estado_local)
+
+    # ==========================================
+    # PRIORIZACIÓN
+    # ==========================================
+    def _dias_horizonte(self, hoy):
+        return [(hoy + timedelta(days=i)).isoformat() for i in range(self.horizonte_dias)]
+
+    def puntuar(self, demanda, edad, dias_hasta):
+        """
+        Valor de refrescar una celda: demanda de la ruta x antigüedad (sin tarifa = máxima)
+        x cercanía de la fecha de viaje. None si la tarifa es lo bastante nueva.
+        """
+        if edad is not None and edad < self.min_age_seconds:
+            return None
+        antiguedad = 3.0 if edad is None else min(edad / self.max_age_seconds, 3.0)
+        cercania = 0.5 + 1.0 / (1.0 + dias_hasta / 7.0)
+        return (1.0 + math.log1p(max(0, demanda))) * antiguedad * cercania
+
+    def _cobertura_rutas(self, hoy):
+        """{ruta: (demanda, {dia: edad|None})} para todas las rutas del horizonte."""
+        dias = self._dias_horizonte(hoy)
+        cobertura = {}
+        for ruta, demanda in self.rutas_demanda().items():
+            origen, destino, adultos, ninos, bebes, clase = ruta
+            tarifas = self.indice.consultar(origen, destino, dias[0], dias[-1], adultos, ninos, bebes, clase)
+            cobertura[ruta] = (demanda, {dia: (tarifas[dia]['age_seconds'] if dia in tarifas else None) for dia in dias})
+        return cobertura
+
+    def seleccionar(self, limite, hoy=None):
+        """Las `limite` celdas (ruta, día, score) con más valor, excluyendo las intentadas hace poco."""
+        hoy = hoy or date.today()
+        intentos = self._intentos_recientes()
+        candidatas = []
+        for ruta, (demanda, edades) in self._cobertura_rutas(hoy).items():
+            for i, (dia, edad) in enumerate(edades.items()):
+                if self._clave_celda(ruta, dia) in intentos:
+                    continue
+                score = self.puntuar(demanda, edad, i)
+                if score is not None:
+                    candidatas.append((ruta, dia, score))
+        candidatas.sort(key=lambda c: c[2], reverse=True)
+        return candidatas[:max(0, limite)]
+
+    # ==========================================
+    # EJECUCIÓN
+    # ==========================================
+    def tick(self):
+        """Un paso del refresco (pensado para ejecutarse cada minuto). Retorna celdas refrescadas."""
+        motor = self.motor_async.motor
+        if motor.is_rate_limited():
+            logger.info("⏳ Refresco de calendario: Duffel en cooldown, tick omitido")
+            return 0
+
+        celdas = self.seleccionar(self.llamadas_por_minuto)
+        if not celdas:
+            return 0
+
+        consultas = [
+            {
+                'origen': ruta[0], 'destino': ruta[1], 'fecha': dia,
+                'adultos': ruta[2], 'ninos': ruta[3], 'bebes': ruta[4], 'clase': ruta[5]
+            }
+            for ruta, dia, _score in celdas
+        ]
+
+        async def _lote():
+            # Solo presupuesto por encima de la reserva interactiva
+            with prioridad(PRIORIDAD_SEGUNDO_PLANO):
+                return await self.motor_async.buscar_vuelos_lote_async(consultas)
+
+        try:
+            resultados = self.motor_async.ejecutar(_lote(), timeout=55)
+        except Exception as e:
+            logger.warning(f"⚠️ Tick de refresco de calendario interrumpido: {e}")
+            return 0
+
+        calientes = sum(1 for r in resultados if r)
+        self._anotar(celdas, calientes)
+        logger.info(f"🔁 Refresco de calendario: {calientes}/{len(celdas)} celdas con tarifa")
+        return len(celdas)
+
+    def get_status(self, detalle_rutas=True):
+        """Cobertura (días con tarifa) y frescura (días con tarifa más nueva que max_age) por ruta."""
+        hoy = date.today()
+        clave = (hoy, bool(detalle_rutas))
+        cacheado = self._status_cache.get(clave)
+        if cacheado and time.time() - cacheado[0] < self.status_cache_seconds:
+            return dict(cacheado[1], progress=self._estado())
+
+        rutas = []
+        total_dias = total_cubiertos = total_frescos = 0
+        for ruta, (demanda, edades) in self._cobertura_rutas(hoy).items():
+            conocidas = sorted(e for e in edades.values() if e is not None)
+            frescos = sum(1 for e in conocidas if e < self.max_age_seconds)
+            total_dias += len(edades)
+            total_cubiertos += len(conocidas)
+            total_frescos += frescos
+            if detalle_rutas:
+                rutas.append({
+                    'route': f"{ruta[0]}-{ruta[1]}",
+                    'passengers': {'adultos': ruta[2], 'ninos': ruta[3], 'bebes': ruta[4]},
+                    'clase': ruta[5],
+                    'demand': demanda,
+                    'days': len(edades),
+                    'covered': len(conocidas),
+                    'fresh': frescos,
+                    'median_age_seconds': conocidas[len(conocidas) // 2] if conocidas else None,
+                    'oldest_age_seconds': conocidas[-1] if conocidas else None,
+                })
+        rutas.sort(key=lambda r: r['demand'], reverse=True)
+
+        estado = {
+            'calls_per_minute': self.llamadas_por_minuto,
+            'horizon_days': self.horizonte_dias,
+            'max_age_seconds': self.max_age_seconds,
+            'coverage': f"{(total_cubiertos / total_dias * 100) if total_dias else 0:.1f}%",
+            'freshness': f"{(total_frescos / total_dias * 100) if total_dias else 0:.1f}%",
+            'cells': {'total': total_dias, 'covered': total_cubiertos, 'fresh': total_frescos},
+            'progress': self._estado(),
+            'routes': rutas,
+        }
+        self._status_cache = {clave: (time.time(), estado)}
+        return estado
@@ -0,0 +1,337 @@
+"""
+Cliente asíncrono (asyncio) de Duffel para cargas fan-out.
+
+Misma superficie que MotorBusqueda (buscar_vuelos, get_offer_details, get_seat_maps,
+get_order_details) y misma normalización (_procesar_ofertas, markup, top, caché L1/L2),
+pero permitiendo lanzar N peticiones concurrentes acotadas por un semáforo.
+
+Los llamadores síncronos (rutas Flask, jobs de APScheduler) usan el puente
+`ejecutar()` / `*_lote()`, que corre las corrutinas en un event loop de fondo.
+Ese loop es compartido: todo lo bloqueante (Redis, almacén de blobs, índice de
+tarifas) se ejecuta en el executor vía `_en_hilo`.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import weakref
+from functools import partial
+
+from core.http_transport import http_transport
+from core.rate_budget import PresupuestoAgotado
+from core.scraper_motor import MotorBusqueda, SelectorTopK, get_cached_flight_search, ijson
+
+try:
+    import aiohttp
+except ImportError:  # Sin aiohttp se delega en el transporte síncrono desde un executor
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class _RespuestaAsync:
+    """Respuesta mínima compatible con requests.Response (status_code, headers, text, json())."""
+
+    __slots__ = ('status_code', 'headers', 'text', '_data', 'selector')
+
+    def __init__(self, status_code, headers, text, data, selector=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self._data = data
+        self.selector = selector  # Fase top-K ya alimentada en streaming (cuerpo no materializado)
+
+    def json(self):
+        if self._data is None:
+            raise ValueError("Respuesta sin JSON")
+        return self._data
+
+
+class MotorBusquedaAsync:
+    """
+    Cliente asyncio de Duffel que comparte estado con un MotorBusqueda
+    (token, markup, caché, cooldown de rate limit) para no duplicar normalización.
+    """
+
+    def __init__(self, motor=None, concurrency=None):
+        self.motor = motor or MotorBusqueda()
+        self.concurrency = int(concurrency or os.getenv('DUFFEL_ASYNC_CONCURRENCY', '8'))
+
+        self.coalesced = 0
+
+        # Recursos ligados a un event loop: semáforo, sesión aiohttp y búsquedas en curso
+        self._por_loop = weakref.WeakKeyDictionary()
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+
+    # ==========================================
+    # INFRAESTRUCTURA (loop, semáforo, sesión)
+    # ==========================================
+    def _estado_loop(self):
+        loop = asyncio.get_running_loop()
+        estado = self._por_loop.get(loop)
+        if estado is None:
+            estado = {
+                'semaforo': asyncio.Semaphore(self.concurrency),
+                'session': None,
+                'en_curso': {},
+            }
+            self._por_loop[loop] = estado
+        return estado
+
+    def _session(self, estado):
+        session = estado['session']
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency * 2, limit_per_host=self.concurrency)
+            session = aiohttp.ClientSession(connector=connector)
+            estado['session'] = session
+        return session
+
+    @staticmethod
+    async def _en_hilo(funcion, *args, **kwargs):
+        """Llamada bloqueante en el executor, conservando el contexto (prioridad del presupuesto)."""
+        contexto = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            None, partial(contexto.run, funcion, *args, **kwargs)
+        )
+
+    async def _request(self, method, url, endpoint='default', **kwargs):
+        """
+        Petición a Duffel: las búsquedas consumen del presupuesto compartido (sin bloquear el
+        loop), como en MotorBusqueda._duffel_request; respeta el semáforo y publica el cooldown ante un 429.
+        """
+        if endpoint in self.motor.ENDPOINTS_CON_PRESUPUESTO:
+            await self.motor.budget.acquire_async()
+        async with self._estado_loop()['semaforo']:
+            response = await self._enviar(method, url, endpoint, **kwargs)
+        if response.status_code == 429:
+            await self._en_hilo(self.motor._set_rate_limit_cooldown, response)
+        return response
+
+    async def _enviar(self, method, url, endpoint, selector=None, **kwargs):
+        """
+        Petición HTTP sin más (aiohttp, o el transporte síncrono en un executor).
+        Con `selector`, un 201 se parsea en streaming (data.offers[] oferta a oferta) hacia el top-K.
+        """
+        estado = self._estado_loop()
+        headers = self.motor._get_headers()
+
+        if aiohttp is None:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(
+                None,
+                partial(http_transport.request, method, url, endpoint=endpoint, headers=headers, **kwargs)
+            )
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            return _RespuestaAsync(response.status_code, response.headers, response.text, data)
+
+        connect, read = http_transport.get_timeout(endpoint)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        async with self._session(estado).request(method, url, headers=headers, timeout=timeout, **kwargs) as response:
+            if selector is not None and ijson is not None and response.status == 201:
+                async for offer in ijson.items_async(response.content, 'data.offers.item', use_float=True):
+                    selector.add(offer)
+                # Consumir el resto del cuerpo para que la conexión vuelva al pool
+                while await response.content.read(64 * 1024):
+                    pass
+                return _RespuestaAsync(response.status, response.headers, '', None, selector=selector)
+
+            text = await response.text()
+            try:
+                data = json.loads(text) if text else None
+            except ValueError:
+                data = None
+            return _RespuestaAsync(response.status, response.headers, text, data)
+
+    async def cerrar(self):
+        """Cierra la sesión aiohttp del loop actual."""
+        estado = self._por_loop.pop(asyncio.get_running_loop(), None)
+        if estado and estado['session'] is not None:
+            await estado['session'].close()
+
+    # ==========================================
+    # 1. BÚSQUEDA DE VUELOS
+    # ==========================================
+    async def buscar_vuelos(self, origen, destino, fecha, adultos=1, ninos=0, bebes=0, clase='economy'):
+        """Versión asíncrona de MotorBusqueda.buscar_vuelos (mismo formato de resultados y caché)."""
+        motor = self.motor
+        if not motor.duffel_token:
+            logger.error("Intento de búsqueda sin Token Duffel.")
+            return []
+
+        fecha = motor._normalizar_fecha(fecha)
+        if fecha is None:
+            return []
+
+        cache_key = f"{origen}_{destino}_{fecha}_{adultos}_{ninos}_{bebes}_{clase}"
+        cached_data = await self._en_hilo(
+            motor._leer_cache,
+            cache_key,
+            lambda: get_cached_flight_search(origen, destino, fecha, adultos, ninos, bebes, clase),
+            refresco=lambda: motor._refrescar_busqueda(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        )
+        if cached_data is not None:
+            return cached_data
+
+        if await self._en_hilo(self._saltar_por_cooldown, cache_key, origen, destino, fecha):
+            return []
+
+        # Búsquedas idénticas concurrentes en el mismo loop comparten una sola petición
+        # (sin await entre la comprobación y el alta en en_curso)
+        en_curso = self._estado_loop()['en_curso']
+        tarea = en_curso.get(cache_key)
+        if tarea is not None:
+            self.coalesced += 1
+            return await asyncio.shield(tarea)
+
+        with motor._stats_lock:
+            motor.cache_misses += 1
+        logger.info(f"📡 Cache MISS (async) - Solicitando vuelos a Duffel: {origen}->{destino} ({fecha})")
+
+        tarea = asyncio.ensure_future(
+            self._buscar_coordinado(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        )
+        en_curso[cache_key] = tarea
+        try:
+            return await asyncio.shield(tarea)
+        finally:
+            if tarea.done():
+                en_curso.pop(cache_key, None)
+            else:
+                tarea.add_done_callback(lambda _t: en_curso.pop(cache_key, None))
+
+    def _saltar_por_cooldown(self, cache_key, origen, destino, fecha):
+        """Si Duffel está en cooldown, guarda la entrada negativa y retorna True (consulta Redis)."""
+        motor = self.motor
+        if not motor.is_rate_limited():
+            return False
+        remaining = motor.get_rate_limit_remaining_seconds()
+        logger.warning(f"⏳ Duffel en cooldown ({remaining}s restantes). Saltando llamada {origen}->{destino} ({fecha})")
+        motor._guardar_negativo(cache_key)
+        return True
+
+    async def _buscar_coordinado(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase):
+        """
+        Como MotorBusqueda._buscar_vuelos_coordinado: toma el mismo lock de Redis (o espera el
+        resultado en L2 si lo tiene una petición síncrona u otro worker), siempre fuera del loop.
+        """
+        motor = self.motor
+        cached_data, lock_token = await self._en_hilo(
+            motor._turno_busqueda, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase
+        )
+        if cached_data is not None:
+            return cached_data
+        try:
+            return await self._solicitar_vuelos_duffel(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        finally:
+            if lock_token:
+                await self._en_hilo(motor._liberar_turno_busqueda, cache_key, lock_token)
+
+    async def _solicitar_vuelos_duffel(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase):
+        motor = self.motor
+        payload = motor._payload_busqueda(origen, destino, fecha, adultos, ninos, bebes, clase)
+        try:
+            selector = SelectorTopK(motor.search_results_limit) if motor.streaming_parse else None
+            response = await self._request('POST', motor.SEARCH_URL, endpoint='duffel_search', json=payload, selector=selector)
+            # Escrituras en Redis, blobs e índice de tarifas: fuera del loop
+            return await self._en_hilo(
+                motor._procesar_respuesta_busqueda,
+                response, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase,
+                selector=response.selector
+            )
+        except PresupuestoAgotado as e:
+            logger.warning(f"⏳ Búsqueda {origen}->{destino} ({fecha}) sin presupuesto Duffel: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"❌ Excepción crítica en buscar_vuelos (async): {str(e)}")
+            return []
+
+    async def buscar_vuelos_lote_async(self, consultas):
+        """
+        Lanza varias búsquedas en paralelo (acotadas por el semáforo).
+        `consultas` es una lista de dicts con los argumentos de buscar_vuelos.
+        Retorna los resultados en el mismo orden; una búsqueda fallida devuelve [].
+        """
+        resultados = await asyncio.gather(
+            *(self.buscar_vuelos(**consulta) for consulta in consultas),
+            return_exceptions=True
+        )
+        return [[] if isinstance(r, Exception) else r for r in resultados]
+
+    # ==========================================
+    # 2. OFERTAS, ASIENTOS Y ÓRDENES
+    # ==========================================
+    async def _get_data(self, url, endpoint, etiqueta, params=None):
+        try:
+            response = await self._request('GET', url, endpoint=endpoint, params=params)
+            if response.status_code == 200:
+                return response.json()['data']
+            logger.error(f"❌ Error {etiqueta}: {response.text}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Excepción {etiqueta}: {e}")
+            return None
+
+    async def get_offer_details(self, offer_id):
+        """Obtiene detalles + servicios disponibles (Maletas)"""
+        url = f"{self.motor.BASE_URL}/air/offers/{offer_id}?return_available_services=true"
+        return await self._get_data(url, 'duffel_offers', 'Offer Details')
+
+    async def get_seat_maps(self, offer_id):
+        """Obtiene mapas de asientos"""
+        url = f"{self.motor.BASE_URL}/air/seat_maps"
+        return await self._get_data(url, 'duffel_offers', 'Seat Maps', params={'offer_id': offer_id})
+
+    async def get_order_details(self, order_id):
+        """Obtiene detalles de una orden existente."""
+        url = f"{self.motor.BASE_URL}/air/orders/{order_id}"
+        return await self._get_data(url, 'duffel_offers', 'Order Details')
+
+    # ==========================================
+    # 3. PUENTE SÍNCRONO
+    # ==========================================
+    def _loop_fondo(self):
+        with self._loop_lock:
+            if self._loop is None or not self._loop_thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name='duffel-async-loop',
+                    daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
+
+    def lanzar(self, coro):
+        """Programa una corrutina en el loop de fondo sin esperar (retorna concurrent.futures.Future)."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop_fondo())
+
+    def ejecutar(self, coro, timeout=None):
+        """Ejecuta una corrutina desde código síncrono en el loop de fondo y espera su resultado."""
+        loop = self._loop_fondo()
+        try:
+            en_loop_fondo = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            en_loop_fondo = False
+        if en_loop_fondo:
+            coro.close()
+            raise RuntimeError("ejecutar() no puede llamarse desde el propio loop de fondo")
+        return self.lanzar(coro).result(timeout)
+
+    def buscar_vuelos_lote(self, consultas, timeout=None):
+        """Puente síncrono de buscar_vuelos_lote_async."""
+        return self.ejecutar(self.buscar_vuelos_lote_async(consultas), timeout=timeout)
+
+    def get_order_details_lote(self, order_ids, timeout=None):
+        """Obtiene varias órdenes en paralelo. Retorna {order_id: data|None}."""
+        async def _lote():
+            datos = await asyncio.gather(*(self.get_order_details(oid) for oid in order_ids))
+            return dict(zip(order_ids, datos))
+        return self.ejecutar(_lote(), timeout=timeout)
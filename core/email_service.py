@@ -1,11 +1,14 @@
-from flask_mail import Mail, Message
+from flask_mail import Mail
 import os
 from datetime import datetime
 import base64
 
+from core.mail_pipeline import obtener_buzon
+
 class EmailService:
     def __init__(self, app=None):
         self.mail = None
+        self.outbox = None
         if app:
             self.init_app(app)
     
@@ -18,6 +21,11 @@ class EmailService:
         app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', os.getenv('MAIL_USERNAME'))
         
         self.mail = Mail(app)
+        # Mismo pipeline que EmailManager: conexión persistente, envío en segundo plano
+        self.outbox = obtener_buzon(
+            app.config['MAIL_SERVER'], app.config['MAIL_PORT'], app.config['MAIL_USERNAME'],
+            app.config['MAIL_PASSWORD'], app.config['MAIL_DEFAULT_SENDER'], starttls=app.config['MAIL_USE_TLS']
+        )
         self.admin_email = os.getenv('ADMIN_EMAIL', os.getenv('MAIL_USERNAME'))
     
     def generar_token_confirmacion(self, id_solicitud):
@@ -107,9 +115,11 @@ class EmailService:
 
     def _send_raw(self, to, subject, html):
         try:
-            msg = Message(subject=subject, recipients=[to], html=html)
-            self.mail.send(msg)
-            print(f"✅ Email enviado a {to}")
+            if self.outbox is None or not self.outbox.configurado:
+                print(f"⚠️ SMTP no configurado. Email a {to} no enviado")
+                return False
+            self.outbox.enviar(to, subject, html)
+            print(f"✅ Email encolado para {to}")
             return True
         except Exception as e:
             print(f"❌ Error enviando email: {e}")
@@ -1,11 +1,10 @@
 import os
 import json
-import smtplib
 import logging
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+from core.mail_pipeline import obtener_buzon
+
 logger = logging.getLogger(__name__)
 load_dotenv()
 
@@ -18,33 +17,25 @@ class EmailManager:
         self.smtp_user = os.getenv('SMTP_USER')
         self.smtp_pass = os.getenv('SMTP_PASS')
         self.sender_email = os.getenv('SENDER_EMAIL', self.smtp_user)
+        # Conexión SMTP persistente y envío por lotes, compartida por todas las instancias
+        self.outbox = obtener_buzon(self.smtp_server, self.smtp_port, self.smtp_user, self.smtp_pass, self.sender_email)
 
-    def send_email(self, to_email, subject, body_html):
+    def send_email(self, to_email, subject, body_html, wait=False):
+        """Queues the email (returns immediately). wait=True blocks until the SMTP result is known."""
         if not self.smtp_user or not self.smtp_pass:
             logger.warning("⚠️ SMTP credentials not found. Email not sent.")
             return False
 
         try:
-            msg = MIMEMultipart()
-            msg['From'] = self.sender_email
-            msg['To'] = to_email
-            msg['Subject'] = subject
-
-            msg.attach(MIMEText(body_html, 'html'))
-
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.smtp_user, self.smtp_pass)
-            server.send_message(msg)
-            server.quit()
-            
-            logger.info(f"📧 Email sent to {to_email}: {subject}")
-            return True
+            return self.outbox.enviar(to_email, subject, body_html, esperar=wait)
         except Exception as e:
             logger.error(f"❌ Error sending email: {e}")
             return False
 
-    def send_order_confirmation(self, to_email, booking_ref, amount, currency):
+    def get_stats(self):
+        return self.outbox.get_stats()
+
+    def send_order_confirmation(self, to_email, booking_ref, amount, currency, wait=False):
         subject = f"Confirmación de Reserva - {booking_ref}"
         html = f"""
         <html>
@@ -60,7 +51,7 @@ class EmailManager:
             </body>
         </html>
         """
-        return self.send_email(to_email, subject, html)
+        return self.send_email(to_email, subject, html, wait=wait)
 
     def send_flight_tickets(self, reserva, order_data):
         """Envía billetes electrónicos tras confirmación de vuelo"""
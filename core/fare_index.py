@@ -0,0 +1,273 @@
+"""
+Índice persistente de tarifa mínima por día (tabla tarifas_minimas_dia).
+
+Cada respuesta real de Duffel (búsquedas de usuarios, refrescos, prewarm y calendario)
+registra el precio mínimo de su (ruta, fecha, pasajeros, clase). Las escrituras se agrupan
+en memoria (la última observación de cada clave gana) y un hilo de fondo las vuelca con
+upserts por lotes, así que la búsqueda no espera a la base de datos.
+
+El calendario de precios lee de aquí rangos arbitrarios de fechas con la antigüedad de
+cada observación.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+
+class IndiceTarifas:
+    """Índice (ruta, fecha, pasajeros, clase) -> tarifa mínima observada, con escritura diferida."""
+
+    def __init__(self, session_factory=None, flush_seconds=None, max_pendientes=None):
+        self._session_factory = session_factory
+        self.flush_seconds = float(flush_seconds or os.getenv('FARE_INDEX_FLUSH_SECONDS', '2'))
+        self.max_pendientes = int(max_pendientes or os.getenv('FARE_INDEX_MAX_PENDING', '500'))
+        self.enabled = os.getenv('FARE_INDEX_ENABLED', 'true').lower() == 'true'
+
+        self._pendientes = {}  # clave -> fila (la observación más reciente gana)
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilo = None
+        # Tras un fallo de base de datos se deja de intentar durante un rato (no penalizar cada petición)
+        self._pausa_hasta = 0.0
+        self.PAUSA_TRAS_FALLO = int(os.getenv('FARE_INDEX_BACKOFF_SECONDS', '60'))
+
+        self.observaciones = 0
+        self.filas_escritas = 0
+        self.errores = 0
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from database import get_db_session
+        return get_db_session()
+
+    def _disponible(self):
+        return self.enabled and time.monotonic() >= self._pausa_hasta
+
+    def _marcar_fallo(self, accion, err):
+        self.errores += 1
+        self._pausa_hasta = time.monotonic() + self.PAUSA_TRAS_FALLO
+        logger.warning(f"⚠️ Índice de tarifas: error {accion} ({err}); pausa {self.PAUSA_TRAS_FALLO}s")
+
+    # ==========================================
+    # ESCRITURA
+    # ==========================================
+    def registrar(self, origen, destino, fecha, adultos, ninos, bebes, clase, resultados):
+        """Anota la tarifa mínima de una búsqueda (resultados normalizados). No bloquea."""
+        if not self.enabled or not resultados:
+            return
+
+        try:
+            fecha_dia = fecha if isinstance(fecha, date) else datetime.strptime(str(fecha), '%Y-%m-%d').date()
+        except ValueError:
+            return
+
+        mejor = None
+        for oferta in resultados:
+            precio = oferta.get('precio')
+            if isinstance(precio, (int, float)) and precio > 0 and (mejor is None or precio < mejor.get('precio')):
+                mejor = oferta
+        if mejor is None:
+            return
+
+        clave = self.clave(origen, destino, fecha_dia, adultos, ninos, bebes, clase)
+        fila = {
+            'origen': clave[0],
+            'destino': clave[1],
+            'fecha': fecha_dia,
+            'adultos': clave[3],
+            'ninos': clave[4],
+            'bebes': clave[5],
+            'clase': clave[6],
+            'precio': float(mejor.get('precio')),
+            'currency': mejor.get('currency'),
+            'offer_id': mejor.get('id'),
+            'observed_at': datetime.utcnow(),
+        }
+
+        with self._lock:
+            self._pendientes[clave] = fila
+            self.observaciones += 1
+            lleno = len(self._pendientes) >= self.max_pendientes
+        self._arrancar_hilo()
+        if lleno:
+            self._despertar.set()
+
+    @staticmethod
+    def clave(origen, destino, fecha, adultos, ninos, bebes, clase):
+        return (
+            (origen or '').upper(), (destino or '').upper(), fecha,
+            int(adultos or 1), int(ninos or 0), int(bebes or 0), (clase or 'economy').lower()
+        )
+
+    def _arrancar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name='fare-index-writer', daemon=True)
+            self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            self._despertar.wait(self.flush_seconds)
+            self._despertar.clear()
+            try:
+                self.flush()
+            except Exception as err:
+                logger.warning(f"⚠️ Índice de tarifas: error inesperado en el volcado: {err}")
+
+    def flush(self):
+        """Vuelca las observaciones pendientes con un upsert por lote. Retorna filas escritas."""
+        if not self._disponible():
+            return 0
+        with self._lock:
+            filas = list(self._pendientes.values())
+            self._pendientes = {}
+        if not filas:
+            return 0
+
+        db = None
+        try:
+            db = self._session()
+            self._upsert(db, filas)
+            db.commit()
+            self.filas_escritas += len(filas)
+            return len(filas)
+        except Exception as err:
+            if db is not None:
+                db.rollback()
+            # Se reencolan salvo que haya llegado una observación más nueva para la misma clave
+            with self._lock:
+                for fila in filas:
+                    clave = self.clave(fila['origen'], fila['destino'], fila['fecha'], fila['adultos'],
+                                       fila['ninos'], fila['bebes'], fila['clase'])
+                    self._pendientes.setdefault(clave, fila)
+            self._marcar_fallo('guardando tarifas', err)
+            return 0
+        finally:
+            if db is not None:
+                db.close()
+
+    @staticmethod
+    def _upsert(db, filas):
+        from database import TarifaMinimaDia
+
+        tabla = TarifaMinimaDia.__table__
+        dialecto = db.bind.dialect.name
+        if dialecto in ('postgresql', 'sqlite'):
+            if dialecto == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(tabla).values(filas)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['origen', 'destino', 'fecha', 'adultos', 'ninos', 'bebes', 'clase'],
+                set_={
+                    'precio': stmt.excluded.precio,
+                    'currency': stmt.excluded.currency,
+                    'offer_id': stmt.excluded.offer_id,
+                    'observed_at': stmt.excluded.observed_at,
+                },
+                # Un volcado atrasado de otro worker no pisa una observación más reciente
+                where=tabla.c.observed_at <= stmt.excluded.observed_at,
+            )
+            db.execute(stmt)
+            return
+
+        for fila in filas:
+            existente = db.query(TarifaMinimaDia).filter_by(
+                origen=fila['origen'], destino=fila['destino'], fecha=fila['fecha'], adultos=fila['adultos'],
+                ninos=fila['ninos'], bebes=fila['bebes'], clase=fila['clase']
+            ).first()
+            if existente is None:
+                db.add(TarifaMinimaDia(**fila))
+            elif existente.observed_at <= fila['observed_at']:
+                for campo in ('precio', 'currency', 'offer_id', 'observed_at'):
+                    setattr(existente, campo, fila[campo])
+
+    # ==========================================
+    # LECTURA
+    # ==========================================
+    def consultar(self, origen, destino, desde, hasta, adultos=1, ninos=0, bebes=0, clase='economy'):
+        """
+        Tarifas mínimas del rango [desde, hasta] (date o YYYY-MM-DD).
+        Retorna {fecha_iso: {'precio', 'currency', 'observed_at', 'age_seconds'}}; {} si la BD no responde.
+        Incluye las observaciones aún pendientes de volcar.
+        """
+        if isinstance(desde, str):
+            desde = datetime.strptime(desde, '%Y-%m-%d').date()
+        if isinstance(hasta, str):
+            hasta = datetime.strptime(hasta, '%Y-%m-%d').date()
+        origen, destino, _, adultos, ninos, bebes, clase = self.clave(origen, destino, None, adultos, ninos, bebes, clase)
+
+        filas = []
+        if self._disponible():
+            db = None
+            try:
+                from database import TarifaMinimaDia
+                db = self._session()
+                filas = [
+                    {'fecha': t.fecha, 'precio': t.precio, 'currency': t.currency, 'observed_at': t.observed_at}
+                    for t in db.query(TarifaMinimaDia).filter(
+                        TarifaMinimaDia.origen == origen,
+                        TarifaMinimaDia.destino == destino,
+                        TarifaMinimaDia.clase == clase,
+                        TarifaMinimaDia.adultos == adultos,
+                        TarifaMinimaDia.ninos == ninos,
+                        TarifaMinimaDia.bebes == bebes,
+                        TarifaMinimaDia.fecha >= desde,
+                        TarifaMinimaDia.fecha <= hasta,
+                    )
+                ]
+            except Exception as err:
+                self._marcar_fallo('leyendo tarifas', err)
+            finally:
+                if db is not None:
+                    db.close()
+
+        with self._lock:
+            filas.extend(
+                fila for (o, d, fecha, a, n, b, c), fila in self._pendientes.items()
+                if (o, d, a, n, b, c) == (origen, destino, adultos, ninos, bebes, clase) and desde <= fecha <= hasta
+            )
+
+        ahora = datetime.utcnow()
+        resultado = {}
+        for fila in filas:
+            dia = fila['fecha'].isoformat()
+            actual = resultado.get(dia)
+            if actual is not None and actual['_observed_at'] >= fila['observed_at']:
+                continue
+            resultado[dia] = {
+                'precio': fila['precio'],
+                'currency': fila['currency'],
+                'observed_at': fila['observed_at'].isoformat(),
+                'age_seconds': max(0, int((ahora - fila['observed_at']).total_seconds())),
+                '_observed_at': fila['observed_at'],
+            }
+        for valor in resultado.values():
+            valor.pop('_observed_at')
+        return resultado
+
+    def get_stats(self):
+        with self._lock:
+            pendientes = len(self._pendientes)
+        return {
+            'enabled': self.enabled,
+            'observations': self.observaciones,
+            'rows_written': self.filas_escritas,
+            'pending': pendientes,
+            'errors': self.errores,
+            'paused_seconds': max(0, int(self._pausa_hasta - time.monotonic())),
+        }
+
+
+# Índice global (MotorBusqueda registra; el calendario consulta)
+indice_tarifas = IndiceTarifas()
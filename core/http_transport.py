@@ -0,0 +1,214 @@
+"""
+Transporte HTTP compartido (keep-alive) para los adaptadores de proveedores.
+
+Un único pool de conexiones por host (urllib3 vía requests.HTTPAdapter) reutilizado
+por MotorBusqueda (Duffel) y AmadeusAdapter, con timeouts por endpoint y métricas
+de reutilización de conexiones y tiempo de espera por conexión libre.
+"""
+
+import os
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+
+# (connect, read) en segundos. Se pueden ajustar con HTTP_TIMEOUT_<ENDPOINT>="read" o "connect,read"
+DEFAULT_TIMEOUTS = {
+    'default': (3.05, 15),
+    'duffel_places': (3.05, 5),
+    'duffel_search': (3.05, 20),
+    'duffel_search_multi': (3.05, 25),
+    'duffel_offers': (3.05, 10),
+    'duffel_orders': (3.05, 30),
+    'duffel_payments': (3.05, 20),
+    'duffel_services': (3.05, 15),
+    'amadeus_auth': (3.05, 15),
+    'amadeus_search': (3.05, 20),
+    'amadeus_shopping': (3.05, 30),
+    'amadeus_booking': (3.05, 30),
+    'amadeus_reference': (3.05, 30),
+}
+
+
+class TransportMetrics:
+    """Contadores por host: peticiones, conexiones nuevas y espera por conexión del pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _host(self, host):
+        stats = self._hosts.get(host)
+        if stats is None:
+            stats = {
+                'requests': 0,
+                'new_connections': 0,
+                'errors': 0,
+                'wait_seconds_total': 0.0,
+                'wait_seconds_max': 0.0,
+                'latency_seconds_total': 0.0,
+            }
+            self._hosts[host] = stats
+        return stats
+
+    def record_new_connection(self, host):
+        with self._lock:
+            self._host(host)['new_connections'] += 1
+
+    def record_wait(self, host, seconds):
+        with self._lock:
+            stats = self._host(host)
+            stats['wait_seconds_total'] += seconds
+            stats['wait_seconds_max'] = max(stats['wait_seconds_max'], seconds)
+
+    def record_request(self, host, seconds, error=False):
+        with self._lock:
+            stats = self._host(host)
+            stats['requests'] += 1
+            stats['latency_seconds_total'] += seconds
+            if error:
+                stats['errors'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for host, stats in self._hosts.items():
+                requests_count = stats['requests']
+                reused = max(0, requests_count - stats['new_connections'])
+                result[host] = {
+                    **stats,
+                    'reused_connections': reused,
+                    'reuse_rate': f"{(reused / requests_count * 100) if requests_count else 0:.1f}%",
+                    'avg_wait_ms': round(stats['wait_seconds_total'] / requests_count * 1000, 2) if requests_count else 0,
+                    'avg_latency_ms': round(stats['latency_seconds_total'] / requests_count * 1000, 2) if requests_count else 0,
+                }
+            return result
+
+
+def _instrumented_pool(base_cls, metrics):
+    """Subclase del pool de urllib3 que mide esperas por conexión y conexiones nuevas."""
+
+    class _InstrumentedPool(base_cls):
+        def _get_conn(self, timeout=None):
+            inicio = time.monotonic()
+            try:
+                return super()._get_conn(timeout=timeout)
+            finally:
+                metrics.record_wait(self.host, time.monotonic() - inicio)
+
+        def _new_conn(self):
+            metrics.record_new_connection(self.host)
+            return super()._new_conn()
+
+    return _InstrumentedPool
+
+
+class _PooledAdapter(HTTPAdapter):
+    def __init__(self, metrics, **kwargs):
+        self._metrics = metrics
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _instrumented_pool(HTTPConnectionPool, self._metrics),
+            'https': _instrumented_pool(HTTPSConnectionPool, self._metrics),
+        }
+
+
+class HTTPTransport:
+    """
+    Cliente HTTP de proceso con pools keep-alive por host.
+    Cada hilo usa su propia requests.Session (estado no compartido), pero todas
+    montan el mismo adaptador, así que las conexiones TCP/TLS se reutilizan entre hilos.
+    """
+
+    def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=None, timeouts=None):
+        self.pool_connections = int(pool_connections or os.getenv('HTTP_POOL_CONNECTIONS', '10'))
+        self.pool_maxsize = int(pool_maxsize or os.getenv('HTTP_POOL_MAXSIZE', '16'))
+        if pool_block is None:
+            pool_block = os.getenv('HTTP_POOL_BLOCK', 'false').lower() == 'true'
+        self.pool_block = pool_block
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        self.timeouts.update(self._timeouts_from_env())
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        self.metrics = TransportMetrics()
+        self._adapter = _PooledAdapter(
+            self.metrics,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        self._local = threading.local()
+
+    def _timeouts_from_env(self):
+        overrides = {}
+        for endpoint, (connect, read) in DEFAULT_TIMEOUTS.items():
+            raw = os.getenv(f"HTTP_TIMEOUT_{endpoint.upper()}")
+            if not raw:
+                continue
+            try:
+                parts = [float(p) for p in raw.split(',')]
+                overrides[endpoint] = (parts[0], parts[1]) if len(parts) > 1 else (connect, parts[0])
+            except (TypeError, ValueError):
+                logger.warning(f"⚠️ HTTP_TIMEOUT_{endpoint.upper()} inválido: {raw}")
+        return overrides
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def get_timeout(self, endpoint):
+        return self.timeouts.get(endpoint) or self.timeouts['default']
+
+    def request(self, method, url, endpoint='default', **kwargs):
+        kwargs.setdefault('timeout', self.get_timeout(endpoint))
+        host = urlsplit(url).hostname or ''
+        inicio = time.monotonic()
+        error = False
+        try:
+            return self._session().request(method, url, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            self.metrics.record_request(host, time.monotonic() - inicio, error=error)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('DELETE', url, **kwargs)
+
+    def get_stats(self):
+        return {
+            'pool_connections': self.pool_connections,
+            'pool_maxsize': self.pool_maxsize,
+            'pool_block': self.pool_block,
+            'timeouts': {k: list(v) for k, v in self.timeouts.items()},
+            'hosts': self.metrics.snapshot(),
+        }
+
+
+# Instancia global compartida por todos los adaptadores del proceso
+http_transport = HTTPTransport()
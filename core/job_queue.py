@@ -0,0 +1,372 @@
+"""
+Cola durable de trabajos en segundo plano (tabla trabajos_fondo).
+
+Sustituye los `threading.Thread` sueltos y el trabajo lento dentro de las peticiones
+(emisión Amadeus tras el webhook de Stripe, emails SMTP, scraping de tours): el handler
+encola en milisegundos y un pool de hilos por worker de gunicorn ejecuta los trabajos.
+
+- Durable: el trabajo vive en Postgres; si un worker se recicla a mitad, su lease
+  (bloqueado_hasta) caduca y otro worker lo vuelve a reclamar.
+- Reclamación sin colisiones entre procesos: SELECT ... FOR UPDATE SKIP LOCKED.
+- Reintentos con backoff exponencial y tope de intentos por tipo.
+- Idempotencia: encolar dos veces la misma `idempotency_key` devuelve el trabajo existente.
+- Concurrencia máxima por tipo (en el proceso y, aproximada, en el clúster).
+- Con JOB_QUEUE_ENABLED=false no hay consumidor: encolar ejecuta el trabajo en un hilo
+  local (sin durabilidad ni reintentos) en vez de dejar filas pendientes para siempre.
+"""
+
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class TipoTrabajo:
+    """Handler registrado para un tipo de trabajo y sus límites."""
+
+    def __init__(self, nombre, func, concurrencia=1, max_intentos=5, backoff_segundos=30, lease_segundos=None):
+        self.nombre = nombre
+        self.func = func
+        self.concurrencia = max(1, int(concurrencia))
+        self.max_intentos = max(1, int(max_intentos))
+        self.backoff_segundos = backoff_segundos
+        self.lease_segundos = lease_segundos
+
+
+class ColaTrabajos:
+    """Cola de trabajos sobre la base de datos con pool de workers en el proceso."""
+
+    def __init__(self, session_factory=None, workers=None, poll_segundos=None, lease_segundos=None, habilitada=None):
+        self._session_factory = session_factory
+        if habilitada is None:
+            habilitada = os.getenv('JOB_QUEUE_ENABLED', 'true').lower() == 'true'
+        self.habilitada = habilitada
+        self.workers = int(workers or os.getenv('JOB_QUEUE_WORKERS', '2'))
+        self.poll_segundos = float(poll_segundos or os.getenv('JOB_QUEUE_POLL_SECONDS', '2'))
+        self.lease_segundos = int(lease_segundos or os.getenv('JOB_QUEUE_LEASE_SECONDS', '900'))
+        self.identidad = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+        self._tipos = {}
+        self._en_curso = {}
+        self._lock = threading.Lock()
+        # Un solo hilo reclama a la vez: el hueco de concurrencia no se reparte dos veces
+        self._reclamando = threading.Lock()
+        self._despertar = threading.Event()
+        self._hilos = []
+
+        self.encolados = 0
+        self.completados = 0
+        self.reintentos = 0
+        self.fallidos = 0
+        self.ejecutados_sin_cola = 0
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from database import get_db_session
+        return get_db_session()
+
+    # ==========================================
+    # REGISTRO Y ENCOLADO
+    # ==========================================
+    def registrar(self, tipo, func, concurrencia=1, max_intentos=5, backoff_segundos=30, lease_segundos=None):
+        """func(**payload). Si lanza una excepción el trabajo se reintenta con backoff."""
+        self._tipos[tipo] = TipoTrabajo(tipo, func, concurrencia, max_intentos, backoff_segundos, lease_segundos)
+        self._en_curso.setdefault(tipo, 0)
+
+    def tarea(self, tipo, **opciones):
+        """Decorador equivalente a registrar()."""
+        def _decorador(func):
+            self.registrar(tipo, func, **opciones)
+            return func
+        return _decorador
+
+    def encolar(self, tipo, payload=None, idempotency_key=None, retraso_segundos=0):
+        """
+        Inserta un trabajo y retorna su id (o el del trabajo existente con la misma idempotency_key).
+        Si la base de datos no responde o la cola está deshabilitada, ejecuta el trabajo en un
+        hilo local (como antes) y retorna None.
+        """
+        if tipo not in self._tipos:
+            raise ValueError(f"Tipo de trabajo no registrado: {tipo}")
+        if not self.habilitada:
+            self._ejecutar_sin_cola(tipo, payload or {})
+            return None
+
+        from sqlalchemy.exc import IntegrityError
+        from database import TrabajoFondo
+
+        payload = payload or {}
+        db = None
+        try:
+            db = self._session()
+            trabajo = TrabajoFondo(
+                tipo=tipo,
+                payload=json.dumps(payload, default=str),
+                estado='pendiente',
+                idempotency_key=idempotency_key,
+                intentos=0,
+                max_intentos=self._tipos[tipo].max_intentos,
+                disponible_en=datetime.utcnow() + timedelta(seconds=retraso_segundos),
+            )
+            db.add(trabajo)
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                existente = db.query(TrabajoFondo.id).filter_by(idempotency_key=idempotency_key).scalar()
+                if existente is None:
+                    raise
+                logger.info(f"ℹ️ Trabajo {tipo} ya encolado ({idempotency_key}) -> #{existente}")
+                return existente
+
+            self.encolados += 1
+            self._despertar.set()
+            return trabajo.id
+        except Exception as e:
+            if db is not None:
+                db.rollback()
+            logger.warning(f"⚠️ Cola de trabajos no disponible ({e}); ejecutando {tipo} en hilo local")
+            self._ejecutar_sin_cola(tipo, payload)
+            return None
+        finally:
+            if db is not None:
+                db.close()
+
+    def _ejecutar_sin_cola(self, tipo, payload):
+        self.ejecutados_sin_cola += 1
+        func = self._tipos[tipo].func
+
+        def _run():
+            try:
+                func(**payload)
+            except Exception as e:
+                logger.error(f"❌ Trabajo {tipo} (sin cola) falló: {e}")
+
+        threading.Thread(target=_run, name=f"job-{tipo}", daemon=True).start()
+
+    # ==========================================
+    # RECLAMACIÓN Y EJECUCIÓN
+    # ==========================================
+    def _tipos_libres(self, db, ahora):
+        """Tipos con hueco de concurrencia en este proceso y en el clúster."""
+        from sqlalchemy import func
+        from database import TrabajoFondo
+
+        with self._lock:
+            locales = [t for t, cfg in self._tipos.items() if self._en_curso[t] < cfg.concurrencia]
+        if not locales:
+            return []
+
+        ocupados = dict(
+            db.query(TrabajoFondo.tipo, func.count(TrabajoFondo.id))
+            .filter(
+                TrabajoFondo.estado == 'en_curso',
+                TrabajoFondo.bloqueado_hasta > ahora,
+                TrabajoFondo.tipo.in_(locales),
+            )
+            .group_by(TrabajoFondo.tipo)
+            .all()
+        )
+        return [t for t in locales if ocupados.get(t, 0) < self._tipos[t].concurrencia]
+
+    def _reclamar(self):
+        """Marca como en_curso el siguiente trabajo disponible. Retorna (id, tipo, payload, intento) o None."""
+        from sqlalchemy import and_, or_
+        from database import TrabajoFondo
+
+        db = self._session()
+        try:
+            ahora = datetime.utcnow()
+            tipos = self._tipos_libres(db, ahora)
+            if not tipos:
+                return None
+
+            trabajo = (
+                db.query(TrabajoFondo)
+                .filter(
+                    TrabajoFondo.tipo.in_(tipos),
+                    or_(
+                        and_(TrabajoFondo.estado == 'pendiente', TrabajoFondo.disponible_en <= ahora),
+                        # Lease caducado: el worker que lo ejecutaba se recicló o murió
+                        and_(TrabajoFondo.estado == 'en_curso', TrabajoFondo.bloqueado_hasta < ahora),
+                    ),
+                )
+                .order_by(TrabajoFondo.disponible_en)
+                .with_for_update(skip_locked=True)
+                .limit(1)
+                .first()
+            )
+            if trabajo is None:
+                db.rollback()
+                return None
+
+            if trabajo.estado == 'en_curso' and trabajo.intentos >= trabajo.max_intentos:
+                trabajo.estado = 'fallido'
+                trabajo.ultimo_error = f"Lease caducado en {trabajo.bloqueado_por} tras {trabajo.intentos} intentos"
+                trabajo.bloqueado_por = trabajo.bloqueado_hasta = None
+                db.commit()
+                self.fallidos += 1
+                return None
+
+            cfg = self._tipos[trabajo.tipo]
+            trabajo.estado = 'en_curso'
+            trabajo.intentos += 1
+            trabajo.bloqueado_por = self.identidad
+            trabajo.bloqueado_hasta = ahora + timedelta(seconds=cfg.lease_segundos or self.lease_segundos)
+            reclamado = (trabajo.id, trabajo.tipo, json.loads(trabajo.payload or '{}'), trabajo.intentos)
+            db.commit()
+            return reclamado
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _finalizar(self, trabajo_id, error=None, intento=1):
+        from database import TrabajoFondo
+
+        db = self._session()
+        try:
+            trabajo = db.query(TrabajoFondo).filter_by(id=trabajo_id).first()
+            if trabajo is None:
+                return
+            trabajo.bloqueado_por = trabajo.bloqueado_hasta = None
+            if error is None:
+                trabajo.estado = 'completado'
+                trabajo.ultimo_error = None
+                self.completados += 1
+            elif intento < trabajo.max_intentos:
+                cfg = self._tipos.get(trabajo.tipo)
+                base = cfg.backoff_segundos if cfg else 30
+                espera = min(3600, base * (2 ** (intento - 1))) * random.uniform(1.0, 1.1)
+                trabajo.estado = 'pendiente'
+                trabajo.disponible_en = datetime.utcnow() + timedelta(seconds=espera)
+                trabajo.ultimo_error = str(error)[:1000]
+                self.reintentos += 1
+                logger.warning(f"🔁 Trabajo #{trabajo_id} ({trabajo.tipo}) reintento en {espera:.0f}s: {error}")
+            else:
+                trabajo.estado = 'fallido'
+                trabajo.ultimo_error = str(error)[:1000]
+                self.fallidos += 1
+                logger.error(f"❌ Trabajo #{trabajo_id} ({trabajo.tipo}) fallido tras {intento} intentos: {error}")
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"❌ No se pudo cerrar el trabajo #{trabajo_id}: {e}")
+        finally:
+            db.close()
+
+    def procesar_uno(self):
+        """Reclama y ejecuta un trabajo. Retorna True si había alguno."""
+        with self._reclamando:
+            reclamado = self._reclamar()
+            if reclamado is None:
+                return False
+            trabajo_id, tipo, payload, intento = reclamado
+            with self._lock:
+                self._en_curso[tipo] += 1
+        try:
+            self._tipos[tipo].func(**payload)
+        except Exception as e:
+            self._finalizar(trabajo_id, error=e, intento=intento)
+        else:
+            self._finalizar(trabajo_id)
+        finally:
+            with self._lock:
+                self._en_curso[tipo] -= 1
+        return True
+
+    def procesar_pendientes(self, maximo=100):
+        """Procesa de forma síncrona los trabajos disponibles (tests). Retorna cuántos ejecutó."""
+        procesados = 0
+        while procesados < maximo and self.procesar_uno():
+            procesados += 1
+        return procesados
+
+    def _bucle(self):
+        while True:
+            try:
+                if self.procesar_uno():
+                    continue
+                espera = self.poll_segundos
+            except Exception as e:
+                logger.warning(f"⚠️ Cola de trabajos: error reclamando trabajos: {e}")
+                espera = self.poll_segundos * 10
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+    def iniciar(self):
+        """Arranca el pool de workers del proceso (idempotente)."""
+        if self._hilos or self.workers <= 0 or not self.habilitada:
+            return
+        for i in range(self.workers):
+            hilo = threading.Thread(target=self._bucle, name=f"job-worker-{i}", daemon=True)
+            hilo.start()
+            self._hilos.append(hilo)
+        logger.info(f"✅ Cola de trabajos activa ({self.workers} workers, tipos: {', '.join(sorted(self._tipos))})")
+
+    # ==========================================
+    # VISIBILIDAD
+    # ==========================================
+    def estado(self, trabajo_id, detalle=False):
+        """Estado de un trabajo (sin payload; el último error solo con detalle) o None si no existe."""
+        from database import TrabajoFondo
+
+        db = self._session()
+        try:
+            trabajo = db.query(TrabajoFondo).filter_by(id=trabajo_id).first()
+            return trabajo.to_dict(detalle=detalle) if trabajo else None
+        finally:
+            db.close()
+
+    def get_stats(self):
+        from sqlalchemy import func
+        from database import TrabajoFondo
+
+        por_tipo = {}
+        try:
+            db = self._session()
+            try:
+                for tipo, estado, total in (
+                    db.query(TrabajoFondo.tipo, TrabajoFondo.estado, func.count(TrabajoFondo.id))
+                    .group_by(TrabajoFondo.tipo, TrabajoFondo.estado)
+                    .all()
+                ):
+                    por_tipo.setdefault(tipo, {})[estado] = total
+            finally:
+                db.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Estadísticas de la cola no disponibles: {e}")
+
+        with self._lock:
+            en_curso = dict(self._en_curso)
+        return {
+            'enabled': self.habilitada,
+            'workers': self.workers,
+            'worker': self.identidad,
+            'types': {
+                tipo: {
+                    'concurrency': cfg.concurrencia,
+                    'max_attempts': cfg.max_intentos,
+                    'running_here': en_curso.get(tipo, 0),
+                    'by_status': por_tipo.get(tipo, {}),
+                }
+                for tipo, cfg in self._tipos.items()
+            },
+            'enqueued': self.encolados,
+            'completed': self.completados,
+            'retried': self.reintentos,
+            'failed': self.fallidos,
+            'ran_without_queue': self.ejecutados_sin_cola,
+        }
+
+
+# Cola global del proceso (los handlers se registran en app.py)
+cola_trabajos = ColaTrabajos()
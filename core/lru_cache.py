@@ -0,0 +1,151 @@
+"""
+Caché LRU en memoria con TTL por entrada (thread-safe).
+
+Usada por MotorBusqueda (L1 de búsquedas) y por el almacén de blobs de ofertas.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class CacheLRU:
+    """
+    Caché LRU con TTL por entrada y thread-safe.
+    - get/put/evict en O(1) (OrderedDict + move_to_end/popitem)
+    - Límite por número de entradas (max_entries) y/o por bytes (max_bytes); el tamaño de cada
+      entrada solo se estima si hay límite por bytes (o lo indica quien guarda con `size`)
+    - Las entradas expiradas se descartan al leerlas o al llegar al extremo LRU
+    Se comporta como un dict para el código existente (in, [], values()).
+    """
+
+    def __init__(self, max_entries=100, max_bytes=0, default_ttl=300, sizeof=None):
+        self.max_entries = max(0, int(max_entries or 0))
+        self.max_bytes = max(0, int(max_bytes or 0))
+        self.default_ttl = default_ttl
+        self._sizeof = sizeof or self._estimar_bytes
+        self._data = OrderedDict()  # key -> (value, expires_at, size, stored_at)
+        self._lock = threading.RLock()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _estimar_bytes(value):
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return 0
+
+    def _remove(self, key):
+        _, _, size, _ = self._data.pop(key)
+        self.total_bytes -= size
+
+    def _is_expired(self, entry, now):
+        return entry[1] is not None and now >= entry[1]
+
+    def _evict_if_needed(self):
+        while self._data and (
+            (self.max_entries and len(self._data) > self.max_entries)
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+        ):
+            key, (_, expires_at, size, _) = self._data.popitem(last=False)
+            self.total_bytes -= size
+            if expires_at is not None and time.monotonic() >= expires_at:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    def get(self, key, default=None):
+        """Devuelve el valor vigente (y lo marca como usado recientemente) o default."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if self._is_expired(entry, time.monotonic()):
+                self._remove(key)
+                self.expirations += 1
+                return default
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, ttl=None, size=None):
+        """
+        Guarda un valor con TTL en segundos (None = default_ttl, 0 = sin caducidad).
+        `size` evita estimar el tamaño (serializar el valor) cuando quien guarda ya lo conoce.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.monotonic()
+        expires_at = now + ttl if ttl else None
+        if size is None:
+            size = self._sizeof(value) if self.max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size, now)
+            self.total_bytes += size
+            self._evict_if_needed()
+
+    def age(self, key):
+        """Segundos desde que se guardó la entrada (None si no existe)."""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else time.monotonic() - entry[3]
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[0]
+
+    def purge_expired(self):
+        """Elimina todas las entradas expiradas (O(n), solo para mantenimiento)."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [k for k, entry in self._data.items() if self._is_expired(entry, now)]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __delitem__(self, key):
+        if self.pop(key, _MISSING) is _MISSING:
+            raise KeyError(key)
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        """Snapshot (clave, valor) de las entradas vigentes, sin alterar el orden LRU."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, e[0]) for k, e in self._data.items() if not self._is_expired(e, now)]
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def keys(self):
+        return [key for key, _ in self.items()]
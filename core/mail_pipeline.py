@@ -0,0 +1,213 @@
+"""
+Envío de emails por lotes sobre una conexión SMTP persistente.
+
+Antes cada email abría conexión, STARTTLS y login en el hilo de la petición (1-3 s por
+confirmación de reserva). Ahora:
+- el HTML y el mensaje MIME se generan en el hilo que llama (ya listos para escribir);
+- `enviar()` solo encola y retorna al instante;
+- un hilo por buzón vacía la cola por lotes sobre una única conexión autenticada,
+  la reabre si el servidor la corta y la cierra tras un rato sin tráfico.
+
+Quien necesite saber si el email salió (p.ej. la cola durable de trabajos, para reintentar)
+puede esperar el resultado con `enviar(..., esperar=True)`.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import smtplib
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+logger = logging.getLogger(__name__)
+
+
+def construir_mensaje(remitente, destinatario, asunto, html):
+    """Mensaje MIME serializado (bytes) listo para sendmail."""
+    msg = MIMEMultipart()
+    msg['From'] = remitente
+    msg['To'] = destinatario
+    msg['Subject'] = asunto
+    msg.attach(MIMEText(html, 'html'))
+    return msg.as_bytes()
+
+
+class _Saliente:
+    __slots__ = ('destinatario', 'asunto', 'datos', 'resultado')
+
+    def __init__(self, destinatario, asunto, datos):
+        self.destinatario = destinatario
+        self.asunto = asunto
+        self.datos = datos
+        self.resultado = Future()
+
+
+class BuzonSalida:
+    """Cola de salida + conexión SMTP persistente para un servidor/usuario."""
+
+    def __init__(self, servidor, puerto, usuario, password, remitente=None, starttls=True,
+                 lote=None, espera_lote_ms=None, inactividad_segundos=None, timeout=None):
+        self.servidor = servidor
+        self.puerto = int(puerto)
+        self.usuario = usuario
+        self.password = password
+        self.remitente = remitente or usuario
+        self.starttls = starttls
+        self.lote = int(lote or os.getenv('SMTP_BATCH_SIZE', '20'))
+        self.espera_lote = float(espera_lote_ms or os.getenv('SMTP_BATCH_WAIT_MS', '200')) / 1000
+        self.inactividad = float(inactividad_segundos or os.getenv('SMTP_IDLE_SECONDS', '60'))
+        self.timeout = float(timeout or os.getenv('SMTP_TIMEOUT_SECONDS', '30'))
+
+        self._cola = queue.Queue()
+        self._smtp = None
+        self._hilo = None
+        self._lock = threading.Lock()
+
+        self.enviados = 0
+        self.fallidos = 0
+        self.conexiones = 0
+        self.lotes = 0
+
+    @property
+    def configurado(self):
+        return bool(self.usuario and self.password)
+
+    # ==========================================
+    # ENCOLADO
+    # ==========================================
+    def enviar(self, destinatario, asunto, html, esperar=False, timeout=None):
+        """
+        Encola un email. Retorna True al encolar, o (esperar=True) el resultado real del envío.
+        """
+        saliente = _Saliente(destinatario, asunto, construir_mensaje(self.remitente, destinatario, asunto, html))
+        self._cola.put(saliente)
+        self._arrancar()
+        if not esperar:
+            return True
+        try:
+            return saliente.resultado.result(timeout=timeout or self.timeout * 2)
+        except FutureTimeout:
+            logger.warning(f"⚠️ Email a {destinatario} sigue en cola tras {timeout or self.timeout * 2:.0f}s")
+            return False
+
+    def _arrancar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._hilo = threading.Thread(target=self._bucle, name=f"smtp-{self.servidor}", daemon=True)
+            self._hilo.start()
+
+    # ==========================================
+    # CONEXIÓN PERSISTENTE
+    # ==========================================
+    def _conectar(self):
+        smtp = smtplib.SMTP(self.servidor, self.puerto, timeout=self.timeout)
+        if self.starttls:
+            smtp.starttls()
+        smtp.login(self.usuario, self.password)
+        self.conexiones += 1
+        logger.info(f"📡 Conexión SMTP abierta con {self.servidor}:{self.puerto}")
+        return smtp
+
+    def _cerrar(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+    def _entregar(self, saliente):
+        """Envía un mensaje reutilizando la conexión; si estaba caída, reconecta una vez."""
+        for intento in range(2):
+            try:
+                if self._smtp is None:
+                    self._smtp = self._conectar()
+                self._smtp.sendmail(self.remitente, [saliente.destinatario], saliente.datos)
+                return True
+            except smtplib.SMTPRecipientsRefused as e:
+                # Problema del destinatario, no de la conexión: no se reintenta
+                logger.error(f"❌ Destinatario rechazado {saliente.destinatario}: {e}")
+                return False
+            except (smtplib.SMTPException, OSError) as e:
+                self._cerrar()
+                if intento:
+                    logger.error(f"❌ Error enviando email a {saliente.destinatario}: {e}")
+                    return False
+                logger.warning(f"⚠️ Conexión SMTP perdida ({e}), reconectando")
+        return False
+
+    def _bucle(self):
+        while True:
+            try:
+                primero = self._cola.get(timeout=self.inactividad)
+            except queue.Empty:
+                # Sin tráfico: no mantener la sesión abierta indefinidamente
+                self._cerrar()
+                continue
+
+            lote = [primero]
+            while len(lote) < self.lote:
+                try:
+                    lote.append(self._cola.get(timeout=self.espera_lote))
+                except queue.Empty:
+                    break
+
+            self.lotes += 1
+            for saliente in lote:
+                ok = self._entregar(saliente)
+                if ok:
+                    self.enviados += 1
+                    logger.info(f"📧 Email sent to {saliente.destinatario}: {saliente.asunto}")
+                else:
+                    self.fallidos += 1
+                saliente.resultado.set_result(ok)
+                self._cola.task_done()
+
+    def vaciar(self, timeout=10):
+        """Espera (con tope) a que se envíe lo encolado. Se llama al apagar el proceso."""
+        if self._hilo is None or not self._hilo.is_alive():
+            return
+        hecho = threading.Event()
+        threading.Thread(target=lambda: (self._cola.join(), hecho.set()), daemon=True).start()
+        if not hecho.wait(timeout):
+            logger.warning(f"⚠️ {self._cola.qsize()} emails sin enviar al apagar")
+
+    def get_stats(self):
+        return {
+            'server': f"{self.servidor}:{self.puerto}",
+            'configured': self.configurado,
+            'queued': self._cola.qsize(),
+            'connected': self._smtp is not None,
+            'sent': self.enviados,
+            'failed': self.fallidos,
+            'connections': self.conexiones,
+            'batches': self.lotes,
+        }
+
+
+_buzones = {}
+_buzones_lock = threading.Lock()
+
+
+def obtener_buzon(servidor, puerto, usuario, password, remitente=None, starttls=True):
+    """Buzón compartido por configuración: todas las instancias de EmailManager usan la misma conexión."""
+    clave = (servidor, int(puerto), usuario, remitente or usuario, starttls)
+    with _buzones_lock:
+        buzon = _buzones.get(clave)
+        if buzon is None or buzon.password != password:
+            buzon = BuzonSalida(servidor, puerto, usuario, password, remitente=remitente, starttls=starttls)
+            _buzones[clave] = buzon
+        return buzon
+
+
+@atexit.register
+def _vaciar_buzones():
+    for buzon in list(_buzones.values()):
+        buzon.vaciar()
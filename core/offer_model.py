@@ -0,0 +1,320 @@
+"""
+Modelo compacto de ofertas de vuelo para las cachés de búsqueda.
+
+Las ofertas normalizadas (Duffel y Amadeus) se guardan como objetos con __slots__:
+- sin campos duplicados: `segmentos` es `trayectos[0].segmentos`, los logos se
+  derivan del código IATA y horas/fechas salen de un único datetime por extremo;
+- sin blobs pesados (available_services de Duffel), que viven comprimidos en
+  OfferBlobStore por id de oferta. Lo que la UI muestra o hace falta para reservar
+  (condiciones, passengers, la oferta Amadeus completa) va siempre en línea en `extra`.
+
+El formato JSON de siempre se genera solo en el borde de la respuesta (to_dict,
+usado por el JSON provider de Flask). Para el código existente se comportan como
+el dict de antes en lectura (get, [], in).
+"""
+
+import json
+import logging
+import os
+import zlib
+
+from core.lru_cache import CacheLRU
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+
+def _logo(code, size):
+    return f"https://pics.avs.io/{size}/{size}/{code or 'XX'}.png"
+
+
+def _fmt(dt, fmt):
+    return dt.strftime(fmt) if dt else "N/A"
+
+
+class ModeloCompacto:
+    """Base: acceso de solo lectura tipo dict sobre los campos del formato JSON (_CAMPOS)."""
+
+    __slots__ = ()
+    _CAMPOS = {}
+
+    def to_dict(self):
+        return {clave: campo(self) for clave, campo in self._CAMPOS.items()}
+
+    def __getitem__(self, key):
+        campo = self._CAMPOS.get(key)
+        if campo is None:
+            raise KeyError(key)
+        return campo(self)
+
+    def get(self, key, default=None):
+        campo = self._CAMPOS.get(key)
+        return default if campo is None else campo(self)
+
+    def __contains__(self, key):
+        return key in self._CAMPOS
+
+    def keys(self):
+        return self._CAMPOS.keys()
+
+    def __reduce__(self):
+        # Pickle posicional (orden de __slots__ = orden del constructor): sin nombres de campo por entrada en L2
+        return type(self), tuple(getattr(self, campo) for campo in self.__slots__)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class SegmentoCompacto(ModeloCompacto):
+    __slots__ = (
+        'salida', 'llegada', 'ciudad_salida', 'ciudad_llegada', 'salida_dt', 'llegada_dt',
+        'aerolinea', 'carrier', 'vuelo', 'duracion', 'avion', 'escala_duracion',
+    )
+
+    def __init__(self, salida, llegada, ciudad_salida, ciudad_llegada, salida_dt, llegada_dt,
+                 aerolinea, carrier, vuelo, duracion, avion, escala_duracion=None):
+        self.salida = salida
+        self.llegada = llegada
+        self.ciudad_salida = ciudad_salida
+        self.ciudad_llegada = ciudad_llegada
+        self.salida_dt = salida_dt
+        self.llegada_dt = llegada_dt
+        self.aerolinea = aerolinea
+        self.carrier = carrier
+        self.vuelo = vuelo
+        self.duracion = duracion
+        self.avion = avion
+        self.escala_duracion = escala_duracion
+
+
+SegmentoCompacto._CAMPOS = {
+    'salida': lambda s: s.salida,
+    'llegada': lambda s: s.llegada,
+    'ciudad_salida': lambda s: s.ciudad_salida,
+    'ciudad_llegada': lambda s: s.ciudad_llegada,
+    'hora_salida': lambda s: _fmt(s.salida_dt, "%H:%M"),
+    'hora_llegada': lambda s: _fmt(s.llegada_dt, "%H:%M"),
+    'fecha_salida': lambda s: _fmt(s.salida_dt, "%d %b"),
+    'fecha_llegada': lambda s: _fmt(s.llegada_dt, "%d %b"),
+    'aerolinea': lambda s: s.aerolinea,
+    'vuelo': lambda s: s.vuelo,
+    'duracion': lambda s: s.duracion,
+    'avion': lambda s: s.avion,
+    'img_logo': lambda s: _logo(s.carrier, 64),
+    'escala_duracion': lambda s: s.escala_duracion,
+}
+
+
+class TrayectoCompacto(ModeloCompacto):
+    __slots__ = ('origen', 'destino', 'duracion', 'segmentos')
+
+    def __init__(self, origen, destino, duracion, segmentos):
+        self.origen = origen
+        self.destino = destino
+        self.duracion = duracion
+        self.segmentos = tuple(segmentos)
+
+
+TrayectoCompacto._CAMPOS = {
+    'origen': lambda t: t.origen,
+    'destino': lambda t: t.destino,
+    'duracion': lambda t: t.duracion,
+    'segmentos': lambda t: [s.to_dict() for s in t.segmentos],
+}
+
+
+# Blobs pesados que no viven en la entrada de caché: clave JSON -> valor por defecto
+_BLOB_DEFAULTS = {
+    'available_services': list,
+}
+
+
+class OfertaCompacta(ModeloCompacto):
+    """
+    Oferta normalizada (Duffel o Amadeus). `extra` guarda campos propios de un proveedor
+    que deben sobrevivir a la caché (passengers, reservable, amadeus_full_offer...).
+    """
+
+    __slots__ = (
+        'id', 'source', 'aerolinea', 'carrier', 'origen', 'destino', 'duracion', 'trayectos',
+        'precio_base', 'precio', 'currency', 'con_maleta', 'familia_tarifaria', 'extra',
+    )
+
+    def __init__(self, id, source, aerolinea, carrier, origen, destino, duracion, trayectos,
+                 precio_base, precio, currency, con_maleta, familia_tarifaria, extra=None):
+        self.id = id
+        self.source = source
+        self.aerolinea = aerolinea
+        self.carrier = carrier
+        self.origen = origen
+        self.destino = destino
+        self.duracion = duracion
+        self.trayectos = tuple(trayectos)
+        self.precio_base = precio_base
+        self.precio = precio
+        self.currency = currency
+        self.con_maleta = con_maleta
+        self.familia_tarifaria = familia_tarifaria
+        self.extra = extra or None
+
+    @property
+    def segmentos_principales(self):
+        return self.trayectos[0].segmentos if self.trayectos else ()
+
+    def _claves_blob(self):
+        return tuple(_BLOB_DEFAULTS)
+
+    def _blob(self):
+        # Solo Duffel guarda blobs. Nunca se recargan del proveedor aquí: to_dict corre dentro de jsonify
+        if self.source != 'Duffel':
+            return {}
+        return offer_blobs.get(self.id) or {}
+
+    def to_dict(self):
+        datos = super().to_dict()
+        blob = self._blob()
+        for clave in self._claves_blob():
+            datos[clave] = blob.get(clave, _BLOB_DEFAULTS.get(clave, dict)())
+        if self.extra:
+            datos.update(self.extra)
+        return datos
+
+    def __getitem__(self, key):
+        if key in self._CAMPOS:
+            return self._CAMPOS[key](self)
+        if key in self._claves_blob():
+            return self._blob().get(key, _BLOB_DEFAULTS.get(key, dict)())
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        return key in self._CAMPOS or key in self._claves_blob() or bool(self.extra and key in self.extra)
+
+    def keys(self):
+        return self.to_dict().keys()
+
+
+def _segmentos_principales(o):
+    return [s.to_dict() for s in o.segmentos_principales]
+
+
+OfertaCompacta._CAMPOS = {
+    'id': lambda o: o.id,
+    'source': lambda o: o.source,
+    'aerolinea': lambda o: o.aerolinea,
+    'img_logo': lambda o: _logo(o.carrier, 200),
+    'origen': lambda o: o.origen,
+    'destino': lambda o: o.destino,
+    'trayectos': lambda o: [t.to_dict() for t in o.trayectos],
+    'hora_salida': lambda o: _fmt(o.segmentos_principales[0].salida_dt, "%H:%M") if o.segmentos_principales else "N/A",
+    'hora_llegada': lambda o: _fmt(o.segmentos_principales[-1].llegada_dt, "%H:%M") if o.segmentos_principales else "N/A",
+    'duracion': lambda o: o.duracion,
+    'precio_base': lambda o: o.precio_base,
+    'precio': lambda o: o.precio,
+    'currency': lambda o: o.currency,
+    'escala': lambda o: max(0, len(o.segmentos_principales) - 1),
+    'segmentos': _segmentos_principales,
+    'con_maleta': lambda o: o.con_maleta,
+    'familia_tarifaria': lambda o: o.familia_tarifaria,
+    # Pequeñas y visibles en la lista de resultados (cambios/reembolso): en línea, nunca en el blob
+    'condiciones': lambda o: (o.extra or {}).get('condiciones') or {},
+}
+
+
+class OfferBlobStore:
+    """
+    Blobs pesados de ofertas (JSON comprimido con zlib) por id de oferta.
+    L1 en proceso (CacheLRU) + L2 opcional en Redis para que otros workers resuelvan
+    las ofertas que leen de la caché compartida. Un blob evictado no se recarga: la
+    oferta sale sin available_services y /api/vuelos/detalles/<id> los pide a Duffel.
+    """
+
+    REDIS_PREFIX = "oferta:blob:"
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, redis_cache=None):
+        self.ttl = int(ttl or os.getenv('OFFER_BLOB_TTL_SECONDS', '1800'))
+        self._cache = CacheLRU(
+            max_entries=int(max_entries or os.getenv('OFFER_BLOB_MAX_ENTRIES', '5000')),
+            max_bytes=int(max_bytes or os.getenv('OFFER_BLOB_MAX_BYTES', str(32 * 1024 * 1024))),
+            default_ttl=self.ttl,
+            sizeof=len,
+        )
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        self.faltantes = 0
+
+    @staticmethod
+    def _comprimir(blob):
+        return zlib.compress(json.dumps(blob, separators=(',', ':'), default=str).encode('utf-8'), 6)
+
+    @staticmethod
+    def _descomprimir(data):
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    def put_many(self, blobs, ttl=None):
+        """Guarda {offer_id: blob} en L1 y, en una sola ida y vuelta, en Redis."""
+        if not blobs:
+            return
+        ttl = int(ttl or self.ttl)
+        comprimidos = {offer_id: self._comprimir(blob) for offer_id, blob in blobs.items()}
+        for offer_id, data in comprimidos.items():
+            self._cache.put(offer_id, data, ttl=ttl)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pipe = client.pipeline(transaction=False)
+                for offer_id, data in comprimidos.items():
+                    pipe.setex(f"{self.REDIS_PREFIX}{offer_id}", ttl, data)
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudieron guardar blobs de ofertas en Redis: {e}")
+
+    def put(self, offer_id, blob, ttl=None):
+        self.put_many({offer_id: blob}, ttl=ttl)
+
+    def get(self, offer_id):
+        data = self._cache.get(offer_id)
+        if data is not None:
+            return self._descomprimir(data)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                data = client.get(f"{self.REDIS_PREFIX}{offer_id}")
+                if data:
+                    self._cache.put(offer_id, data)
+                    return self._descomprimir(data)
+            except Exception as e:
+                logger.warning(f"⚠️ Error leyendo blob de oferta {offer_id} en Redis: {e}")
+
+        self.faltantes += 1
+        return None
+
+    def get_stats(self):
+        return {
+            'entries': len(self._cache),
+            'bytes': self._cache.total_bytes,
+            'evictions': self._cache.evictions,
+            'misses': self.faltantes,
+            'ttl_seconds': self.ttl,
+        }
+
+
+# Almacén global compartido por MotorBusqueda y AmadeusAdapter
+offer_blobs = OfferBlobStore()
@@ -0,0 +1,245 @@
+"""
+Presupuesto de llamadas a proveedores compartido por todo el clúster.
+
+Token bucket en Redis (un único bucket para todos los workers de gunicorn) más un
+cooldown compartido que respeta `ratelimit-reset` tras un 429. Si Redis no está
+disponible se usa un bucket en proceso con la misma lógica.
+
+Prioridades: el tráfico interactivo puede vaciar el bucket; el de segundo plano
+(prewarm del calendario, refrescos) solo consume mientras quede por encima de una
+reserva, de modo que nunca deja sin cupo a las búsquedas de usuarios.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+PRIORIDAD_INTERACTIVA = 'interactive'
+PRIORIDAD_SEGUNDO_PLANO = 'background'
+
+_prioridad_actual = contextvars.ContextVar('prioridad_proveedor', default=PRIORIDAD_INTERACTIVA)
+
+
+@contextmanager
+def prioridad(nombre):
+    """
+    Marca las llamadas del bloque (hilo o tarea asyncio) con una clase de prioridad.
+    Las tareas asyncio creadas dentro heredan la prioridad.
+    """
+    token = _prioridad_actual.set(nombre)
+    try:
+        yield
+    finally:
+        _prioridad_actual.reset(token)
+
+
+def prioridad_actual():
+    return _prioridad_actual.get()
+
+
+class PresupuestoAgotado(Exception):
+    """No hay cupo en el presupuesto compartido (bucket vacío o cooldown activo)."""
+
+    def __init__(self, mensaje, retry_after=0):
+        super().__init__(mensaje)
+        self.retry_after = retry_after
+
+
+# Refill + consumo atómico. Retorna {concedido, espera_ms, tokens}
+_TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local min_tokens = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+
+local granted = 0
+local wait_ms = 0
+if tokens >= min_tokens then
+    tokens = tokens - 1
+    granted = 1
+else
+    wait_ms = math.ceil((min_tokens - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return {granted, wait_ms, math.floor(tokens)}
+"""
+
+
+class RateBudget:
+    """Token bucket compartido (Redis) con cooldown y clases de prioridad."""
+
+    def __init__(self, nombre, capacity=None, refill_per_second=None, background_reserve=None, redis_cache=None):
+        env = nombre.upper()
+        self.nombre = nombre
+        self.capacity = float(capacity or os.getenv(f'{env}_BUDGET_CAPACITY', '40'))
+        self.refill_per_second = float(refill_per_second or os.getenv(f'{env}_BUDGET_REFILL_PER_SECOND', '2'))
+        if background_reserve is None:
+            background_reserve = float(os.getenv(f'{env}_BUDGET_BACKGROUND_RESERVE', '0.5'))
+        # Tokens mínimos que deben quedar en el bucket para que cada prioridad pueda consumir
+        self.min_tokens = {
+            PRIORIDAD_INTERACTIVA: 1.0,
+            PRIORIDAD_SEGUNDO_PLANO: 1.0 + self.capacity * background_reserve,
+        }
+        self.max_wait = {
+            PRIORIDAD_INTERACTIVA: float(os.getenv(f'{env}_BUDGET_WAIT_INTERACTIVE', '3')),
+            PRIORIDAD_SEGUNDO_PLANO: float(os.getenv(f'{env}_BUDGET_WAIT_BACKGROUND', '30')),
+        }
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        self.bucket_key = f"{nombre}:budget:bucket"
+        self.cooldown_key = f"{nombre}:budget:cooldown"
+
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._cooldown_until = 0.0
+        self._stats = {p: {'granted': 0, 'denied': 0, 'wait_seconds': 0.0} for p in self.min_tokens}
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    # ==========================================
+    # COOLDOWN COMPARTIDO
+    # ==========================================
+    def set_cooldown(self, seconds):
+        """Bloquea el proveedor para todo el clúster durante `seconds` (solo amplía, nunca acorta)."""
+        seconds = max(1, int(seconds))
+        with self._lock:
+            self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+        client = self._redis()
+        if client is not None:
+            try:
+                if client.pttl(self.cooldown_key) < seconds * 1000:
+                    client.set(self.cooldown_key, '1', ex=seconds)
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo publicar cooldown {self.nombre} en Redis: {e}")
+
+    def cooldown_remaining(self):
+        """Segundos de cooldown restantes (máximo entre el local y el compartido)."""
+        with self._lock:
+            local = max(0.0, self._cooldown_until - time.monotonic())
+
+        client = self._redis()
+        if client is not None:
+            try:
+                pttl = client.pttl(self.cooldown_key)
+                if pttl and pttl > 0:
+                    return max(local, pttl / 1000.0)
+            except Exception as e:
+                logger.warning(f"⚠️ Error leyendo cooldown {self.nombre} en Redis: {e}")
+        return local
+
+    # ==========================================
+    # TOKEN BUCKET
+    # ==========================================
+    def _try_take_local(self, min_tokens):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.refill_per_second)
+            self._ts = now
+            if self._tokens >= min_tokens:
+                self._tokens -= 1
+                return True, 0.0
+            return False, (min_tokens - self._tokens) / self.refill_per_second
+
+    def _try_take(self, prioridad_nombre):
+        min_tokens = self.min_tokens.get(prioridad_nombre, self.min_tokens[PRIORIDAD_INTERACTIVA])
+        client = self._redis()
+        if client is not None:
+            try:
+                granted, wait_ms, _tokens = client.eval(
+                    _TOKEN_BUCKET_LUA, 1, self.bucket_key,
+                    self.capacity, self.refill_per_second, min_tokens
+                )
+                return bool(granted), int(wait_ms) / 1000.0
+            except Exception as e:
+                logger.warning(f"⚠️ Bucket {self.nombre} en Redis no disponible, usando local: {e}")
+        return self._try_take_local(min_tokens)
+
+    def _registrar(self, prioridad_nombre, concedido, esperado):
+        with self._lock:
+            stats = self._stats.setdefault(prioridad_nombre, {'granted': 0, 'denied': 0, 'wait_seconds': 0.0})
+            stats['granted' if concedido else 'denied'] += 1
+            stats['wait_seconds'] += esperado
+
+    def _siguiente_paso(self, prioridad_nombre, inicio, timeout):
+        """Un intento de consumo. Retorna (True, 0) concedido, (False, espera) para reintentar o lanza PresupuestoAgotado."""
+        cooldown = self.cooldown_remaining()
+        if cooldown > 0:
+            self._registrar(prioridad_nombre, False, time.monotonic() - inicio)
+            raise PresupuestoAgotado(f"{self.nombre} en cooldown ({int(cooldown)}s)", retry_after=cooldown)
+
+        concedido, espera = self._try_take(prioridad_nombre)
+        transcurrido = time.monotonic() - inicio
+        if concedido:
+            self._registrar(prioridad_nombre, True, transcurrido)
+            return True, 0.0
+        if transcurrido + espera > timeout:
+            self._registrar(prioridad_nombre, False, transcurrido)
+            raise PresupuestoAgotado(f"Presupuesto {self.nombre} agotado ({prioridad_nombre})", retry_after=espera)
+        return False, espera
+
+    def acquire(self, prioridad_nombre=None, timeout=None):
+        """Consume un token esperando como máximo `timeout` (por defecto según prioridad)."""
+        prioridad_nombre = prioridad_nombre or prioridad_actual()
+        timeout = self.max_wait.get(prioridad_nombre, 0) if timeout is None else timeout
+        inicio = time.monotonic()
+        while True:
+            concedido, espera = self._siguiente_paso(prioridad_nombre, inicio, timeout)
+            if concedido:
+                return True
+            time.sleep(min(espera, 0.5))
+
+    async def acquire_async(self, prioridad_nombre=None, timeout=None):
+        """Igual que acquire() sin bloquear el event loop."""
+        prioridad_nombre = prioridad_nombre or prioridad_actual()
+        timeout = self.max_wait.get(prioridad_nombre, 0) if timeout is None else timeout
+        inicio = time.monotonic()
+        loop = asyncio.get_running_loop()
+        while True:
+            # El paso consulta Redis: en el executor para no parar el resto de corrutinas
+            concedido, espera = await loop.run_in_executor(None, self._siguiente_paso, prioridad_nombre, inicio, timeout)
+            if concedido:
+                return True
+            await asyncio.sleep(min(espera, 0.5))
+
+    def get_stats(self):
+        with self._lock:
+            stats = {p: dict(v) for p, v in self._stats.items()}
+        return {
+            'backend': 'redis' if self._redis() is not None else 'local',
+            'capacity': self.capacity,
+            'refill_per_second': self.refill_per_second,
+            'min_tokens': dict(self.min_tokens),
+            'cooldown_remaining_seconds': round(self.cooldown_remaining(), 1),
+            'priorities': stats,
+        }
+
+
+# Presupuesto global de Duffel compartido por MotorBusqueda y MotorBusquedaAsync
+duffel_budget = RateBudget('duffel')
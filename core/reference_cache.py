@@ -0,0 +1,221 @@
+"""
+Caché de datos de referencia de Amadeus (aeropuertos, aerolíneas, rutas, enlaces de check-in).
+
+Son datos que cambian muy poco y cada consulta costaba una llamada a la API (timeout 30 s).
+Cada tipo registra un cargador por lotes y un TTL de días:
+- L1 en proceso (CacheLRU) + L2 en Redis compartido entre workers;
+- `obtener_muchos` solo pide a la API las claves que faltan, en una única llamada por lote
+  (p.ej. los códigos de aerolínea que no estaban ya en caché);
+- las respuestas vacías se recuerdan con un TTL corto;
+- `refrescar()` recarga en bloque las claves conocidas (disparado desde admin) de los tipos
+  marcados como refrescables, cuyas claves son códigos acotados (aerolíneas, aeropuertos).
+  Las claves de texto libre o coordenadas no se indexan, ni tampoco las respuestas vacías;
+  el índice caduca con el TTL del tipo y tiene un tamaño máximo.
+"""
+
+import json
+import logging
+import os
+import threading
+
+from core.lru_cache import CacheLRU
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+
+class _TipoReferencia:
+    def __init__(self, nombre, cargar_lote, ttl, tam_lote, refrescable):
+        self.nombre = nombre
+        self.cargar_lote = cargar_lote
+        self.ttl = ttl
+        self.tam_lote = tam_lote
+        self.refrescable = refrescable
+
+
+class CacheReferencia:
+    """Caché por tipo de dato de referencia con carga por lotes de las claves ausentes."""
+
+    def __init__(self, prefijo="amadeus:ref:", max_entries=None, ttl_negativo=None, max_indice=None, redis_cache=None):
+        self.prefijo = prefijo
+        self.ttl_negativo = int(ttl_negativo or os.getenv('AMADEUS_REF_NEGATIVE_TTL_SECONDS', '3600'))
+        # Tope de claves por tipo en el índice de refresco (cada una es una llamada a la API al refrescar)
+        self.max_indice = int(max_indice or os.getenv('AMADEUS_REF_INDEX_MAX_KEYS', '2000'))
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        self._l1 = CacheLRU(max_entries=int(max_entries or os.getenv('AMADEUS_REF_MAX_ENTRIES', '5000')), default_ttl=86400)
+        self._tipos = {}
+        self._claves_locales = {}
+        self._lock = threading.Lock()
+
+        self.hits_l1 = 0
+        self.hits_redis = 0
+        self.misses = 0
+        self.cargas = 0
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    def registrar(self, tipo, cargar_lote, ttl, tam_lote=1, refrescable=False):
+        """
+        cargar_lote(claves) -> {clave: valor}; las claves que no devuelve se guardan como None.
+        Solo los tipos `refrescable` (claves de un conjunto acotado) entran en el refresco en bloque.
+        """
+        self._tipos[tipo] = _TipoReferencia(tipo, cargar_lote, int(ttl), max(1, int(tam_lote)), refrescable)
+        self._claves_locales.setdefault(tipo, set())
+
+    def _clave(self, tipo, clave):
+        return f"{self.prefijo}{tipo}:{clave}"
+
+    @staticmethod
+    def _vacio(valor):
+        # Respuesta de la API sin resultados ({'data': []}) o clave que el lote no devolvió.
+        # Los registros sueltos (una aerolínea) no llevan 'data' y son datos válidos
+        return valor is None or (isinstance(valor, dict) and 'data' in valor and not valor['data'])
+
+    def _ttl(self, cfg, valor):
+        return self.ttl_negativo if self._vacio(valor) else cfg.ttl
+
+    # ==========================================
+    # LECTURA
+    # ==========================================
+    def obtener(self, tipo, clave):
+        return self.obtener_muchos(tipo, [clave])[clave]
+
+    def obtener_muchos(self, tipo, claves):
+        """{clave: valor} para todas las claves; solo las ausentes en L1/Redis llegan a la API."""
+        cfg = self._tipos[tipo]
+        resultado = {}
+        faltan = []
+        for clave in dict.fromkeys(claves):
+            envuelto = self._l1.get(self._clave(tipo, clave))
+            if envuelto is not None:
+                self.hits_l1 += 1
+                resultado[clave] = envuelto[0]
+            else:
+                faltan.append(clave)
+
+        client = self._redis()
+        if faltan and client is not None:
+            try:
+                valores = client.mget([self._clave(tipo, c) for c in faltan])
+                pendientes = []
+                for clave, data in zip(faltan, valores):
+                    if data is None:
+                        pendientes.append(clave)
+                        continue
+                    valor = json.loads(data)
+                    self.hits_redis += 1
+                    resultado[clave] = valor
+                    self._l1.put(self._clave(tipo, clave), (valor,), ttl=self._ttl(cfg, valor))
+                faltan = pendientes
+            except Exception as e:
+                logger.warning(f"⚠️ Caché de referencia Amadeus no disponible en Redis: {e}")
+
+        if faltan:
+            self.misses += len(faltan)
+            resultado.update(self._cargar(cfg, faltan))
+        return resultado
+
+    # ==========================================
+    # CARGA Y REFRESCO
+    # ==========================================
+    def _cargar(self, cfg, claves):
+        """Pide a la API las claves en lotes de cfg.tam_lote y las guarda en L1 + Redis."""
+        cargados = {}
+        for i in range(0, len(claves), cfg.tam_lote):
+            lote = claves[i:i + cfg.tam_lote]
+            self.cargas += 1
+            # Un error de la API se propaga y no se cachea
+            valores = cfg.cargar_lote(lote) or {}
+            for clave in lote:
+                cargados[clave] = valores.get(clave)
+        self._guardar(cfg, cargados)
+        return cargados
+
+    def _guardar(self, cfg, valores):
+        for clave, valor in valores.items():
+            self._l1.put(self._clave(cfg.nombre, clave), (valor,), ttl=self._ttl(cfg, valor))
+
+        # Solo las respuestas con datos de tipos refrescables entran en el índice de refresco
+        indexables = [c for c, v in valores.items() if cfg.refrescable and not self._vacio(v)]
+        with self._lock:
+            locales = self._claves_locales[cfg.nombre]
+            for clave in indexables:
+                if len(locales) >= self.max_indice:
+                    break
+                locales.add(clave)
+
+        client = self._redis()
+        if client is None or not valores:
+            return
+        try:
+            indice = f"{self.prefijo}index:{cfg.nombre}"
+            if indexables:
+                indexables = indexables[:max(0, self.max_indice - client.scard(indice))]
+            pipe = client.pipeline(transaction=False)
+            for clave, valor in valores.items():
+                pipe.setex(self._clave(cfg.nombre, clave), self._ttl(cfg, valor), json.dumps(valor, default=str))
+            if indexables:
+                # Índice de claves conocidas para el refresco en bloque desde cualquier worker;
+                # caduca si en todo un TTL nadie carga claves nuevas de ese tipo
+                pipe.sadd(indice, *indexables)
+                pipe.expire(indice, cfg.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudieron guardar datos de referencia en Redis: {e}")
+
+    def _claves_conocidas(self, tipo):
+        claves = set(self._claves_locales.get(tipo, ()))
+        client = self._redis()
+        if client is not None:
+            try:
+                claves.update(
+                    c.decode() if isinstance(c, bytes) else c
+                    for c in client.smembers(f"{self.prefijo}index:{tipo}")
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ Índice de referencias {tipo} no disponible en Redis: {e}")
+        return sorted(claves)[:self.max_indice]
+
+    def refrescar(self, tipos=None):
+        """Recarga desde la API las claves conocidas de los tipos refrescables. Retorna {tipo: claves refrescadas}."""
+        refrescadas = {}
+        for tipo in tipos or list(self._tipos):
+            cfg = self._tipos.get(tipo)
+            if cfg is None or not cfg.refrescable:
+                continue
+            claves = self._claves_conocidas(tipo)
+            total = 0
+            for i in range(0, len(claves), cfg.tam_lote):
+                lote = claves[i:i + cfg.tam_lote]
+                try:
+                    self._cargar(cfg, lote)
+                    total += len(lote)
+                except Exception as e:
+                    logger.warning(f"⚠️ Refresco de referencias {tipo} ({lote[0]}...) fallido: {e}")
+            refrescadas[tipo] = total
+            logger.info(f"🔄 Referencias Amadeus {tipo}: {total}/{len(claves)} claves refrescadas")
+        return refrescadas
+
+    def get_stats(self):
+        with self._lock:
+            conocidas = {tipo: len(claves) for tipo, claves in self._claves_locales.items()}
+        return {
+            'entries': len(self._l1),
+            'known_keys_here': conocidas,
+            'hits_l1': self.hits_l1,
+            'hits_redis': self.hits_redis,
+            'misses': self.misses,
+            'api_batches': self.cargas,
+            'ttl_seconds': {tipo: cfg.ttl for tipo, cfg in self._tipos.items()},
+        }
+
+
+# Caché global (AmadeusAdapter registra los cargadores de cada tipo)
+referencias_amadeus = CacheReferencia()
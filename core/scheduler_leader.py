@@ -0,0 +1,378 @@
+"""
+Elección de líder para los jobs de APScheduler entre workers de gunicorn.
+
+Cada worker arranca su propio APScheduler (gunicorn_config: workers = 4). Sin coordinación,
+cada job programado se ejecutaba una vez por worker: cuatro veces el refresco del calendario
+contra Duffel y cuatro emails de check-in por reserva.
+
+Un único worker del clúster es líder y solo él ejecuta los jobs:
+- Redis: lease `scheduler:leader` (SET NX PX con token) renovado por un hilo de latido;
+  si el líder muere, otro worker toma el relevo al caducar el lease.
+- Postgres (si Redis no está disponible): pg_try_advisory_lock de sesión sobre una conexión
+  dedicada; se libera sola si el proceso o la conexión mueren.
+- Sin Redis ni Postgres (desarrollo, SQLite): cada proceso se considera líder.
+
+Además cada job tiene su propio lock (Redis + local) para que una ejecución no se solape
+con la anterior, y se registran duración y retraso (lag) respecto a la hora programada.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
+logger = logging.getLogger(__name__)
+
+
+if Histogram is not None:
+    JOB_DURACION = Histogram(
+        'agencia_scheduler_job_duration_seconds',
+        'Duración de los jobs del scheduler',
+        ['job'],
+        buckets=[0.5, 1.0, 5.0, 15.0, 30.0, 60.0, 300.0, 900.0]
+    )
+    JOB_LAG = Histogram(
+        'agencia_scheduler_job_lag_seconds',
+        'Retraso entre la hora programada y el inicio real del job',
+        ['job'],
+        buckets=[0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0]
+    )
+    JOB_RESULTADOS = Counter(
+        'agencia_scheduler_job_runs_total',
+        'Ejecuciones de jobs del scheduler por resultado',
+        ['job', 'resultado']  # ok, error, follower, overlap
+    )
+else:
+    JOB_DURACION = JOB_LAG = JOB_RESULTADOS = None
+
+
+_RENOVAR_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_LIBERAR_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _clave_advisory(nombre):
+    """Entero de 64 bits estable para pg_try_advisory_lock a partir de un nombre."""
+    return int.from_bytes(hashlib.sha1(nombre.encode('utf-8')).digest()[:8], 'big', signed=True)
+
+
+class CoordinadorScheduler:
+    """
+    Liderazgo del scheduler + ejecución exclusiva y métricas por job.
+    Uso: `scheduler.add_job(func=coordinador.envolver('mi-job', func), ...)`.
+    """
+
+    REDIS_LIDER = "scheduler:leader"
+    REDIS_JOB_LOCK = "scheduler:job:"
+    REDIS_METRICAS = "scheduler:metrics"
+
+    def __init__(self, nombre='agencia-scheduler', lease_seconds=None, redis_cache=None, engine_factory=None):
+        self.nombre = nombre
+        self.lease_seconds = int(lease_seconds or os.getenv('SCHEDULER_LEADER_LEASE_SECONDS', '30'))
+        # Tope de un job antes de que su lock caduque solo (p.ej. si el worker muere a mitad)
+        self.job_lock_seconds = int(os.getenv('SCHEDULER_JOB_LOCK_SECONDS', '3600'))
+        self.enabled = os.getenv('SCHEDULER_LEADER_ELECTION', 'true').lower() == 'true'
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        self._engine_factory = engine_factory
+
+        self.identidad = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._token = None
+        self._pg_conexion = None
+        self._modo = None
+        self._lock = threading.Lock()
+        self._locks_jobs = {}
+        self._programados = {}
+        self._metricas = {}
+        self._latido = None
+        self._parar = threading.Event()
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache.redis_client
+        return None
+
+    def _engine(self):
+        if self._engine_factory is not None:
+            return self._engine_factory()
+        from database import engine
+        return engine
+
+    # ==========================================
+    # LIDERAZGO
+    # ==========================================
+    def _liderazgo_redis(self, client):
+        ms = self.lease_seconds * 1000
+        if self._token and client.eval(_RENOVAR_LEASE, 1, self.REDIS_LIDER, self._token, ms):
+            return True
+        # El valor identifica al worker dueño (visible en /scheduler-status desde cualquier worker)
+        token = f"{uuid.uuid4().hex}@{self.identidad}"
+        if client.set(self.REDIS_LIDER, token, nx=True, px=ms):
+            self._token = token
+            logger.info(f"👑 Scheduler: {self.identidad} es líder (Redis, lease {self.lease_seconds}s)")
+            return True
+        if self._token:
+            logger.warning(f"⚠️ Scheduler: {self.identidad} ha perdido el liderazgo")
+        self._token = None
+        return False
+
+    def _liderazgo_postgres(self, engine):
+        from sqlalchemy import text
+
+        if self._pg_conexion is not None:
+            try:
+                self._pg_conexion.execute(text("SELECT 1"))
+                return True
+            except Exception as e:
+                # Conexión caída = lock de sesión liberado: otro worker puede ser ya el líder
+                logger.warning(f"⚠️ Scheduler: conexión de liderazgo perdida ({e})")
+                self._cerrar_postgres()
+
+        conexion = engine.connect()
+        try:
+            obtenido = conexion.execute(
+                text("SELECT pg_try_advisory_lock(:clave)"), {'clave': _clave_advisory(self.nombre)}
+            ).scalar()
+            conexion.commit()
+        except Exception:
+            conexion.close()
+            raise
+        if not obtenido:
+            conexion.close()
+            return False
+        self._pg_conexion = conexion
+        logger.info(f"👑 Scheduler: {self.identidad} es líder (advisory lock de Postgres)")
+        return True
+
+    def _cerrar_postgres(self):
+        if self._pg_conexion is not None:
+            try:
+                self._pg_conexion.close()
+            except Exception:
+                pass
+            self._pg_conexion = None
+
+    def es_lider(self):
+        """Adquiere o renueva el liderazgo. Si el backend de coordinación falla, no es líder."""
+        if not self.enabled:
+            self._modo = 'disabled'
+            return True
+
+        with self._lock:
+            client = self._redis()
+            if client is not None:
+                try:
+                    self._modo = 'redis'
+                    return self._liderazgo_redis(client)
+                except Exception as e:
+                    logger.warning(f"⚠️ Scheduler: liderazgo en Redis no disponible: {e}")
+                    self._token = None
+
+            try:
+                engine = self._engine()
+            except Exception as e:
+                logger.warning(f"⚠️ Scheduler: sin engine de base de datos para liderazgo: {e}")
+                return False
+
+            if engine.dialect.name != 'postgresql':
+                # Sin backend compartido (desarrollo): un solo proceso, siempre líder
+                if self._modo != 'local':
+                    logger.warning("⚠️ Scheduler sin Redis ni Postgres: cada proceso ejecuta sus jobs")
+                self._modo = 'local'
+                return True
+
+            self._modo = 'postgres'
+            try:
+                return self._liderazgo_postgres(engine)
+            except Exception as e:
+                logger.warning(f"⚠️ Scheduler: advisory lock de Postgres no disponible: {e}")
+                return False
+
+    def iniciar(self):
+        """Arranca el latido que mantiene (o intenta tomar) el liderazgo entre ejecuciones."""
+        if not self.enabled or (self._latido is not None and self._latido.is_alive()):
+            return
+
+        def _bucle():
+            while not self._parar.wait(max(1.0, self.lease_seconds / 3)):
+                try:
+                    self.es_lider()
+                except Exception as e:
+                    logger.warning(f"⚠️ Scheduler: error en latido de liderazgo: {e}")
+
+        self.es_lider()
+        self._latido = threading.Thread(target=_bucle, name='scheduler-leader', daemon=True)
+        self._latido.start()
+
+    def renunciar(self):
+        """Libera el liderazgo (apagado ordenado) para que otro worker tome el relevo sin esperar."""
+        self._parar.set()
+        with self._lock:
+            client = self._redis()
+            if client is not None and self._token:
+                try:
+                    client.eval(_LIBERAR_LEASE, 1, self.REDIS_LIDER, self._token)
+                except Exception as e:
+                    logger.warning(f"⚠️ Scheduler: no se pudo liberar el liderazgo: {e}")
+            self._token = None
+            self._cerrar_postgres()
+
+    # ==========================================
+    # EJECUCIÓN EXCLUSIVA POR JOB
+    # ==========================================
+    def on_job_submitted(self, event):
+        """Listener EVENT_JOB_SUBMITTED: guarda la hora programada para medir el lag."""
+        horas = getattr(event, 'scheduled_run_times', None) or []
+        if horas:
+            self._programados[event.job_id] = horas[-1].timestamp()
+
+    def _bloquear_job(self, job_id):
+        local = self._locks_jobs.setdefault(job_id, threading.Lock())
+        if not local.acquire(blocking=False):
+            return None
+
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            token = self.redis_cache.acquire_lock(f"{self.REDIS_JOB_LOCK}{job_id}", ttl=self.job_lock_seconds)
+            if token is None:
+                local.release()
+                return None
+            return token
+        return True
+
+    def _liberar_job(self, job_id, token):
+        if token is not True and self.redis_cache:
+            self.redis_cache.release_lock(f"{self.REDIS_JOB_LOCK}{job_id}", token)
+        self._locks_jobs[job_id].release()
+
+    def _registrar(self, job_id, resultado, duracion=None, lag=None, error=None):
+        with self._lock:
+            m = self._metricas.setdefault(job_id, {
+                'runs': 0, 'errors': 0, 'skipped_follower': 0, 'skipped_overlap': 0,
+                'last_run': None, 'last_duration_seconds': None, 'max_duration_seconds': 0.0,
+                'total_duration_seconds': 0.0, 'last_lag_seconds': None, 'max_lag_seconds': 0.0,
+                'last_error': None,
+            })
+            if resultado in ('ok', 'error'):
+                m['runs'] += 1
+                m['last_run'] = datetime.utcnow().isoformat()
+                m['last_duration_seconds'] = round(duracion, 3)
+                m['max_duration_seconds'] = round(max(m['max_duration_seconds'], duracion), 3)
+                m['total_duration_seconds'] = round(m['total_duration_seconds'] + duracion, 3)
+                if lag is not None:
+                    m['last_lag_seconds'] = round(lag, 3)
+                    m['max_lag_seconds'] = round(max(m['max_lag_seconds'], lag), 3)
+                if resultado == 'error':
+                    m['errors'] += 1
+                    m['last_error'] = str(error)[:300]
+            else:
+                m[f'skipped_{resultado}'] += 1
+            instantanea = dict(m)
+
+        if JOB_RESULTADOS is not None:
+            JOB_RESULTADOS.labels(job=job_id, resultado=resultado).inc()
+            if duracion is not None:
+                JOB_DURACION.labels(job=job_id).observe(duracion)
+            if lag is not None:
+                JOB_LAG.labels(job=job_id).observe(lag)
+
+        # Las ejecuciones reales se publican para que /scheduler-status responda igual en cualquier worker
+        client = self._redis() if resultado in ('ok', 'error') else None
+        if client is not None:
+            try:
+                instantanea['worker'] = self.identidad
+                client.hset(self.REDIS_METRICAS, job_id, json.dumps(instantanea))
+            except Exception as e:
+                logger.warning(f"⚠️ Scheduler: no se pudieron publicar métricas de {job_id}: {e}")
+
+    def ejecutar(self, job_id, func, *args, **kwargs):
+        """Ejecuta func solo si este worker es líder y no hay otra ejecución del mismo job en curso."""
+        inicio = time.time()
+        programado = self._programados.pop(job_id, None)
+        lag = max(0.0, inicio - programado) if programado else None
+
+        if not self.es_lider():
+            self._registrar(job_id, 'follower')
+            return None
+
+        token = self._bloquear_job(job_id)
+        if token is None:
+            logger.info(f"⏭️ Job {job_id} omitido: la ejecución anterior sigue en curso")
+            self._registrar(job_id, 'overlap')
+            return None
+
+        try:
+            resultado = func(*args, **kwargs)
+        except Exception as e:
+            self._registrar(job_id, 'error', time.time() - inicio, lag, error=e)
+            logger.error(f"❌ Job {job_id} falló: {e}")
+            return None
+        finally:
+            self._liberar_job(job_id, token)
+
+        self._registrar(job_id, 'ok', time.time() - inicio, lag)
+        return resultado
+
+    def envolver(self, job_id, func):
+        """Función para add_job que delega en ejecutar()."""
+        @functools.wraps(func)
+        def _job(*args, **kwargs):
+            return self.ejecutar(job_id, func, *args, **kwargs)
+        return _job
+
+    def get_stats(self):
+        with self._lock:
+            locales = {job_id: dict(m) for job_id, m in self._metricas.items()}
+
+        cluster = {}
+        lider = None
+        client = self._redis()
+        if client is not None:
+            try:
+                valor = client.get(self.REDIS_LIDER)
+                if valor:
+                    lider = (valor.decode() if isinstance(valor, bytes) else valor).split('@', 1)[-1]
+                for job_id, valor in client.hgetall(self.REDIS_METRICAS).items():
+                    job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+                    cluster[job_id] = json.loads(valor)
+            except Exception as e:
+                logger.warning(f"⚠️ Scheduler: métricas de clúster no disponibles: {e}")
+
+        return {
+            'enabled': self.enabled,
+            'mode': self._modo,
+            'worker': self.identidad,
+            'is_leader': bool(self._token or self._pg_conexion is not None or self._modo in ('local', 'disabled')),
+            'leader': lider,
+            'lease_seconds': self.lease_seconds,
+            'jobs': locales,
+            'cluster_jobs': cluster,
+        }
+
+
+# Coordinador global del proceso (un APScheduler por worker, un líder por clúster)
+scheduler_coordinator = CoordinadorScheduler()
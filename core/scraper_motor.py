@@ -1,16 +1,160 @@
 import os
-import requests
+import heapq
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from decimal import Decimal
+import requests
 from dotenv import load_dotenv
+from core.http_transport import http_transport
+from core.lru_cache import CacheLRU
+from core.offer_model import OfertaCompacta, SegmentoCompacto, TrayectoCompacto, offer_blobs
+from core.fare_index import indice_tarifas
+from core.rate_budget import duffel_budget, PresupuestoAgotado, prioridad, PRIORIDAD_SEGUNDO_PLANO
 
 # Configuración de Logging
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Caché compartida (L2) entre workers: opcional, si Redis no está disponible se usa solo L1
+try:
+    from cache.redis_cache import (
+        redis_cache as shared_redis_cache,
+        cache_flight_search,
+        get_cached_flight_search,
+        cache_multi_city_search,
+        get_cached_multi_city_search,
+    )
+except ImportError:
+    shared_redis_cache = None
+    cache_flight_search = get_cached_flight_search = None
+    cache_multi_city_search = get_cached_multi_city_search = None
+
+# Parseo incremental de respuestas grandes de offer_requests (opcional)
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+class _LlamadaEnCurso:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas concurrentes con la misma clave (dentro del proceso):
+    solo una ejecuta la función y el resto espera y reutiliza su resultado.
+    """
+
+    def __init__(self, wait_timeout=30):
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _LlamadaEnCurso()
+                self._calls[key] = call
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            if call.event.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # El líder no terminó a tiempo: ejecutar por cuenta propia
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class _LectorChunks:
+    """Adaptador file-like (read) sobre un iterable de bytes, para ijson."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def read(self, size=-1):
+        if size == 0:  # ijson sondea el tipo con read(0)
+            return b''
+        return next(self._chunks, b'')
+
+
+class SelectorTopK:
+    """
+    Fase 1 del pipeline de ofertas: se queda con las K más baratas leyendo solo
+    total_amount, con un heap acotado (O(n log K)). Las ofertas se añaden de una en
+    una, así que sirve también para parseo incremental. Guarda `reserva` candidatas
+    extra por si alguna falla al normalizarse. k=None conserva todas.
+    """
+
+    def __init__(self, k=None, reserva=5):
+        self.k = k
+        self.capacidad = None if k is None else k + reserva
+        self._heap = []
+        self._seq = 0
+        self.vistas = 0
+        self.descartadas = 0
+
+    def add(self, offer):
+        self.vistas += 1
+        try:
+            precio = float(offer['total_amount'])
+        except (KeyError, TypeError, ValueError):
+            self.descartadas += 1
+            logger.warning(f"⚠️ Oferta sin precio válido descartada: {offer.get('id', 'unknown') if isinstance(offer, dict) else offer}")
+            return
+
+        # Raíz del heap = peor candidata (más cara; a igual precio, la más reciente) -> orden estable
+        self._seq += 1
+        item = (-precio, -self._seq, offer)
+        if self.capacidad is None or len(self._heap) < self.capacidad:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def add_stream(self, chunks):
+        """
+        Alimenta el selector oferta a oferta desde un iterable de bytes (cuerpo JSON de
+        /air/offer_requests) sin materializar la respuesta completa en memoria.
+        """
+        for offer in ijson.items(_LectorChunks(chunks), 'data.offers.item', use_float=True):
+            self.add(offer)
+
+    def ordenadas(self):
+        """Candidatas de menor a mayor precio (a igual precio, en orden de llegada)."""
+        return [offer for _, _, offer in sorted(self._heap, reverse=True)]
+
+    def __len__(self):
+        return len(self._heap)
+
+
 class MotorBusqueda:
     """
     Motor de búsqueda optimizado para Duffel API.
@@ -24,24 +168,65 @@ class MotorBusqueda:
     
     BASE_URL = "https://api.duffel.com"
     DUFFEL_VERSION = "v2" # O una fecha específica si fuera necesario (ej: "beta")
+    SEARCH_URL = f"{BASE_URL}/air/offer_requests?return_offers=true&supplier_timeout=15000"
+    # Solo las búsquedas consumen presupuesto: pedidos, pagos y servicios de un cliente que
+    # ya está reservando no deben fallar por un 429 causado por calendarios o prewarm
+    ENDPOINTS_CON_PRESUPUESTO = frozenset({'duffel_search', 'duffel_search_multi', 'duffel_places'})
     
     def __init__(self):
         self.duffel_token = os.getenv('DUFFEL_API_TOKEN')
-        self.cache = {}
         self.TIEMPO_CACHE_MINUTOS = int(os.getenv('CACHE_DURATION_MINUTES', 5))
         self.rate_limited_until = None
+        # Presupuesto compartido entre workers (token bucket + cooldown en Redis)
+        self.budget = duffel_budget
         
+        # Caché de dos niveles: L1 en proceso (CacheLRU) + L2 compartida en Redis
+        self.TIEMPO_CACHE_L2_SEGUNDOS = int(os.getenv('CACHE_L2_DURATION_SECONDS', '900'))
+        self.redis_cache = shared_redis_cache
+
+        # Stale-while-revalidate: pasada la frescura, una entrada con datos se sigue sirviendo durante
+        # este margen mientras se refresca en segundo plano (un refresco por clave)
+        self.CACHE_STALE_GRACE_SEGUNDOS = int(os.getenv('CACHE_STALE_GRACE_SECONDS', '600'))
+        # Resultados vacíos por error / 429 / sin presupuesto: TTL corto para no envenenar la caché
+        self.CACHE_NEGATIVA_SEGUNDOS = int(os.getenv('CACHE_NEGATIVE_TTL_SECONDS', '30'))
+        self._refrescos = ThreadPoolExecutor(
+            max_workers=int(os.getenv('CACHE_REFRESH_WORKERS', '2')),
+            thread_name_prefix='duffel-swr'
+        )
+        self._refrescos_en_curso = set()
+        self._refrescos_lock = threading.Lock()
+
         # FASE 5: Métricas de caché
         self.cache_hits = 0
         self.cache_misses = 0
-        self.max_cache_size = 100  # Limitar caché a 100 entradas
-        
+        self.l1_hits = 0
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_waits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self._stats_lock = threading.Lock()
+
+        # Single-flight: una sola llamada a Duffel por clave (hilos del proceso + lock corto en Redis entre workers)
+        self.SINGLE_FLIGHT_LOCK_SECONDS = int(os.getenv('SINGLE_FLIGHT_LOCK_SECONDS', '25'))
+        self.single_flight = SingleFlight(wait_timeout=self.SINGLE_FLIGHT_LOCK_SECONDS + 5)
+        self.max_cache_size = int(os.getenv('CACHE_MAX_ENTRIES', '100'))
+        self.max_cache_bytes = int(os.getenv('CACHE_MAX_BYTES', '0'))  # 0 = sin límite por bytes
+        self.cache = CacheLRU(
+            max_entries=self.max_cache_size,
+            max_bytes=self.max_cache_bytes,
+            default_ttl=self.TIEMPO_CACHE_MINUTOS * 60
+        )
+                
         # Markup de Agencia (Comisión)
         try:
             self.markup_percent = Decimal(os.getenv('AGENCY_MARKUP_PERCENT', '0.0'))
         except:
             self.markup_percent = Decimal('0.0')
         
+        # Parseo incremental de offer_requests: memoria acotada por búsqueda aunque el cuerpo ocupe MBs
+        self.streaming_parse = ijson is not None and os.getenv('DUFFEL_STREAMING_PARSE', 'true').lower() == 'true'
+        
         # Máximo de ofertas a devolver por búsqueda (ordenadas por mejor precio)
         try:
             self.search_results_limit = int(os.getenv('SEARCH_RESULTS_LIMIT', '10'))
@@ -53,42 +238,175 @@ class MotorBusqueda:
         else:
             logger.info(f"✅ MotorBusqueda inicializado con {self.markup_percent}% de markup, caché {self.TIEMPO_CACHE_MINUTOS}min.")
 
-    def _limpiar_cache_antiguo(self):
-        """FASE 5: Limpia entradas de caché expiradas y limita tamaño."""
-        if len(self.cache) < self.max_cache_size:
+    def _l2_disponible(self):
+        return bool(self.redis_cache and getattr(self.redis_cache, 'available', False))
+
+    def _leer_cache(self, cache_key, l2_loader, refresco=None):
+        """
+        Lee L1 y, si falla, L2 (Redis). Un hit en L2 rellena L1.
+        Una entrada L1 pasada de frescura (dentro del margen stale) se sirve igualmente si hay
+        `refresco`, que se programa en segundo plano. Retorna los resultados cacheados o None.
+        """
+        cached_data = self.cache.get(cache_key)
+        if cached_data is not None:
+            edad = self.cache.age(cache_key) or 0
+            if cached_data and edad > self.TIEMPO_CACHE_MINUTOS * 60:
+                if refresco is None:
+                    cached_data = None
+                else:
+                    with self._stats_lock:
+                        self.stale_hits += 1
+                        self.cache_hits += 1
+                    logger.info(f"♻️ Cache STALE L1 para {cache_key} ({int(edad)}s), refrescando en segundo plano")
+                    self._programar_refresco(cache_key, refresco)
+                    return cached_data
+
+        if cached_data is not None:
+            with self._stats_lock:
+                self.l1_hits += 1
+                self.cache_hits += 1
+            logger.info(f"⚡ Cache HIT L1 para {cache_key} (hits: {self.cache_hits}, misses: {self.cache_misses})")
+            return cached_data
+
+        if self._l2_disponible() and l2_loader:
+            try:
+                cached_data = l2_loader()
+            except Exception as e:
+                logger.warning(f"⚠️ Error leyendo caché L2 (Redis): {e}")
+                cached_data = None
+
+            if cached_data is not None:
+                self._guardar_l1(cache_key, cached_data)
+                with self._stats_lock:
+                    self.l2_hits += 1
+                    self.cache_hits += 1
+                logger.info(f"⚡ Cache HIT L2 (Redis) para {cache_key}")
+                return cached_data
+
+            with self._stats_lock:
+                self.l2_misses += 1
+
+        return None
+
+    def _guardar_l1(self, cache_key, resultados):
+        """Las entradas con datos viven frescura + margen stale; las vacías solo la frescura."""
+        ttl = self.TIEMPO_CACHE_MINUTOS * 60
+        if resultados:
+            ttl += self.CACHE_STALE_GRACE_SEGUNDOS
+        self.cache.put(cache_key, resultados, ttl=ttl)
+
+    def _guardar_negativo(self, cache_key):
+        """
+        Cachea [] tras un error / 429 con TTL corto. No pisa una entrada con datos que
+        todavía se esté sirviendo como stale (el refresco fallido no la invalida).
+        """
+        if self.cache.get(cache_key):
             return
-        
-        ahora = datetime.now()
-        keys_to_remove = []
-        
-        for key, (data, timestamp) in list(self.cache.items()):
-            if ahora - timestamp >= timedelta(minutes=self.TIEMPO_CACHE_MINUTOS):
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del self.cache[key]
-        
-        # Si aún está lleno, eliminar las entradas más antiguas
-        if len(self.cache) >= self.max_cache_size:
-            sorted_keys = sorted(self.cache.items(), key=lambda x: x[1][1])
-            for key, _ in sorted_keys[:len(sorted_keys)//2]:  # Eliminar la mitad más antigua
-                del self.cache[key]
-        
-        if keys_to_remove:
-            logger.info(f"🧹 Cache limpiado: {len(keys_to_remove)} entradas eliminadas, {len(self.cache)} restantes")
+        self.cache.put(cache_key, [], ttl=self.CACHE_NEGATIVA_SEGUNDOS)
+
+    def _programar_refresco(self, cache_key, refresco):
+        """Lanza `refresco` en el pool de fondo salvo que ya haya uno en curso para la clave."""
+        with self._refrescos_lock:
+            if cache_key in self._refrescos_en_curso:
+                return False
+            self._refrescos_en_curso.add(cache_key)
+        with self._stats_lock:
+            self.refreshes += 1
+
+        def _ejecutar():
+            try:
+                # El refresco solo consume presupuesto que no necesite el tráfico interactivo
+                with prioridad(PRIORIDAD_SEGUNDO_PLANO):
+                    refresco()
+            except Exception as e:
+                logger.warning(f"⚠️ Error refrescando {cache_key} en segundo plano: {e}")
+            finally:
+                with self._refrescos_lock:
+                    self._refrescos_en_curso.discard(cache_key)
+
+        try:
+            self._refrescos.submit(_ejecutar)
+        except RuntimeError:
+            with self._refrescos_lock:
+                self._refrescos_en_curso.discard(cache_key)
+            return False
+        return True
+
+    def _guardar_cache(self, cache_key, resultados, l2_saver):
+        """Guarda en L1 siempre y en L2 solo resultados no vacíos (evita propagar errores)."""
+        self._guardar_l1(cache_key, resultados)
+        if resultados and self._l2_disponible() and l2_saver:
+            try:
+                l2_saver(resultados, self.TIEMPO_CACHE_L2_SEGUNDOS)
+            except Exception as e:
+                logger.warning(f"⚠️ Error guardando caché L2 (Redis): {e}")
 
     def get_cache_stats(self):
-        """FASE 5: Retorna estadísticas del caché."""
+        """FASE 5: Retorna estadísticas del caché (global y por nivel)."""
         total = self.cache_hits + self.cache_misses
         hit_rate = (self.cache_hits / total * 100) if total > 0 else 0
+        l1_rate = (self.l1_hits / total * 100) if total > 0 else 0
+        l2_lookups = self.l2_hits + self.l2_misses
+        l2_rate = (self.l2_hits / l2_lookups * 100) if l2_lookups > 0 else 0
         return {
             'hits': self.cache_hits,
             'misses': self.cache_misses,
             'hit_rate': f"{hit_rate:.1f}%",
             'size': len(self.cache),
-            'max_size': self.max_cache_size
+            'max_size': self.max_cache_size,
+            'bytes': self.cache.total_bytes if self.max_cache_bytes else None,  # solo se mide con límite
+            'max_bytes': self.max_cache_bytes,
+            'evictions': self.cache.evictions,
+            'expirations': self.cache.expirations,
+            'l1': {
+                'hits': self.l1_hits,
+                'lookups': total,
+                'hit_rate': f"{l1_rate:.1f}%",
+                'ttl_seconds': self.TIEMPO_CACHE_MINUTOS * 60
+            },
+            'l2': {
+                'available': self._l2_disponible(),
+                'hits': self.l2_hits,
+                'lookups': l2_lookups,
+                'hit_rate': f"{l2_rate:.1f}%",
+                'ttl_seconds': self.TIEMPO_CACHE_L2_SEGUNDOS
+            },
+            'stale_while_revalidate': {
+                'stale_hits': self.stale_hits,
+                'refreshes': self.refreshes,
+                'refreshing': len(self._refrescos_en_curso),
+                'grace_seconds': self.CACHE_STALE_GRACE_SEGUNDOS,
+                'negative_ttl_seconds': self.CACHE_NEGATIVA_SEGUNDOS
+            },
+            'single_flight': {
+                'coalesced': self.single_flight.coalesced,
+                'in_flight': self.single_flight.in_flight(),
+                'cross_worker_waits': self.l2_waits
+            }
         }
 
+    def _esperar_resultado_l2(self, cache_key, lock_key, l2_loader):
+        """
+        Otro worker tiene el lock de esta búsqueda: espera a que publique el resultado en L2.
+        Retorna los resultados o None si el lock se libera/caduca sin resultado.
+        """
+        with self._stats_lock:
+            self.l2_waits += 1
+        deadline = time.monotonic() + self.SINGLE_FLIGHT_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(0.25)
+            try:
+                cached_data = l2_loader()
+            except Exception:
+                cached_data = None
+            if cached_data is not None:
+                self._guardar_l1(cache_key, cached_data)
+                logger.info(f"🤝 Single-flight: resultado de otro worker reutilizado para {cache_key}")
+                return cached_data
+            if not self.redis_cache.exists(lock_key):
+                break
+        return None
+
     def apply_markup(self, amount):
         """Aplica la comisión de agencia a un importe (Decimal)."""
         if self.markup_percent > 0:
@@ -104,14 +422,30 @@ class MotorBusqueda:
             "Accept-Encoding": "gzip"
         }
 
+    def _duffel_request(self, method, url, endpoint, **kwargs):
+        """
+        Toda llamada a Duffel pasa por aquí. Las búsquedas (ENDPOINTS_CON_PRESUPUESTO) consumen
+        del presupuesto compartido del clúster (lanza PresupuestoAgotado si no hay cupo o hay
+        cooldown); pedidos y pagos son transaccionales y lo ignoran. Cualquier 429 publica el cooldown.
+        """
+        if endpoint in self.ENDPOINTS_CON_PRESUPUESTO:
+            self.budget.acquire()
+        response = getattr(http_transport, method)(url, headers=self._get_headers(), endpoint=endpoint, **kwargs)
+        if response.status_code == 429:
+            self._set_rate_limit_cooldown(response)
+        return response
+
     def is_rate_limited(self):
-        return bool(self.rate_limited_until and datetime.utcnow() < self.rate_limited_until)
+        if self.rate_limited_until and datetime.utcnow() < self.rate_limited_until:
+            return True
+        # Cooldown publicado por otro worker tras un 429
+        return self.budget.cooldown_remaining() > 0
 
     def get_rate_limit_remaining_seconds(self):
         if not self.is_rate_limited():
             return 0
-        delta = self.rate_limited_until - datetime.utcnow()
-        return max(1, int(delta.total_seconds()))
+        local = (self.rate_limited_until - datetime.utcnow()).total_seconds() if self.rate_limited_until else 0
+        return max(1, int(max(local, self.budget.cooldown_remaining())))
 
     def _set_rate_limit_cooldown(self, response):
         retry_seconds = 30
@@ -134,6 +468,7 @@ class MotorBusqueda:
                 retry_seconds = 30
 
         self.rate_limited_until = datetime.utcnow() + timedelta(seconds=retry_seconds)
+        self.budget.set_cooldown(retry_seconds)
         logger.warning(f"⏳ Duffel rate-limited. Cooldown activo {retry_seconds}s hasta {self.rate_limited_until.isoformat()}Z")
 
     # ==========================================
@@ -154,7 +489,7 @@ class MotorBusqueda:
             # Logger debug reducido para no saturar
             logger.debug(f"🔍 Duffel Autocomplete: {query}")
             
-            response = requests.get(url, headers=self._get_headers(), params=params, timeout=5)
+            response = self._duffel_request('get', url, params=params, endpoint='duffel_places')
             
             if response.status_code == 200:
                 data = response.json().get('data', [])
@@ -202,37 +537,139 @@ class MotorBusqueda:
             return []
 
         # 1. Normalizar fecha (YYYY-MM-DD)
-        if "/" in fecha:
-            try:
-                fecha = datetime.strptime(fecha, "%d/%m/%Y").strftime("%Y-%m-%d")
-            except ValueError:
-                logger.error(f"Formato de fecha inválido: {fecha}")
-                return []
+        fecha = self._normalizar_fecha(fecha)
+        if fecha is None:
+            return []
 
-        # 2. Caché (prevenir llamadas idénticas)
+        # 2. Caché L1 -> L2 (prevenir llamadas idénticas)
         cache_key = f"{origen}_{destino}_{fecha}_{adultos}_{ninos}_{bebes}_{clase}"
-        if cache_key in self.cache:
-            cached_data, timestamp = self.cache[cache_key]
-            if datetime.now() - timestamp < timedelta(minutes=self.TIEMPO_CACHE_MINUTOS):
-                # FASE 5: Registrar cache hit
-                self.cache_hits += 1
-                logger.info(f"⚡ Cache HIT para {cache_key} (hits: {self.cache_hits}, misses: {self.cache_misses})")
-                return cached_data
+        cached_data = self._leer_cache(
+            cache_key,
+            lambda: get_cached_flight_search(origen, destino, fecha, adultos, ninos, bebes, clase),
+            refresco=lambda: self._refrescar_busqueda(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        )
+        if cached_data is not None:
+            return cached_data
 
         if self.is_rate_limited():
             remaining = self.get_rate_limit_remaining_seconds()
             logger.warning(f"⏳ Duffel en cooldown ({remaining}s restantes). Saltando llamada {origen}->{destino} ({fecha})")
-            self.cache[cache_key] = ([], datetime.now())
+            self._guardar_negativo(cache_key)
             return []
         
         # FASE 5: Cache miss
-        self.cache_misses += 1
+        with self._stats_lock:
+            self.cache_misses += 1
         logger.info(f"📡 Cache MISS - Solicitando vuelos a Duffel: {origen}->{destino} ({fecha})")
-        
-        # FASE 5: Limpiar caché si está lleno
-        self._limpiar_cache_antiguo()
 
-        # 3. Construir Payload Duffel Standard
+        # 3. Single-flight: llamadas idénticas concurrentes comparten una sola petición a Duffel
+        return self.single_flight.do(
+            cache_key,
+            lambda: self._buscar_vuelos_coordinado(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        )
+
+    def _normalizar_fecha(self, fecha):
+        """Convierte DD/MM/YYYY a YYYY-MM-DD. Retorna None si el formato es inválido."""
+        if "/" in fecha:
+            try:
+                return datetime.strptime(fecha, "%d/%m/%Y").strftime("%Y-%m-%d")
+            except ValueError:
+                logger.error(f"Formato de fecha inválido: {fecha}")
+                return None
+        return fecha
+
+    def _refrescar_busqueda(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase):
+        """Refresco en segundo plano de una entrada stale (comparte single-flight con las búsquedas)."""
+        if self.is_rate_limited():
+            return None
+        return self.single_flight.do(
+            cache_key,
+            lambda: self._buscar_vuelos_coordinado(
+                cache_key, origen, destino, fecha, adultos, ninos, bebes, clase, refresco=True
+            )
+        )
+
+    def _buscar_vuelos_coordinado(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase,
+                                  refresco=False):
+        """Líder del single-flight local: se coordina con otros workers mediante un lock corto en Redis."""
+        cached_data, lock_token = self._turno_busqueda(
+            cache_key, origen, destino, fecha, adultos, ninos, bebes, clase, refresco=refresco
+        )
+        if cached_data is not None:
+            return cached_data
+
+        try:
+            return self._solicitar_vuelos_duffel(cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        finally:
+            self._liberar_turno_busqueda(cache_key, lock_token)
+
+    def _turno_busqueda(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase, refresco=False):
+        """
+        Coordinación previa a llamar a Duffel (bloqueante; MotorBusquedaAsync la usa desde un executor).
+        Retorna (resultados, None) si otro hilo o worker ya los obtuvo, o (None, lock_token) si nos
+        toca buscar; lock_token es None sin Redis.
+        """
+        # Otro hilo pudo completar la misma búsqueda justo antes de que fuéramos líderes
+        # (en un refresco la entrada existente es la stale que se quiere sustituir)
+        cached_data = None if refresco else self.cache.get(cache_key)
+        if cached_data is not None:
+            return cached_data, None
+
+        lock_key = f"vuelos:lock:{cache_key}"
+        lock_token = None
+        if self._l2_disponible():
+            lock_token = self.redis_cache.acquire_lock(lock_key, ttl=self.SINGLE_FLIGHT_LOCK_SECONDS)
+            if lock_token is None:
+                cached_data = self._esperar_resultado_l2(
+                    cache_key,
+                    lock_key,
+                    lambda: get_cached_flight_search(origen, destino, fecha, adultos, ninos, bebes, clase)
+                )
+                if cached_data is not None:
+                    return cached_data, None
+        return None, lock_token
+
+    def _liberar_turno_busqueda(self, cache_key, lock_token):
+        if lock_token:
+            self.redis_cache.release_lock(f"vuelos:lock:{cache_key}", lock_token)
+
+    def _solicitar_vuelos_duffel(self, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase):
+        """POST /air/offer_requests y procesado de ofertas (sin caché ni coordinación)."""
+        payload = self._payload_busqueda(origen, destino, fecha, adultos, ninos, bebes, clase)
+
+        try:
+            # Query param return_offers=true para obtener ofertas en la misma llamada (más rápido)
+            response = self._duffel_request(
+                'post', self.SEARCH_URL, json=payload, endpoint='duffel_search', stream=self.streaming_parse
+            )
+            return self._procesar_respuesta_busqueda(response, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase)
+        except PresupuestoAgotado as e:
+            logger.warning(f"⏳ Búsqueda {origen}->{destino} ({fecha}) sin presupuesto Duffel: {e}")
+            return []
+        except Exception as e:
+            logger.error(f"❌ Excepción crítica en buscar_vuelos: {str(e)}")
+            return []
+
+    def _alimentar_selector(self, response, selector):
+        """Fase 1 desde la respuesta: recorre data.offers[] en streaming si es posible, si no vía response.json()."""
+        if not (self.streaming_parse and isinstance(response, requests.Response)):
+            offers = (response.json().get('data') or {}).get('offers') or []
+            for offer in offers:
+                selector.add(offer)
+            return
+
+        chunks = response.iter_content(chunk_size=64 * 1024)
+        try:
+            selector.add_stream(chunks)
+            # Consumir el resto del cuerpo para devolver la conexión keep-alive al pool
+            for _ in chunks:
+                pass
+        finally:
+            response.close()
+
+    def _payload_busqueda(self, origen, destino, fecha, adultos, ninos, bebes, clase):
+        """Construye el payload de /air/offer_requests (compartido con MotorBusquedaAsync)."""
+        # Construir Payload Duffel Standard
         passengers = [{"type": "adult"} for _ in range(adultos)]
         passengers.extend([{"type": "child"} for _ in range(ninos)])
         passengers.extend([{"type": "infant_without_seat"} for _ in range(bebes)])
@@ -257,54 +694,57 @@ class MotorBusqueda:
                 # "max_connections": 2 
             }
         }
+        return payload
 
-        try:
-            # Query param return_offers=true para obtener ofertas en la misma llamada (más rápido)
-            url = f"{self.BASE_URL}/air/offer_requests?return_offers=true&supplier_timeout=15000"
+    def _procesar_respuesta_busqueda(self, response, cache_key, origen, destino, fecha, adultos, ninos, bebes, clase,
+                                     selector=None):
+        """
+        Normaliza la respuesta de /air/offer_requests, aplica el top y la guarda en caché.
+        `selector` permite pasar la fase 1 ya hecha (p.ej. parseo incremental en MotorBusquedaAsync).
+        """
+        if response.status_code == 201:
+            if selector is None:
+                selector = SelectorTopK(self.search_results_limit)
+                self._alimentar_selector(response, selector)
             
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=20)
+            logger.info(f"✅ Duffel retornó {selector.vistas} ofertas crudas.")
             
-            if response.status_code == 201:
-                data = response.json().get('data', {})
-                offers = data.get('offers', [])
-                
-                logger.info(f"✅ Duffel retornó {len(offers)} ofertas crudas.")
-                
-                resultados_procesados = self._procesar_ofertas(offers, origen, destino)
-                resultados_procesados = resultados_procesados[:self.search_results_limit]
-                logger.info(f"✅ Duffel top aplicado: {len(resultados_procesados)} ofertas (límite={self.search_results_limit}).")
-                
-                # Guardar en caché si hay resultados
-                if resultados_procesados:
-                    self.cache[cache_key] = (resultados_procesados, datetime.now())
-                else:
-                    self.cache[cache_key] = ([], datetime.now())
-                    
-                return resultados_procesados
-            elif response.status_code == 429:
-                self._set_rate_limit_cooldown(response)
-                self.cache[cache_key] = ([], datetime.now())
-                logger.error(f"❌ Error API Duffel Search (429): {response.text}")
-                return []
-            else:
-                logger.error(f"❌ Error API Duffel Search ({response.status_code}): {response.text}")
-                self.cache[cache_key] = ([], datetime.now())
-                return []
+            resultados_procesados = self._normalizar_seleccion(selector, origen, destino)
+            logger.info(f"✅ Duffel top aplicado: {len(resultados_procesados)} ofertas (límite={self.search_results_limit}).")
+            
+            self._guardar_cache(
+                cache_key,
+                resultados_procesados,
+                lambda res, ttl: cache_flight_search(origen, destino, fecha, adultos, ninos, bebes, clase, res, ttl=ttl)
+            )
+            # Toda respuesta real alimenta el índice de tarifa mínima por día (calendario)
+            indice_tarifas.registrar(origen, destino, fecha, adultos, ninos, bebes, clase, resultados_procesados)
                 
-        except Exception as e:
-            logger.error(f"❌ Excepción crítica en buscar_vuelos: {str(e)}")
+            return resultados_procesados
+        elif response.status_code == 429:
+            # El cooldown ya lo publicó la capa de transporte (_duffel_request / MotorBusquedaAsync._request)
+            self._guardar_negativo(cache_key)
+            logger.error(f"❌ Error API Duffel Search (429): {response.text}")
+            return []
+        else:
+            logger.error(f"❌ Error API Duffel Search ({response.status_code}): {response.text}")
+            self._guardar_negativo(cache_key)
             return []
 
-    def _clasificar_familia_tarifaria(self, offer):
-        """Clasifica una oferta en familia tarifaria: Basic, Comfort, Premium"""
-        condiciones = offer.get('conditions', {})
-        available_services = offer.get('available_services') or []
-        
-        # Detectar si incluye maleta
-        has_checked_bag = any(
+    @staticmethod
+    def _incluye_maleta(available_services):
+        return any(
             any(token in str(s.get('type', '')).lower() for token in ['baggage', 'bag', 'luggage'])
             for s in available_services
         )
+
+    def _clasificar_familia_tarifaria(self, offer, has_checked_bag=None):
+        """Clasifica una oferta en familia tarifaria: Basic, Comfort, Premium"""
+        condiciones = offer.get('conditions', {})
+        
+        # Detectar si incluye maleta (si no viene ya calculado)
+        if has_checked_bag is None:
+            has_checked_bag = self._incluye_maleta(offer.get('available_services') or [])
         
         # Analizar condiciones de cambio y reembolso
         change_before = condiciones.get('change_before_departure', {})
@@ -360,111 +800,136 @@ class MotorBusqueda:
         
         return grupos
 
-    def _procesar_ofertas(self, offers, origen_req, destino_req):
-        """Transforma la respuesta cruda de Duffel en un formato limpio para el frontend."""
-        resultados = []
-        
+    def _procesar_ofertas(self, offers, origen_req, destino_req, top_k=None):
+        """
+        Transforma la respuesta cruda de Duffel en un formato limpio para el frontend.
+        Pipeline en dos fases: selección barata por precio (heap) y normalización completa
+        solo de las supervivientes. top_k=None conserva el conjunto completo.
+        """
+        selector = SelectorTopK(top_k)
         for offer in offers:
-            try:
-                # Datos principales
-                offer_id = offer['id']
-                currency = offer['total_currency']
-                amount_base = Decimal(offer['total_amount'])
-                amount_final = self.apply_markup(amount_base)
-                
-                owner = offer.get('owner', {})
-                aerolinea_nombre = owner.get('name', 'Desconocida')
-                iata_carrier = owner.get('iata_code', 'XX')
-                
-                trayectos = []
+            selector.add(offer)
+        return self._normalizar_seleccion(selector, origen_req, destino_req)
+
+    def _normalizar_seleccion(self, selector, origen_req, destino_req):
+        """Fase 2: normaliza en orden de precio hasta completar K (las fallidas las cubre la reserva)."""
+        resultados = []
+        blobs = {}
+        for offer in selector.ordenadas():
+            if selector.k is not None and len(resultados) >= selector.k:
+                break
+            oferta = self._normalizar_oferta(offer, origen_req, destino_req, blobs=blobs)
+            if oferta is not None:
+                resultados.append(oferta)
+        offer_blobs.put_many({o.id: blobs[o.id] for o in resultados})
+        return resultados
+
+    @staticmethod
+    def _parse_iso(valor):
+        # Duffel ISO formats usually work with fromisoformat
+        return datetime.fromisoformat(valor.replace('Z', '+00:00'))
+
+    def _normalizar_oferta(self, offer, origen_req, destino_req, blobs=None):
+        """
+        Normaliza una oferta cruda a OfertaCompacta. Retorna None si la oferta es inválida.
+        Los blobs (available_services) se acumulan en `blobs`
+        o, si no se pasa, se guardan directamente en offer_blobs.
+        """
+        try:
+            # Datos principales
+            offer_id = offer['id']
+            currency = offer['total_currency']
+            amount_base = Decimal(offer['total_amount'])
+            amount_final = self.apply_markup(amount_base)
+            
+            owner = offer.get('owner', {})
+            aerolinea_nombre = owner.get('name', 'Desconocida')
+            iata_carrier = owner.get('iata_code', 'XX')
+            
+            trayectos = []
+            
+            # SOPORTE MULTI-SLICE (Multi-City / Nomad)
+            for slice_data in (offer.get('slices') or []):
+                slice_duration = self._parse_duration(slice_data['duration'])
                 
-                # SOPORTE MULTI-SLICE (Multi-City / Nomad)
-                for slice_data in (offer.get('slices') or []):
-                    slice_duration = self._parse_duration(slice_data['duration'])
-                    
-                    segmentos = []
-                    segments_raw = slice_data.get('segments') or []
-                    
-                    for i, seg in enumerate(segments_raw):
-                        tiempo_escala = None
-                        if i < len(segments_raw) - 1:
-                            # Duffel ISO formats usually work with fromisoformat
-                            llegada = datetime.fromisoformat(seg['arriving_at'].replace('Z', '+00:00'))
-                            siguiente_salida = datetime.fromisoformat(segments_raw[i+1]['departing_at'].replace('Z', '+00:00'))
-                            delta = siguiente_salida - llegada
-                            hours, remainder = divmod(delta.seconds, 3600)
-                            minutes = remainder // 60
-                            tiempo_escala = f"{hours}h {minutes}m"
-
-                        segmentos.append({
-                            'salida': seg['origin']['iata_code'],
-                            'llegada': seg['destination']['iata_code'],
-                            'ciudad_salida': seg['origin'].get('city_name', seg['origin']['name']),
-                            'ciudad_llegada': seg['destination'].get('city_name', seg['destination']['name']),
-                            'hora_salida': datetime.fromisoformat(seg['departing_at'].replace('Z', '+00:00')).strftime("%H:%M"),
-                            'hora_llegada': datetime.fromisoformat(seg['arriving_at'].replace('Z', '+00:00')).strftime("%H:%M"),
-                            'fecha_salida': datetime.fromisoformat(seg['departing_at'].replace('Z', '+00:00')).strftime("%d %b"),
-                            'fecha_llegada': datetime.fromisoformat(seg['arriving_at'].replace('Z', '+00:00')).strftime("%d %b"),
-                            'aerolinea': (seg.get('operating_carrier') or {}).get('name', aerolinea_nombre),
-                            'vuelo': seg.get('operating_carrier_flight_number', 'N/A'),
-                            'duracion': self._parse_duration(seg['duration']),
-                            'avion': (seg.get('aircraft') or {}).get('name', 'Avión'),
-                            'img_logo': f"https://pics.avs.io/64/64/{(seg.get('operating_carrier') or {}).get('iata_code', 'XX')}.png",
-                            'escala_duracion': tiempo_escala
-                        })
-                    
-                    trayectos.append({
-                        'origen': slice_data['origin']['iata_code'],
-                        'destino': slice_data['destination']['iata_code'],
-                        'duracion': slice_duration,
-                        'segmentos': segmentos
-                    })
-
-                # Condiciones (Cambios/Reembolsos)
-                condiciones = offer.get('conditions', {})
+                segments_raw = slice_data.get('segments') or []
+                # Cada timestamp se parsea una sola vez por segmento
+                horarios = [
+                    (self._parse_iso(seg['departing_at']), self._parse_iso(seg['arriving_at']))
+                    for seg in segments_raw
+                ]
                 
-                available_services = offer.get('available_services') or []
-                has_checked_bag = any(
-                    any(token in str(s.get('type', '')).lower() for token in ['baggage', 'bag', 'luggage'])
-                    for s in available_services
-                )
+                segmentos = []
+                for i, seg in enumerate(segments_raw):
+                    salida, llegada = horarios[i]
+                    tiempo_escala = None
+                    if i < len(segments_raw) - 1:
+                        delta = horarios[i + 1][0] - llegada
+                        hours, remainder = divmod(delta.seconds, 3600)
+                        minutes = remainder // 60
+                        tiempo_escala = f"{hours}h {minutes}m"
 
-                # Clasificar familia tarifaria
-                familia_tarifaria = self._clasificar_familia_tarifaria(offer)
-
-                # Para mantener compatibilidad con cards que esperan un solo trayecto
-                main_segmentos = trayectos[0]['segmentos'] if trayectos else []
-
-                resultados.append({
-                    'id': offer_id,
-                    'source': 'Duffel',
-                    'aerolinea': aerolinea_nombre,
-                    'img_logo': f"https://pics.avs.io/200/200/{iata_carrier}.png",
-                    'origen': trayectos[0]['origen'] if trayectos else origen_req,
-                    'destino': trayectos[-1]['destino'] if trayectos else destino_req,
-                    'trayectos': trayectos,
-                    # Fallback para UI simple:
-                    'hora_salida': main_segmentos[0]['hora_salida'] if main_segmentos else "N/A",
-                    'hora_llegada': main_segmentos[-1]['hora_llegada'] if main_segmentos else "N/A",
-                    'duracion': trayectos[0]['duracion'] if trayectos else "N/A",
-                    'precio_base': float(amount_base),
-                    'precio': float(amount_final), 
-                    'currency': currency,
-                    'escala': len(main_segmentos) - 1 if main_segmentos else 0,
-                    'segmentos': main_segmentos,
-                    'passengers': offer['passengers'],
-                    'condiciones': condiciones,
-                    'con_maleta': has_checked_bag,
-                    'available_services': available_services,
-                    'familia_tarifaria': familia_tarifaria
-                })
+                    operating = seg.get('operating_carrier') or {}
+                    segmentos.append(SegmentoCompacto(
+                        salida=seg['origin']['iata_code'],
+                        llegada=seg['destination']['iata_code'],
+                        ciudad_salida=seg['origin'].get('city_name', seg['origin']['name']),
+                        ciudad_llegada=seg['destination'].get('city_name', seg['destination']['name']),
+                        salida_dt=salida,
+                        llegada_dt=llegada,
+                        aerolinea=operating.get('name', aerolinea_nombre),
+                        carrier=operating.get('iata_code', 'XX'),
+                        vuelo=seg.get('operating_carrier_flight_number', 'N/A'),
+                        duracion=self._parse_duration(seg['duration']),
+                        avion=(seg.get('aircraft') or {}).get('name', 'Avión'),
+                        escala_duracion=tiempo_escala
+                    ))
                 
-            except Exception as e:
-                logger.warning(f"⚠️ Error procesando oferta {offer.get('id', 'unknown')}: {e}")
-                continue
-                
-        resultados.sort(key=lambda x: x['precio'])
-        return resultados
+                trayectos.append(TrayectoCompacto(
+                    origen=slice_data['origin']['iata_code'],
+                    destino=slice_data['destination']['iata_code'],
+                    duracion=slice_duration,
+                    segmentos=segmentos
+                ))
+
+            # Condiciones (Cambios/Reembolsos)
+            condiciones = offer.get('conditions', {})
+            
+            available_services = offer.get('available_services') or []
+            has_checked_bag = self._incluye_maleta(available_services)
+
+            # Clasificar familia tarifaria
+            familia_tarifaria = self._clasificar_familia_tarifaria(offer, has_checked_bag=has_checked_bag)
+
+            # Blob pesado fuera de la entrada de caché (se resuelve por id al serializar)
+            blob = {'available_services': available_services}
+            if blobs is None:
+                offer_blobs.put(offer_id, blob)
+            else:
+                blobs[offer_id] = blob
+
+            # Los campos derivados (horas, escala, segmentos del primer trayecto, logos) los calcula el modelo
+            return OfertaCompacta(
+                id=offer_id,
+                source='Duffel',
+                aerolinea=aerolinea_nombre,
+                carrier=iata_carrier,
+                origen=trayectos[0].origen if trayectos else origen_req,
+                destino=trayectos[-1].destino if trayectos else destino_req,
+                duracion=trayectos[0].duracion if trayectos else "N/A",
+                trayectos=trayectos,
+                precio_base=float(amount_base),
+                precio=float(amount_final),
+                currency=currency,
+                con_maleta=has_checked_bag,
+                familia_tarifaria=familia_tarifaria,
+                # Ids de pasajero (para reservar) y condiciones (las muestra la lista): siempre en línea
+                extra={'passengers': offer['passengers'], 'condiciones': condiciones}
+            )
+            
+        except Exception as e:
+            logger.warning(f"⚠️ Error procesando oferta {offer.get('id', 'unknown')}: {e}")
+            return None
 
     # ==========================================
     # 3. GESTIÓN DE ÓRDENES (CREATE, CANCEL)
@@ -498,7 +963,7 @@ class MotorBusqueda:
             logger.info(f"📤 Creando Order Duffel (Type: {type}, Services: {len(services) if services else 0})")
             
             url = f"{self.BASE_URL}/air/orders"
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=30)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_orders')
             
             if response.status_code == 201:
                 data = response.json()['data']
@@ -526,7 +991,7 @@ class MotorBusqueda:
         try:
             url = f"{self.BASE_URL}/air/orders/{order_id}/actions/cancel"
             # Cuerpo vacío o con metadata si fuera necesario
-            response = requests.post(url, headers=self._get_headers(), json={"data":{}}) 
+            response = self._duffel_request('post', url, json={"data":{}}, endpoint='duffel_orders') 
             
             if response.status_code == 200: # O 201? Docs dicen retorna Resource Order
                 return {'success': True, 'data': response.json()['data']}
@@ -544,7 +1009,7 @@ class MotorBusqueda:
         """Obtiene detalles + servicios disponibles (Maletas)"""
         try:
             url = f"{self.BASE_URL}/air/offers/{offer_id}?return_available_services=true"
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self._duffel_request('get', url, endpoint='duffel_offers')
             
             if response.status_code == 200:
                 return response.json()['data']
@@ -560,7 +1025,7 @@ class MotorBusqueda:
         try:
             url = f"{self.BASE_URL}/air/seat_maps"
             params = {'offer_id': offer_id}
-            response = requests.get(url, headers=self._get_headers(), params=params, timeout=10)
+            response = self._duffel_request('get', url, params=params, endpoint='duffel_offers')
             
             if response.status_code == 200:
                 return response.json()['data']
@@ -589,7 +1054,7 @@ class MotorBusqueda:
                     "currency": currency
                 }
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=15)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_payments')
             
             if response.status_code == 201:
                 return {'success': True, 'data': response.json()['data']}
@@ -609,7 +1074,7 @@ class MotorBusqueda:
                     }
                 }
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=20)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_payments')
             
             if response.status_code == 200:
                 return {'success': True, 'data': response.json()['data']}
@@ -622,7 +1087,7 @@ class MotorBusqueda:
         try:
             url = f"{self.BASE_URL}/identity/component_client_keys"
             payload = {"data": {}}
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=15)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_payments')
             
             if response.status_code == 201:
                 data = response.json().get('data', {})
@@ -685,7 +1150,7 @@ class MotorBusqueda:
         try:
             url = f"{self.BASE_URL}/air/passengers/{passenger_id}"
             payload = { "data": identity_data }
-            response = requests.patch(url, headers=self._get_headers(), json=payload, timeout=15)
+            response = self._duffel_request('patch', url, json=payload, endpoint='duffel_services')
             if response.status_code == 200:
                 return {'success': True}
             else:
@@ -696,7 +1161,7 @@ class MotorBusqueda:
         """Obtiene detalles de una orden existente."""
         try:
             url = f"{self.BASE_URL}/air/orders/{order_id}"
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self._duffel_request('get', url, endpoint='duffel_offers')
             if response.status_code == 200:
                 return response.json()['data']
             return None
@@ -708,7 +1173,7 @@ class MotorBusqueda:
         """Obtiene servicios disponibles (maletas) para una orden ya pagada."""
         try:
             url = f"{self.BASE_URL}/air/orders/{order_id}/available_services"
-            response = requests.get(url, headers=self._get_headers(), timeout=10)
+            response = self._duffel_request('get', url, endpoint='duffel_offers')
             if response.status_code == 200:
                 return response.json()['data']
             return []
@@ -733,7 +1198,7 @@ class MotorBusqueda:
                     }
                 }
             }
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=15)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_services')
             if response.status_code == 201:
                 return {'success': True, 'data': response.json()['data']}
             else:
@@ -748,7 +1213,7 @@ class MotorBusqueda:
         try:
             url = f"{self.BASE_URL}/air/seat_maps"
             params = {'order_id': order_id}
-            response = requests.get(url, headers=self._get_headers(), params=params, timeout=10)
+            response = self._duffel_request('get', url, params=params, endpoint='duffel_offers')
             if response.status_code == 200:
                 return response.json()['data']
             return []
@@ -763,6 +1228,20 @@ class MotorBusqueda:
         if not self.duffel_token:
             return []
 
+        tramos_key = "|".join(
+            f"{s.get('origin')}-{s.get('destination')}-{s.get('departure_date')}" for s in (slices or [])
+        )
+        cache_key = f"multi_{tramos_key}_{adultos}_{ninos}_{bebes}_{clase}"
+        cached_data = self._leer_cache(
+            cache_key,
+            lambda: get_cached_multi_city_search(slices, adultos, ninos, bebes, clase)
+        )
+        if cached_data is not None:
+            return cached_data
+
+        with self._stats_lock:
+            self.cache_misses += 1
+
         passengers = [{"type": "adult"} for _ in range(adultos)]
         passengers.extend([{"type": "child"} for _ in range(ninos)])
         passengers.extend([{"type": "infant_without_seat"} for _ in range(bebes)])
@@ -784,13 +1263,19 @@ class MotorBusqueda:
 
         try:
             url = f"{self.BASE_URL}/air/offer_requests?return_offers=true&supplier_timeout=20000"
-            response = requests.post(url, headers=self._get_headers(), json=payload, timeout=25)
+            response = self._duffel_request('post', url, json=payload, endpoint='duffel_search_multi')
             
             if response.status_code == 201:
                 data = response.json().get('data', {})
                 offers = data.get('offers', [])
-                # Procesamos indicando que es multi-city
-                return self._procesar_ofertas(offers, "MULTI", "CITY")
+                # Procesamos indicando que es multi-city (conjunto completo: el optimizador nómada compara todas)
+                resultados = self._procesar_ofertas(offers, "MULTI", "CITY", top_k=None)
+                self._guardar_cache(
+                    cache_key,
+                    resultados,
+                    lambda res, ttl: cache_multi_city_search(slices, adultos, ninos, bebes, clase, res, ttl=ttl)
+                )
+                return resultados
             else:
                 logger.error(f"❌ Error Multi-City Search: {response.text}")
                 return []
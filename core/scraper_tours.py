@@ -14,6 +14,7 @@ if __name__ == "__main__":
 from database import get_db_session, Tour
 from database import get_db_session, Tour
 from core.security import descifrar
+from core.tour_facets import facetas_tours
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -443,12 +444,21 @@ class ScraperToursB2B:
             
             db.commit()
             print(f"✅ Sincronización Completada: {nuevos} Nuevos | {actualizados} Actualizados | Total: {len(tours)}")
+            if nuevos or actualizados:
+                self._refrescar_facetas()
         except Exception as e:
             db.rollback()
             print(f"❌ Error en DB: {e}")
         finally:
             db.close()
 
+    def _refrescar_facetas(self):
+        # Síncrono: el scraper puede correr en un proceso aparte; la versión nueva llega a los workers por Redis
+        try:
+            facetas_tours.refrescar('scraper')
+        except Exception as e:
+            print(f"⚠️ No se pudieron recalcular las facetas de tours: {e}")
+
     def ejecutar_scraping_completo(self):
         print("\n🚀 --- INICIANDO PROCESO GLOBAL ---")
         todos = []
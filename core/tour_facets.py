@@ -0,0 +1,262 @@
+"""
+Conteos de filtros del catálogo de tours precalculados (facetas).
+
+`/api/tours/filtros-disponibles` lanzaba nueve agregados por petición y `/destinos` repetía
+casi todos. Ahora:
+- un único GROUP BY (continente, país, proveedor, tipo) sobre los tours activos, con
+  mínimos/máximos de precio y duración, se reduce en memoria a todas las facetas;
+- la instantánea se sirve desde memoria y se comparte entre workers por Redis
+  (clave con número de versión: cada worker solo recarga cuando la versión cambia);
+- cualquier commit que cree, borre o cambie un campo facetado de un Tour (scraper,
+  ediciones de admin, scripts) invalida la instantánea y se recalcula en segundo plano.
+  Los contadores de visitas/solicitudes no invalidan nada.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+# Columnas de Tour que afectan a las facetas
+CAMPOS_FACETADOS = ('activo', 'continente', 'pais', 'proveedor', 'tipo_viaje', 'precio_desde', 'duracion_dias')
+
+CLAVE_SNAPSHOT = "tours:facets:snapshot"
+CLAVE_VERSION = "tours:facets:version"
+
+
+def _lista(contador, limite=None):
+    return [{'nombre': nombre, 'count': count} for nombre, count in contador.most_common(limite)]
+
+
+class FacetasTours:
+    """Instantánea de facetas del catálogo en memoria, refrescada por eventos."""
+
+    def __init__(self, session_factory=None, redis_cache=None, ttl=None, comprobar_segundos=None, espera_segundos=None):
+        self._session_factory = session_factory
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        # Red de seguridad para cambios hechos fuera del ORM (SQL directo, otros servicios)
+        self.ttl = int(ttl or os.getenv('TOUR_FACETS_TTL_SECONDS', '3600'))
+        self.comprobar_segundos = float(comprobar_segundos if comprobar_segundos is not None else os.getenv('TOUR_FACETS_CHECK_SECONDS', '5'))
+        # Agrupa ráfagas de commits (p.ej. un scraping) en un solo recálculo
+        self.espera_segundos = float(espera_segundos if espera_segundos is not None else os.getenv('TOUR_FACETS_DEBOUNCE_SECONDS', '1'))
+
+        self._snapshot = None
+        self._version = None
+        self._calculado_en = 0.0
+        self._comprobado_en = 0.0
+        self._lock = threading.Lock()
+        self._refresco_lock = threading.Lock()
+        self._pendiente = False
+        self._hilo_activo = False
+
+        self.refrescos = 0
+        self.invalidaciones = 0
+        self.recargas_redis = 0
+
+    def _session(self):
+        if self._session_factory is not None:
+            return self._session_factory()
+        from database import get_db_session
+        return get_db_session()
+
+    def _redis(self):
+        if self.redis_cache and getattr(self.redis_cache, 'available', False):
+            return self.redis_cache
+        return None
+
+    # ==========================================
+    # CÁLCULO
+    # ==========================================
+    def calcular(self, db):
+        """Todas las facetas a partir de una sola consulta agregada."""
+        from sqlalchemy import func
+        from database import Tour
+
+        filas = db.query(
+            Tour.continente, Tour.pais, Tour.proveedor, Tour.tipo_viaje,
+            func.count(Tour.id),
+            func.min(Tour.precio_desde), func.max(Tour.precio_desde),
+            func.min(Tour.duracion_dias), func.max(Tour.duracion_dias),
+        ).filter(
+            Tour.activo == True
+        ).group_by(Tour.continente, Tour.pais, Tour.proveedor, Tour.tipo_viaje).all()
+
+        continentes, paises, proveedores, tipos = Counter(), Counter(), Counter(), Counter()
+        precios, duraciones = [], []
+        total = 0
+        for continente, pais, proveedor, tipo, count, p_min, p_max, d_min, d_max in filas:
+            total += count
+            for contador, valor in ((continentes, continente), (paises, pais), (proveedores, proveedor), (tipos, tipo)):
+                if valor is not None:
+                    contador[valor] += count
+            precios += [p for p in (p_min, p_max) if p is not None]
+            duraciones += [d for d in (d_min, d_max) if d is not None]
+
+        return {
+            'continentes': _lista(continentes),
+            'paises': _lista(paises),
+            'proveedores': _lista(proveedores),
+            'tipos': _lista(tipos),
+            'precio_max': int(max(precios, default=0) or 5000),
+            'precio_min': int(min(precios, default=0) or 0),
+            'duracion_max': int(max(duraciones, default=0) or 30),
+            'duracion_min': int(min(duraciones, default=0) or 1),
+            'total_tours': total,
+        }
+
+    def refrescar(self, motivo='manual'):
+        """Recalcula, guarda en memoria y publica en Redis con una versión nueva."""
+        with self._refresco_lock:
+            inicio = time.perf_counter()
+            db = self._session()
+            try:
+                snapshot = self.calcular(db)
+            finally:
+                db.close()
+
+            version = f"{time.time():.6f}"
+            cache = self._redis()
+            if cache is not None:
+                cache.set(CLAVE_SNAPSHOT, {'version': version, 'facetas': snapshot}, self.ttl)
+                cache.set(CLAVE_VERSION, version, self.ttl)
+
+            with self._lock:
+                self._snapshot = snapshot
+                self._version = version
+                self._calculado_en = self._comprobado_en = time.time()
+            self.refrescos += 1
+            logger.info(
+                f"📊 Facetas de tours recalculadas ({motivo}): {snapshot['total_tours']} tours "
+                f"en {(time.perf_counter() - inicio) * 1000:.0f} ms"
+            )
+            return snapshot
+
+    # ==========================================
+    # INVALIDACIÓN
+    # ==========================================
+    def invalidar(self, motivo='cambio'):
+        """Marca la instantánea como obsoleta y la recalcula en segundo plano (agrupando ráfagas)."""
+        self.invalidaciones += 1
+        with self._lock:
+            self._pendiente = True
+            if self._hilo_activo:
+                return
+            self._hilo_activo = True
+        threading.Thread(target=self._refrescar_pendientes, args=(motivo,), name="tour-facets", daemon=True).start()
+
+    def _refrescar_pendientes(self, motivo):
+        time.sleep(self.espera_segundos)
+        while True:
+            with self._lock:
+                if not self._pendiente:
+                    self._hilo_activo = False
+                    return
+                self._pendiente = False
+            try:
+                self.refrescar(motivo)
+            except Exception as e:
+                logger.error(f"❌ Error recalculando facetas de tours: {e}")
+
+    # ==========================================
+    # LECTURA
+    # ==========================================
+    def _sincronizar_redis(self, ahora):
+        """Si otro worker publicó una versión nueva, la carga (como mucho cada comprobar_segundos)."""
+        cache = self._redis()
+        if cache is None or ahora - self._comprobado_en < self.comprobar_segundos:
+            return
+        self._comprobado_en = ahora
+        version = cache.get(CLAVE_VERSION)
+        if version is None or version == self._version:
+            return
+        datos = cache.get(CLAVE_SNAPSHOT)
+        if datos and datos.get('version') == version:
+            with self._lock:
+                self._snapshot = datos['facetas']
+                self._version = version
+                self._calculado_en = ahora
+            self.recargas_redis += 1
+
+    def obtener(self):
+        ahora = time.time()
+        self._sincronizar_redis(ahora)
+        if self._snapshot is None or ahora - self._calculado_en > self.ttl:
+            return self.refrescar('caducada' if self._snapshot is not None else 'arranque')
+        return self._snapshot
+
+    def filtros_disponibles(self):
+        """Formato de /api/tours/filtros-disponibles."""
+        facetas = self.obtener()
+        return dict(facetas, paises=facetas['paises'][:20])
+
+    def filtros_destinos(self):
+        """Formato de la página /destinos."""
+        facetas = self.obtener()
+        return {
+            'continentes': facetas['continentes'],
+            'proveedores': facetas['proveedores'][:10],
+            'tipos': facetas['tipos'],
+            'precio_max': facetas['precio_max'],
+            'duracion_max': facetas['duracion_max'],
+            'total_tours': facetas['total_tours'],
+        }
+
+    def get_stats(self):
+        return {
+            'loaded': self._snapshot is not None,
+            'version': self._version,
+            'age_seconds': round(time.time() - self._calculado_en, 1) if self._snapshot is not None else None,
+            'refreshes': self.refrescos,
+            'invalidations': self.invalidaciones,
+            'reloads_from_redis': self.recargas_redis,
+        }
+
+
+facetas_tours = FacetasTours()
+
+
+# ==========================================
+# EVENTOS DEL ORM
+# ==========================================
+def _afecta_facetas(obj):
+    from sqlalchemy import inspect
+    estado = inspect(obj)
+    return any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_FACETADOS)
+
+
+def registrar_eventos(facetas=None):
+    """Invalida las facetas tras cada commit que toque campos facetados de algún Tour."""
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from database import Tour
+
+    facetas = facetas or facetas_tours
+    # Marca propia de cada instantánea: varias registradas no se roban la invalidación
+    clave = f'tours_facetas_cambiadas:{id(facetas)}'
+
+    @event.listens_for(Session, 'after_flush')
+    def _marcar(session, _contexto):
+        if session.info.get(clave):
+            return
+        if any(isinstance(o, Tour) for o in session.new) or any(isinstance(o, Tour) for o in session.deleted) \
+                or any(isinstance(o, Tour) and _afecta_facetas(o) for o in session.dirty):
+            session.info[clave] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar(session):
+        if session.info.pop(clave, False):
+            facetas.invalidar('commit')
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar(session):
+        session.info.pop(clave, None)
+
+    return _marcar, _invalidar, _descartar
@@ -0,0 +1,245 @@
+"""
+Paginación por cursor (keyset) y totales baratos para /api/tours/buscar.
+
+Con OFFSET la página N obliga a la base de datos a generar y descartar (N-1)*per_page filas,
+y cada página repetía además un COUNT(*) completo. Aquí:
+- cada orden (`precio-asc`, `popular`, `nuevo`, `relevancia`...) es una lista de claves con
+  `Tour.id` como desempate, así que "las filas después de la última vista" es un WHERE
+  que usa los índices y cuesta lo mismo en la página 1 que en la 500;
+- el cursor es opaco (base64 de los valores de la última fila) y va ligado al orden y
+  a los filtros con los que se generó;
+- el total puede ser exacto, exacto cacheado (por defecto), estimado por el planificador
+  de Postgres o no calcularse.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from core.lru_cache import CacheLRU
+
+try:
+    from cache.redis_cache import redis_cache as shared_redis_cache
+except ImportError:
+    shared_redis_cache = None
+
+logger = logging.getLogger(__name__)
+
+
+class CursorInvalido(ValueError):
+    """Cursor corrupto o generado con otro orden/filtros."""
+
+
+# Claves de cada orden: (atributo de Tour, descendente). Tour.id se añade siempre al final.
+ORDENES_TOURS = {
+    'precio-asc': [('precio_desde', False)],
+    'precio-desc': [('precio_desde', True)],
+    'duracion-asc': [('duracion_dias', False)],
+    'duracion-desc': [('duracion_dias', True)],
+    'popular': [('num_solicitudes', True), ('num_visitas', True)],
+    'nuevo': [('fecha_creacion', True)],
+    'relevancia': [('destacado', True), ('num_solicitudes', True), ('num_visitas', True)],
+}
+
+
+def claves_orden(modelo, sort, rank=None):
+    """Lista de (expresión, descendente) para el orden pedido; el ranking de texto va primero."""
+    from sqlalchemy import Float, cast
+
+    # ts_rank devuelve real (float4) y el cursor lo compara como float8: sin el cast, los empates
+    # del borde de página nunca son iguales, el desempate por id no actúa y se saltan/repiten filas
+    claves = [(cast(rank, Float(precision=53)), True)] if rank is not None else []
+    claves += [(getattr(modelo, campo), desc) for campo, desc in ORDENES_TOURS.get(sort, ORDENES_TOURS['relevancia'])]
+    claves.append((modelo.id, False))
+    return claves
+
+
+def aplicar_orden(query, claves):
+    # NULL siempre "mayor" (último en ASC, primero en DESC), como Postgres por defecto:
+    # así el orden y el WHERE del cursor coinciden en cualquier motor
+    return query.order_by(*[
+        expr.desc().nulls_first() if desc else expr.asc().nulls_last()
+        for expr, desc in claves
+    ])
+
+
+def _despues_de(expr, desc, valor):
+    """Condición "expr va después de valor" con NULL tratado como el mayor valor."""
+    from sqlalchemy import literal, or_
+
+    if desc:
+        # literal(): SQLAlchemy no permite < / > contra True/False directamente (destacado)
+        return expr.isnot(None) if valor is None else expr < literal(valor)
+    if valor is None:
+        return None
+    return or_(expr > literal(valor), expr.is_(None))
+
+
+def _igual(expr, valor):
+    from sqlalchemy import literal
+
+    return expr.is_(None) if valor is None else expr == literal(valor)
+
+
+def filtro_keyset(claves, valores):
+    """(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... respetando la dirección de cada clave."""
+    from sqlalchemy import and_, or_
+
+    alternativas = []
+    for i, (expr, desc) in enumerate(claves):
+        despues = _despues_de(expr, desc, valores[i])
+        if despues is None:
+            continue
+        previas = [_igual(e, v) for (e, _), v in zip(claves[:i], valores[:i])]
+        alternativas.append(and_(*previas, despues) if previas else despues)
+    return or_(*alternativas) if alternativas else None
+
+
+# ==========================================
+# CURSOR OPACO
+# ==========================================
+def huella_filtros(args, ignorar=('page', 'per_page', 'cursor', 'count')):
+    """Huella estable de los filtros de la petición (para ligar cursores y cachear totales)."""
+    items = args.items(multi=True) if hasattr(args, 'getlist') else args.items()
+    pares = sorted((k, v) for k, v in items if k not in ignorar and v != '')
+    return hashlib.sha1(json.dumps(pares).encode()).hexdigest()[:16]
+
+
+def _a_json(valor):
+    if isinstance(valor, datetime):
+        return {'dt': valor.isoformat()}
+    return valor
+
+
+def _de_json(valor):
+    if isinstance(valor, dict) and 'dt' in valor:
+        return datetime.fromisoformat(valor['dt'])
+    return valor
+
+
+def codificar_cursor(huella, valores):
+    datos = json.dumps({'h': huella, 'v': [_a_json(v) for v in valores]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, huella, num_claves):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores = [_de_json(v) for v in datos['v']]
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorInvalido(f"Cursor ilegible: {e}")
+    if datos.get('h') != huella or len(valores) != num_claves:
+        raise CursorInvalido("El cursor no corresponde a este orden o filtros")
+    return valores
+
+
+def pagina_keyset(query, claves, per_page, valores_cursor=None, offset=0):
+    """
+    Retorna (filas, valores_siguiente). Pide per_page+1 filas para saber si hay más
+    sin contar; valores_siguiente es None en la última página.
+    `offset` solo se usa para saltar directamente a una página sin cursor.
+    """
+    if valores_cursor is not None:
+        condicion = filtro_keyset(claves, valores_cursor)
+        if condicion is not None:
+            query = query.filter(condicion)
+
+    query = query.add_columns(*[expr.label(f'_k{i}') for i, (expr, _) in enumerate(claves)])
+    query = aplicar_orden(query, claves)
+    if offset:
+        query = query.offset(offset)
+    filas = query.limit(per_page + 1).all()
+
+    siguiente = None
+    if len(filas) > per_page:
+        filas = filas[:per_page]
+        siguiente = list(filas[-1][1:])
+    return [fila[0] for fila in filas], siguiente
+
+
+# ==========================================
+# TOTALES
+# ==========================================
+class ContadorTours:
+    """Total de resultados: exacto, exacto cacheado por filtros, estimado por el planificador o nada."""
+
+    MODOS = ('exact', 'cached', 'estimated', 'none')
+
+    def __init__(self, ttl=None, umbral_estimacion=None, redis_cache=None):
+        self.ttl = int(ttl or os.getenv('TOURS_COUNT_CACHE_SECONDS', '300'))
+        # Por debajo de este tamaño estimado el COUNT exacto ya es barato
+        self.umbral_estimacion = int(umbral_estimacion or os.getenv('TOURS_COUNT_ESTIMATE_THRESHOLD', '5000'))
+        self.redis_cache = redis_cache if redis_cache is not None else shared_redis_cache
+        self._l1 = CacheLRU(max_entries=1000, default_ttl=self.ttl)
+
+        self.exactos = 0
+        self.cacheados = 0
+        self.estimados = 0
+
+    def _cache_get(self, clave):
+        total = self._l1.get(clave)
+        if total is None and self.redis_cache is not None and getattr(self.redis_cache, 'available', False):
+            total = self.redis_cache.get(clave)
+            if total is not None:
+                self._l1.put(clave, total)
+        return total
+
+    def _cache_set(self, clave, total):
+        self._l1.put(clave, total)
+        if self.redis_cache is not None and getattr(self.redis_cache, 'available', False):
+            self.redis_cache.set(clave, total, self.ttl)
+
+    def _estimar(self, query):
+        """Filas estimadas por EXPLAIN en Postgres; None en otros motores o si falla."""
+        bind = query.session.get_bind()
+        if bind.dialect.name != 'postgresql':
+            return None
+        try:
+            compilado = query.statement.compile(bind)
+            plan = query.session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compilado}", compilado.params
+            ).scalar()
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo estimar el total de tours: {e}")
+            return None
+
+    def contar(self, query, modo, huella):
+        """Retorna (total, es_estimado). total es None con modo 'none'."""
+        if modo == 'none':
+            return None, False
+        if modo == 'exact':
+            self.exactos += 1
+            return query.order_by(None).count(), False
+
+        clave = f"tours:count:{huella}"
+        total = self._cache_get(clave)
+        if total is not None:
+            self.cacheados += 1
+            return total, False
+
+        if modo == 'estimated':
+            estimado = self._estimar(query.order_by(None))
+            if estimado is not None and estimado >= self.umbral_estimacion:
+                self.estimados += 1
+                return estimado, True
+
+        self.exactos += 1
+        total = query.order_by(None).count()
+        self._cache_set(clave, total)
+        return total, False
+
+    def get_stats(self):
+        return {
+            'exact_counts': self.exactos,
+            'cached_counts': self.cacheados,
+            'estimated_counts': self.estimados,
+            'ttl_seconds': self.ttl,
+        }
+
+
+contador_tours = ContadorTours()
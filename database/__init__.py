@@ -22,7 +22,9 @@ from .models import (
     Pedido,
     SolicitudTour,
     ReservaVuelo,
-    DuffelSearch
+    DuffelSearch,
+    TarifaMinimaDia,
+    TrabajoFondo
 )
 
 __all__ = [
@@ -43,7 +45,9 @@ __all__ = [
     'Pedido',
     'SolicitudTour',
     'ReservaVuelo',
-    'DuffelSearch'
+    'DuffelSearch',
+    'TarifaMinimaDia',
+    'TrabajoFondo'
 ]
 
 
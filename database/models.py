@@ -2,10 +2,11 @@
 Modelos de base de datos para el sistema de agencia de viajes
 """
 
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Date, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Date, ForeignKey, Index, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
-from datetime import datetime
+from sqlalchemy.orm import relationship, validates
+from datetime import datetime, timedelta
+import json
 from flask_login import UserMixin
 
 Base = declarative_base()
@@ -429,6 +430,66 @@ class ReservaVuelo(Base):
     fecha_confirmacion = Column(DateTime)
     fecha_orden_creada = Column(DateTime)  # ✅ NUEVO: Cuándo se creó la orden
     fecha_emision = Column(DateTime)  # Cuándo se emitieron los tickets
+    checkin_abre_en = Column(DateTime)  # Salida - 24h, calculada al confirmar (monitor auto-checkin)
+
+    __table_args__ = (
+        # Monitor auto-checkin: reservas en un estado cuya ventana ya se abrió
+        Index('idx_reserva_estado_checkin', 'estado', 'checkin_abre_en'),
+    )
+
+    def calcular_checkin_abre_en(self):
+        """Apertura del check-in (24h antes de la salida) a partir de datos_vuelo, o None"""
+        return self._apertura_checkin(self.datos_vuelo)
+
+    @staticmethod
+    def _apertura_checkin(datos_vuelo):
+        if not datos_vuelo:
+            return None
+
+        try:
+            datos = json.loads(datos_vuelo) if isinstance(datos_vuelo, str) else datos_vuelo
+            if not isinstance(datos, dict):
+                return None
+
+            fecha = (
+                datos.get('fecha_ida')
+                or datos.get('fecha_salida')
+                or datos.get('departure_date')
+            )
+            if not fecha:
+                return None
+
+            hora = datos.get('hora_salida') or datos.get('departure_time') or '00:00'
+
+            flight_dt = None
+            for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y'):
+                try:
+                    if fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+                        flight_dt = datetime.strptime(fecha, fmt)
+                    else:
+                        combined = f"{fecha} {hora}" if ' ' not in str(fecha).strip() else str(fecha)
+                        flight_dt = datetime.strptime(combined, fmt)
+                    break
+                except Exception:
+                    continue
+
+            if not flight_dt:
+                return None
+
+            return flight_dt - timedelta(hours=24)
+        except Exception:
+            return None
+
+    def actualizar_checkin_abre_en(self):
+        """Guarda la apertura del check-in en la columna indexada. Retorna el valor calculado"""
+        self.checkin_abre_en = self.calcular_checkin_abre_en()
+        return self.checkin_abre_en
+
+    @validates('datos_vuelo')
+    def _validar_datos_vuelo(self, _clave, valor):
+        # Cualquier asignación (alta, sync con Duffel, edición del admin) mantiene al día la columna indexada
+        self.checkin_abre_en = self._apertura_checkin(valor)
+        return valor
 
     def __repr__(self):
         return f"<ReservaVuelo {self.codigo_reserva} - {self.estado} ({self.provider})>"
@@ -452,3 +513,75 @@ class DuffelSearch(Base):
 
     def __repr__(self):
         return f"<DuffelSearch {self.origen}->{self.destino} {self.fecha}>"
+
+
+class TarifaMinimaDia(Base):
+    """Índice de tarifa mínima por día (ruta/fecha/pasajeros/clase) alimentado por cada búsqueda"""
+    __tablename__ = 'tarifas_minimas_dia'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    origen = Column(String(3), nullable=False)
+    destino = Column(String(3), nullable=False)
+    fecha = Column(Date, nullable=False)
+    adultos = Column(Integer, nullable=False, default=1)
+    ninos = Column(Integer, nullable=False, default=0)
+    bebes = Column(Integer, nullable=False, default=0)
+    clase = Column(String(30), nullable=False, default='economy')
+    precio = Column(Float, nullable=False)
+    currency = Column(String(3))
+    offer_id = Column(String(100))
+    observed_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('origen', 'destino', 'fecha', 'adultos', 'ninos', 'bebes', 'clase', name='uq_tarifa_minima_dia'),
+        # Consultas de calendario: una ruta/clase en un rango de fechas
+        Index('idx_tarifa_ruta_clase_fecha', 'origen', 'destino', 'clase', 'fecha'),
+    )
+
+    def __repr__(self):
+        return f"<TarifaMinimaDia {self.origen}->{self.destino} {self.fecha} {self.precio}>"
+
+
+class TrabajoFondo(Base):
+    """Cola durable de trabajos en segundo plano (emisión Amadeus, emails, scraping...)"""
+    __tablename__ = 'trabajos_fondo'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tipo = Column(String(50), nullable=False)
+    payload = Column(Text, nullable=False, default='{}')
+    # pendiente -> en_curso -> completado | fallido (reintentos vuelven a pendiente)
+    estado = Column(String(20), nullable=False, default='pendiente')
+    idempotency_key = Column(String(200), unique=True)
+    intentos = Column(Integer, nullable=False, default=0)
+    max_intentos = Column(Integer, nullable=False, default=5)
+    disponible_en = Column(DateTime, nullable=False, default=datetime.utcnow)
+    bloqueado_por = Column(String(100))
+    bloqueado_hasta = Column(DateTime)
+    ultimo_error = Column(Text)
+    fecha_creacion = Column(DateTime, nullable=False, default=datetime.utcnow)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        # Reclamación: pendientes (o leases caducados) por orden de disponibilidad
+        Index('idx_trabajo_estado_disponible', 'estado', 'disponible_en'),
+        Index('idx_trabajo_tipo_estado', 'tipo', 'estado'),
+    )
+
+    def to_dict(self, detalle=False):
+        """Sin argumentos ni errores (pueden llevar emails o localizadores) salvo con detalle=True."""
+        datos = {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'intentos': self.intentos,
+            'max_intentos': self.max_intentos,
+            'disponible_en': self.disponible_en.isoformat() if self.disponible_en else None,
+            'fecha_creacion': self.fecha_creacion.isoformat() if self.fecha_creacion else None,
+            'fecha_actualizacion': self.fecha_actualizacion.isoformat() if self.fecha_actualizacion else None,
+        }
+        if detalle:
+            datos['ultimo_error'] = self.ultimo_error
+        return datos
+
+    def __repr__(self):
+        return f"<TrabajoFondo {self.id} {self.tipo} {self.estado}>"
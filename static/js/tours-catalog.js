@@ -9,6 +9,11 @@ let catalogState = {
     perPage: 12,
     totalPages: 1,
     totalTours: 0,
+    totalIsEstimate: false,
+    // Paginación por cursor: cursors[n] = cursor que devuelve la página n (la 1 no lo necesita).
+    // Se vacía al cambiar filtros u orden (cursorKey).
+    cursors: {},
+    cursorKey: '',
     filters: {
         search: '',
         continente: '',
@@ -157,7 +162,6 @@ async function cargarTours() {
 
         // Construir query params
         const params = new URLSearchParams();
-        params.append('page', catalogState.currentPage);
         params.append('per_page', catalogState.perPage);
         params.append('sort', catalogState.sort);
 
@@ -169,6 +173,22 @@ async function cargarTours() {
             }
         });
 
+        // Filtros u orden distintos: los cursores guardados ya no sirven
+        const cursorKey = params.toString();
+        if (cursorKey !== catalogState.cursorKey) {
+            catalogState.cursors = {};
+            catalogState.cursorKey = cursorKey;
+        }
+
+        // Páginas ya alcanzadas van por cursor (mismo coste que la 1) y sin recontar el total;
+        // un salto a una página sin cursor (p.ej. "Última") usa page
+        params.append('page', catalogState.currentPage);
+        const cursor = catalogState.cursors[catalogState.currentPage];
+        if (cursor) {
+            params.append('cursor', cursor);
+            params.append('count', 'none');
+        }
+
         console.log(`📡 Cargando tours: /api/tours/buscar?${params.toString()}`);
 
         const response = await fetch(`/api/tours/buscar?${params.toString()}`);
@@ -178,10 +198,18 @@ async function cargarTours() {
             throw new Error(data.error);
         }
 
-        // Actualizar estado
-        catalogState.totalTours = data.total;
-        catalogState.totalPages = data.total_pages;
+        // Actualizar estado (con count=none el total no viene: se conserva el anterior)
+        if (data.total !== null && data.total !== undefined) {
+            catalogState.totalTours = data.total;
+            catalogState.totalPages = data.total_pages;
+            catalogState.totalIsEstimate = data.total_is_estimate;
+        }
         catalogState.currentPage = data.page;
+        if (data.next_cursor) {
+            catalogState.cursors[data.page + 1] = data.next_cursor;
+        } else {
+            catalogState.totalPages = data.page;
+        }
 
         // Renderizar tours
         renderizarTours(data.tours);
@@ -191,7 +219,7 @@ async function cargarTours() {
 
         // Actualizar contador de resultados
         document.getElementById('results-count').textContent =
-            `Mostrando ${data.tours.length} de ${data.total} tours`;
+            `Mostrando ${data.tours.length} de ${catalogState.totalIsEstimate ? '~' : ''}${catalogState.totalTours} tours`;
 
         // ❌ DESACTIVADO: Evitar scroll automático al cargar la página
         // document.getElementById('tours-container').scrollIntoView({
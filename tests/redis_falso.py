@@ -0,0 +1,65 @@
+"""
+Cliente Redis falso en memoria compartido por los tests
+"""
+
+import time
+
+
+class RedisFalso:
+    """Subconjunto en memoria de redis-py: locks del scheduler (SET NX PX/EX, eval get+pexpire/del), hashes, sets y pipeline"""
+
+    def __init__(self):
+        self.datos = {}
+        self.hashes = {}
+        self.caducidades = {}
+
+    def get(self, key):
+        valor, caduca = self.datos.get(key, (None, 0))
+        return valor if caduca > time.time() else None
+
+    def set(self, key, valor, nx=False, px=None, ex=None):
+        if nx and self.get(key) is not None:
+            return None
+        self.datos[key] = (valor, time.time() + (px / 1000 if px else ex or 3600))
+        return True
+
+    def eval(self, script, _n, key, token, *args):
+        if self.get(key) != token:
+            return 0
+        if 'pexpire' in script:
+            self.datos[key] = (token, time.time() + int(args[0]) / 1000)
+        else:
+            self.datos.pop(key)
+        return 1
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self.datos.pop(key, None) is not None)
+
+    def setex(self, key, ttl, valor):
+        return self.set(key, valor, ex=ttl)
+
+    def hset(self, nombre, campo, valor):
+        self.hashes.setdefault(nombre, {})[campo] = valor
+
+    def hgetall(self, nombre):
+        return dict(self.hashes.get(nombre, {}))
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def sadd(self, nombre, *valores):
+        self.hashes.setdefault(nombre, set()).update(valores)
+
+    def smembers(self, nombre):
+        return set(self.hashes.get(nombre, ()))
+
+    def scard(self, nombre):
+        return len(self.hashes.get(nombre, ()))
+
+    def expire(self, nombre, segundos):
+        self.caducidades[nombre] = time.time() + segundos
+
+    def pipeline(self, transaction=True):
+        # Los comandos se aplican al momento; execute() no tiene nada pendiente
+        self.execute = lambda: []
+        return self
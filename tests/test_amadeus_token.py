@@ -0,0 +1,108 @@
+"""
+Tests unitarios para el token de core/amadeus_adapter.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import time
+import threading
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.amadeus_adapter import TokenAmadeus
+from tests.redis_falso import RedisFalso
+
+
+class TestTokenAmadeus(unittest.TestCase):
+    """Tests para el token OAuth de Amadeus compartido (proceso + Redis)"""
+
+    def setUp(self):
+        self.respuestas = iter(range(1, 100))
+
+        def post(url, data=None, endpoint=None):
+            time.sleep(0.05)
+            respuesta = Mock()
+            respuesta.json.return_value = {'access_token': f"tok{next(self.respuestas)}", 'expires_in': 1799}
+            return respuesta
+
+        patcher = patch('core.amadeus_adapter.http_transport')
+        self.transport = patcher.start()
+        self.transport.post.side_effect = post
+        self.addCleanup(patcher.stop)
+
+    def _token(self, client=None):
+        cache = Mock(available=client is not None, redis_client=client)
+        cache.acquire_lock.side_effect = lambda key, ttl: 'l' if client.set(key, 'l', nx=True, ex=ttl) else None
+        cache.release_lock.side_effect = lambda key, token: client.eval('del', 1, key, token)
+        return TokenAmadeus('https://amadeus/token', 'key', 'secret', redis_cache=cache, margen_segundos=300)
+
+    def test_single_flight_y_compartido_entre_workers(self):
+        client = RedisFalso()
+        worker_a, worker_b = self._token(client), self._token(client)
+
+        tokens = []
+        hilos = [threading.Thread(target=lambda: tokens.append(worker_a.obtener())) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(set(tokens), {'tok1'})
+
+        self.assertEqual(worker_b.obtener(), 'tok1')  # otro worker lo toma de Redis
+        self.assertEqual(self.transport.post.call_count, 1)
+        self.assertEqual(worker_b.get_stats()['from_redis'], 1)
+
+    def test_renovacion_anticipada_sin_bloquear(self):
+        token = self._token()
+        self.assertEqual(token.obtener(), 'tok1')
+
+        token._expira = time.time() + 100  # dentro del margen de renovación
+        self.assertEqual(token.obtener(), 'tok1')  # se sigue sirviendo el vigente
+        for _ in range(50):
+            if token.get_stats()['proactive_refreshes']:
+                break
+            time.sleep(0.02)
+        self.assertEqual(token.obtener(), 'tok2')
+        self.assertEqual(self.transport.post.call_count, 2)
+
+    def test_invalidar_descarta_copia_local_y_redis(self):
+        client = RedisFalso()
+        worker_a, worker_b = self._token(client), self._token(client)
+        self.assertEqual(worker_a.obtener(), 'tok1')
+        self.assertEqual(worker_b.obtener(), 'tok1')
+
+        worker_a.invalidar(rechazado='tok1')
+        self.assertEqual(client.datos, {})
+        self.assertEqual(worker_a.obtener(), 'tok2')
+
+        # worker_b aún tenía tok1: al invalidarlo no borra el tok2 ya publicado, lo adopta
+        worker_b.invalidar(rechazado='tok1')
+        self.assertEqual(worker_b.obtener(), 'tok2')
+        self.assertEqual(self.transport.post.call_count, 2)
+
+    def test_adaptador_reintenta_una_vez_tras_401(self):
+        from core.amadeus_adapter import AmadeusAdapter
+
+        with patch.dict('os.environ', {'AMADEUS_API_KEY': 'key', 'AMADEUS_API_SECRET': 'secret'}):
+            adaptador = AmadeusAdapter()
+        adaptador._token = self._token()
+        self.transport.get.side_effect = [
+            Mock(status_code=401), Mock(status_code=200, json=Mock(return_value={'data': []}))
+        ]
+
+        self.assertEqual(adaptador._get_referencia('https://amadeus/airlines'), {'data': []})
+        cabeceras = [llamada.kwargs['headers']['Authorization'] for llamada in self.transport.get.call_args_list]
+        self.assertEqual(cabeceras, ['Bearer tok1', 'Bearer tok2'])
+
+        # Un segundo 401 ya no se reintenta
+        self.transport.get.side_effect = [Mock(status_code=401), Mock(status_code=401)]
+        with self.assertRaises(RuntimeError):
+            adaptador._get_referencia('https://amadeus/airlines')
+        self.assertEqual(self.transport.get.call_count, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
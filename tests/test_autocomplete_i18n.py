@@ -0,0 +1,91 @@
+"""
+Tests unitarios para core/autocomplete_i18n.py
+"""
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.autocomplete_i18n import IndiceAeropuertos, buscar_fallback_es, distancia_edicion, indice_aeropuertos
+
+
+class TestIndiceAeropuertos(unittest.TestCase):
+    """Tests para el índice local de autocompletado (trie de prefijos + popularidad)"""
+
+    def setUp(self):
+        self.indice = IndiceAeropuertos([
+            {'label': 'Paris Orly (ORY)', 'value': 'ORY', 'popularity': 80, 'keywords': ['paris', 'francia']},
+            {'label': 'Paris Charles de Gaulle (CDG)', 'value': 'CDG', 'popularity': 90, 'keywords': ['paris', 'francia']},
+            {'label': 'Madrid (MAD)', 'value': 'MAD', 'popularity': 100, 'keywords': ['madrid', 'espana']},
+            {'label': 'Madeira Funchal (FNC)', 'value': 'FNC', 'popularity': 60, 'keywords': ['madeira', 'portugal']},
+        ])
+
+    def test_prefijo_ordenado_por_popularidad(self):
+        self.assertEqual([s['value'] for s in self.indice.buscar('PARÍS')], ['CDG', 'ORY'])
+        self.assertEqual([s['value'] for s in self.indice.buscar('Fran')], ['CDG', 'ORY'])
+        self.assertEqual(self.indice.buscar('mad')[0], {'label': 'Madrid (MAD)', 'value': 'MAD'})
+        self.assertEqual(self.indice.buscar('m'), [])
+
+    def test_codigo_exacto_y_varias_palabras(self):
+        self.assertEqual([s['value'] for s in self.indice.buscar('fnc')], ['FNC'])
+        self.assertEqual([s['value'] for s in self.indice.buscar('gaulle paris')], ['CDG'])
+        self.assertEqual(self.indice.buscar('tokio'), [])
+        self.assertEqual(self.indice.get_stats()['no_match'], 1)
+
+    def test_erratas_hasta_distancia_dos(self):
+        self.assertEqual(distancia_edicion('londers', 'londres', 2), 1)  # transposición
+        self.assertEqual(distancia_edicion('kitten', 'sitting', 2), 3)   # corta por encima del máximo
+        self.assertEqual([s['value'] for s in self.indice.corregir('mdrid')], ['MAD'])
+        self.assertEqual([s['value'] for s in self.indice.corregir('prais')], ['CDG', 'ORY'])
+        self.assertEqual([s['value'] for s in self.indice.corregir('paris charls de gaule')], ['CDG'])
+        self.assertEqual(self.indice.corregir('mdr'), [])  # términos cortos: como mucho 1 edición
+        self.assertEqual(self.indice.get_stats()['corrected'], 3)
+
+    def test_buscar_no_corrige_erratas(self):
+        self.assertEqual(self.indice.buscar('mdrid'), [])
+        self.assertEqual(self.indice.get_stats()['corrected'], 0)
+
+
+class TestAutocompletadoErratas(unittest.TestCase):
+    """Aeropuertos reales fuera del dataset: Duffel se consulta antes que el corrector de erratas"""
+
+    FUERA_DEL_DATASET = ('split', 'bari', 'zadar', 'cork', 'perth', 'graz', 'leon')
+
+    def test_dataset_no_los_conoce_por_prefijo(self):
+        for termino in self.FUERA_DEL_DATASET:
+            self.assertEqual(indice_aeropuertos.buscar(termino), [], termino)
+            # El fallback local tampoco los "corrige" a otra ciudad
+            self.assertEqual(buscar_fallback_es(termino), [], termino)
+
+    def test_endpoint_consulta_duffel_antes_de_corregir(self):
+        import app as app_module
+
+        app_module.app.config['TESTING'] = True
+        app_module.limiter.enabled = False
+        client = app_module.app.test_client()
+        remoto = {t: [{'label': f'{t.title()} (XXX)', 'value': t[:3].upper()}] for t in self.FUERA_DEL_DATASET}
+
+        with patch.object(app_module.autocompletado_remoto, 'sugerir', side_effect=lambda t: remoto[t]) as sugerir:
+            for termino in self.FUERA_DEL_DATASET:
+                respuesta = client.get(f'/api/autocomplete?term={termino}').get_json()
+                self.assertEqual(respuesta, remoto[termino], termino)
+        self.assertEqual(sugerir.call_count, len(self.FUERA_DEL_DATASET))
+
+    def test_endpoint_corrige_solo_si_duffel_no_encuentra_nada(self):
+        import app as app_module
+
+        app_module.app.config['TESTING'] = True
+        app_module.limiter.enabled = False
+        client = app_module.app.test_client()
+
+        with patch.object(app_module.autocompletado_remoto, 'sugerir', return_value=[]):
+            respuesta = client.get('/api/autocomplete?term=mdrid').get_json()
+        self.assertEqual(respuesta[0]['value'], 'MAD')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests unitarios para core/autocomplete_pipeline.py
+"""
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.autocomplete_pipeline import PipelineAutocompletado
+
+
+class TestPipelineAutocompletado(unittest.TestCase):
+    """Tests para el autocompletado remoto (carrera de expansiones + caché por prefijo)"""
+
+    def setUp(self):
+        self.redis = {}
+        patchers = [
+            patch('core.autocomplete_pipeline.cache_airport_suggestions',
+                  side_effect=lambda q, valor, ttl: self.redis.__setitem__(q, valor)),
+            patch('core.autocomplete_pipeline.get_cached_airport_suggestions_many',
+                  side_effect=lambda qs: {q: self.redis[q] for q in qs if q in self.redis}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.llamadas = []
+
+    def _buscar(self, respuestas, esperas=None):
+        def buscar(term):
+            self.llamadas.append(term)
+            time.sleep((esperas or {}).get(term, 0))
+            return respuestas.get(term, [])
+        return buscar
+
+    def test_gana_la_primera_expansion_no_vacia(self):
+        ny = [{'label': 'New York (NYC)', 'value': 'NYC'}]
+        pipeline = PipelineAutocompletado(self._buscar({'new york': ny, 'nueva york': ny}, {'nueva york': 0.5}))
+
+        inicio = time.time()
+        self.assertEqual(pipeline.sugerir('Nueva York'), ny)
+        self.assertLess(time.time() - inicio, 0.4)
+        self.assertEqual(sorted(self.llamadas), ['new york', 'nueva york'])
+        self.assertEqual(self.redis['nueva york']['termino'], 'new york')
+
+    def test_filtra_el_superconjunto_del_prefijo_y_comparte_cache(self):
+        sugerencias = [
+            {'label': 'Malaga (AGP)', 'value': 'AGP'},
+            {'label': 'Malta (MLA)', 'value': 'MLA'},
+            {'label': 'Male (MLE)', 'value': 'MLE'},
+        ]
+        pipeline = PipelineAutocompletado(self._buscar({'mal': sugerencias}))
+        self.assertEqual(pipeline.sugerir('mal'), sugerencias)
+
+        self.assertEqual(pipeline.sugerir('malt'), [{'label': 'Malta (MLA)', 'value': 'MLA'}])
+        self.assertEqual(pipeline.sugerir('maltx'), [])  # superconjunto completo: vacío sin ir a Duffel
+        self.assertEqual(self.llamadas, ['mal'])
+
+        otro_worker = PipelineAutocompletado(self._buscar({}))
+        self.assertEqual(otro_worker.sugerir('mala'), [{'label': 'Malaga (AGP)', 'value': 'AGP'}])
+        self.assertEqual(otro_worker.get_stats()['prefix_hits'], 1)
+        self.assertEqual(self.llamadas, ['mal'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+Tests unitarios para la construcción del calendario de precios en app.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+import asyncio
+import threading
+import time
+from datetime import date
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+
+
+class TestConstruccionCalendario(unittest.TestCase):
+    """Tests para el fan-out del calendario con deadline y construcción en segundo plano"""
+
+    def setUp(self):
+        self._construir_real = app_module._build_calendar_prices_async
+        self.year = date.today().year + 1
+        self.dias = app_module._calendar_month_days(self.year, 3)
+        self.cache_key = app_module._calendar_query_key('MAD', 'BCN', self.year, 3, 1, 0, 0, 'economy')
+        self.soltar = threading.Event()
+        self.llamadas = []
+
+        async def _construir_falso(origen, destino, days, adultos, ninos, bebes, clase, prices,
+                                   prioridad_nombre=None):
+            # El primer día llega enseguida; el resto espera a que el test suelte la construcción
+            self.llamadas.append(list(days))
+            prices[days[0]] = 50
+            while not self.soltar.is_set():
+                await asyncio.sleep(0.01)
+            for dia in days[1:]:
+                prices[dia] = 60
+            return False
+
+        parches = [
+            patch.object(app_module, '_build_calendar_prices_async', _construir_falso),
+            patch.object(app_module, 'shared_redis_cache', None),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.addCleanup(self.soltar.set)
+        self.addCleanup(app_module.CALENDAR_PRICE_CACHE.pop, self.cache_key, None)
+
+    def _construir(self, deadline=None):
+        return app_module._build_calendar_prices(
+            'MAD', 'BCN', self.year, 3, 1, 0, 0, 'economy', deadline=deadline
+        )
+
+    def _esperar_cache(self, timeout=2):
+        limite = time.monotonic() + timeout
+        while time.monotonic() < limite:
+            precios, stale = app_module._get_calendar_prices_from_cache(self.cache_key)
+            if precios is not None:
+                return precios, stale
+            time.sleep(0.01)
+        return None, False
+
+    def test_deadline_devuelve_parcial_y_el_mes_se_completa_y_cachea(self):
+        precios, parcial = self._construir(deadline=0.2)
+
+        self.assertTrue(parcial)
+        self.assertEqual(precios, {self.dias[0]: 50})
+        self.assertIsNone(app_module._get_calendar_prices_from_cache(self.cache_key)[0])
+
+        # Nadie espera ya la construcción: al terminar, el mes completo queda en la caché
+        self.soltar.set()
+        cacheados, stale = self._esperar_cache()
+        self.assertEqual(len(cacheados), len(self.dias))
+        self.assertEqual(cacheados[self.dias[-1]], 60)
+        self.assertFalse(stale)
+        self.assertNotIn(self.cache_key, app_module.CALENDAR_BUILDS_IN_FLIGHT)
+
+    def test_cooldown_en_redis_lento_no_bloquea_el_loop(self):
+        def cooldown_lento():
+            time.sleep(0.3)  # PTTL en un Redis con latencia
+            return False
+
+        async def buscar_falso(origen, destino, fecha, **kwargs):
+            return []
+
+        motor = Mock(is_rate_limited=Mock(side_effect=cooldown_lento))
+        dias = self.dias[:4]
+        with patch.object(app_module, 'motor', motor), \
+                patch.object(app_module, 'CALENDAR_BUILD_CONCURRENCY', 4), \
+                patch.object(app_module.motor_async, 'buscar_vuelos', side_effect=buscar_falso):
+            inicio = time.monotonic()
+            rate_limited = app_module.motor_async.ejecutar(
+                self._construir_real('MAD', 'BCN', dias, 1, 0, 0, 'economy', {}), timeout=5
+            )
+
+        self.assertFalse(rate_limited)
+        self.assertEqual(motor.is_rate_limited.call_count, 4)
+        self.assertLess(time.monotonic() - inicio, 0.9)  # en serie sobre el loop serían 1.2 s
+
+    def test_peticiones_concurrentes_reutilizan_la_construccion_en_curso(self):
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(self._construir())) for _ in range(3)]
+        for hilo in hilos:
+            hilo.start()
+        limite = time.monotonic() + 2
+        while not self.llamadas and time.monotonic() < limite:
+            time.sleep(0.01)
+        time.sleep(0.1)
+
+        build = app_module.CALENDAR_BUILDS_IN_FLIGHT.get(self.cache_key)
+        self.assertIs(app_module._start_calendar_build(self.cache_key, 'MAD', 'BCN', self.year, 3,
+                                                       1, 0, 0, 'economy'), build)
+        self.soltar.set()
+        for hilo in hilos:
+            hilo.join(timeout=2)
+
+        self.assertEqual(len(self.llamadas), 1)
+        self.assertEqual(len(resultados), 3)
+        for precios, parcial in resultados:
+            self.assertFalse(parcial)
+            self.assertEqual(len(precios), len(self.dias))
+
+
+if __name__ == '__main__':
+    unittest.main()
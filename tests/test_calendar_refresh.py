@@ -0,0 +1,72 @@
+"""
+Tests unitarios para core/calendar_refresh.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+from datetime import datetime
+import sys
+import os
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.calendar_refresh import PlanificadorCalendario
+
+
+class TestPlanificadorCalendario(unittest.TestCase):
+    """Tests para el refresco incremental del calendario con presupuesto por minuto"""
+
+    def setUp(self):
+        from datetime import date
+        self.hoy = date(2026, 3, 1)
+        self.indice = Mock()
+        # MAD-BCN tiene el día 1 recién observado y el 2 muy antiguo; MAD-LIS no tiene nada
+        self.indice.consultar.side_effect = lambda o, d, *a: {
+            '2026-03-01': {'age_seconds': 60}, '2026-03-02': {'age_seconds': 400000}
+        } if d == 'BCN' else {}
+        self.rutas = {('MAD', 'BCN', 1, 0, 0, 'economy'): 50, ('MAD', 'LIS', 1, 0, 0, 'economy'): 0}
+        self.motor_async = Mock()
+        self.motor_async.motor.is_rate_limited.return_value = False
+        self.planificador = PlanificadorCalendario(
+            self.motor_async, self.indice, lambda: self.rutas, llamadas_por_minuto=3,
+            horizonte_dias=5, max_age_seconds=86400, redis_cache=Mock(available=False)
+        )
+
+    def test_prioriza_demanda_antiguedad_y_cercania(self):
+        celdas = self.planificador.seleccionar(50, hoy=self.hoy)
+        claves = [(ruta[1], dia) for ruta, dia, _score in celdas]
+
+        self.assertNotIn(('BCN', '2026-03-01'), claves)  # tarifa reciente: no gasta presupuesto
+        self.assertEqual(claves[0], ('BCN', '2026-03-02'))
+        self.assertLess(claves.index(('LIS', '2026-03-01')), claves.index(('LIS', '2026-03-05')))
+        self.assertEqual(len(celdas), 9)
+
+    def test_tick_respeta_presupuesto_y_recuerda_intentos(self):
+        self.motor_async.ejecutar.side_effect = lambda coro, timeout=None: (coro.close(), [[{'precio': 1}], [], []])[1]
+
+        with patch('core.calendar_refresh.date') as fecha:
+            fecha.today.return_value = self.hoy
+            self.assertEqual(self.planificador.tick(), 3)
+            siguientes = self.planificador.seleccionar(50, hoy=self.hoy)
+
+        self.assertEqual(len(siguientes), 6)  # las 3 intentadas no se repiten dentro de la ventana
+        progreso = self.planificador.get_status(detalle_rutas=False)['progress']
+        self.assertEqual((progreso['calls'], progreso['warmed']), (3, 1))
+
+        self.motor_async.motor.is_rate_limited.return_value = True
+        self.assertEqual(self.planificador.tick(), 0)
+
+    def test_estado_reutiliza_la_cobertura_unos_segundos(self):
+        primero = self.planificador.get_status()
+        consultas = self.indice.consultar.call_count
+        segundo = self.planificador.get_status()
+
+        self.assertEqual(self.indice.consultar.call_count, consultas)  # sin una consulta por ruta
+        self.assertEqual(segundo['routes'], primero['routes'])
+        self.planificador.get_status(detalle_rutas=False)
+        self.assertEqual(self.indice.consultar.call_count, consultas * 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
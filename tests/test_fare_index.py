@@ -0,0 +1,92 @@
+"""
+Tests unitarios para core/fare_index.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+from datetime import date
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.fare_index import IndiceTarifas
+
+
+class TestIndiceTarifas(unittest.TestCase):
+    """Tests para el índice persistente de tarifa mínima por día (SQLite en memoria)"""
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from database.models import TarifaMinimaDia
+
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        TarifaMinimaDia.__table__.create(engine)
+        self.indice = IndiceTarifas(session_factory=sessionmaker(bind=engine))
+        self.indice._arrancar_hilo = Mock()  # volcado manual con flush()
+
+    def test_registra_minimo_y_ultima_observacion_gana(self):
+        self.indice.registrar('mad', 'bcn', '2026-03-01', 1, 0, 0, 'economy',
+                              [{'id': 'off_1', 'precio': 120.0, 'currency': 'EUR'},
+                               {'id': 'off_2', 'precio': 95.5, 'currency': 'EUR'}])
+        self.assertEqual(self.indice.flush(), 1)
+        self.indice.registrar('MAD', 'BCN', '2026-03-01', 1, 0, 0, 'economy', [{'id': 'off_3', 'precio': 101.0}])
+
+        # Las observaciones pendientes de volcar también se ven al consultar
+        tarifas = self.indice.consultar('MAD', 'BCN', '2026-02-28', '2026-03-02')
+        self.assertEqual(list(tarifas), ['2026-03-01'])
+        self.assertEqual(tarifas['2026-03-01']['precio'], 101.0)
+
+        self.indice.flush()
+        tarifas = self.indice.consultar('MAD', 'BCN', '2026-03-01', '2026-03-01')
+        self.assertEqual(tarifas['2026-03-01']['precio'], 101.0)
+        self.assertIn('age_seconds', tarifas['2026-03-01'])
+        self.assertEqual(self.indice.consultar('MAD', 'BCN', '2026-03-01', '2026-03-01', adultos=2), {})
+
+    def test_fallo_de_bd_reencola_y_pausa(self):
+        self.indice._session_factory = Mock(side_effect=Exception('sin conexión'))
+        self.indice.registrar('MAD', 'BCN', '2026-03-01', 1, 0, 0, 'economy', [{'id': 'off_1', 'precio': 80.0}])
+
+        self.assertEqual(self.indice.flush(), 0)
+        self.assertEqual(self.indice.get_stats()['pending'], 1)
+        self.assertGreater(self.indice.get_stats()['paused_seconds'], 0)
+        self.assertEqual(self.indice.consultar('MAD', 'BCN', '2026-03-01', '2026-03-01')['2026-03-01']['precio'], 80.0)
+
+
+class TestCalendarioDesdeIndice(unittest.TestCase):
+    """Tests para /api/precios-calendario sobre el índice de tarifas"""
+
+    def test_mes_solo_busca_los_dias_que_faltan(self):
+        import app as app_module
+
+        app_module.app.config['TESTING'] = True
+        app_module.limiter.enabled = False
+        client = app_module.app.test_client()
+        year = date.today().year + 1
+        indexados = {
+            f'{year}-03-{dia:02d}': {'precio': 100.0 + dia, 'observed_at': f'{year}-02-20T10:00:00', 'age_seconds': 60}
+            for dia in range(1, 32) if dia != 15
+        }
+
+        with patch.object(app_module, 'motor', Mock()), \
+                patch.object(app_module, 'DUFFEL_TOKEN', 'token'), \
+                patch.object(app_module, '_register_calendar_route'), \
+                patch.object(app_module.indice_tarifas, 'consultar', return_value=indexados), \
+                patch.object(app_module, '_get_calendar_prices_from_cache', return_value=(None, False)), \
+                patch.object(app_module, '_build_calendar_prices', return_value=({f'{year}-03-15': 90}, False)) as construir:
+            datos = client.get(f'/api/precios-calendario?origen=MAD&destino=BCN&year={year}&month=3').get_json()
+
+        # Solo el día sin observación reciente va a Duffel; el mes cacheado incluye los del índice
+        kwargs = construir.call_args.kwargs
+        self.assertEqual(kwargs['days'], [f'{year}-03-15'])
+        self.assertEqual(len(kwargs['base']), 30)
+        self.assertEqual(len(datos['prices']), 31)
+        self.assertEqual(datos['prices'][f'{year}-03-15'], 90)
+        self.assertEqual(datos['prices'][f'{year}-03-01'], 101)
+
+
+if __name__ == '__main__':
+    unittest.main()
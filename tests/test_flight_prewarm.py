@@ -0,0 +1,119 @@
+"""
+Tests unitarios para el precalentamiento de búsquedas de vuelos en app.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+import sys
+import os
+from datetime import datetime, timedelta
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import app as app_module
+from core.scraper_motor import MotorBusqueda
+from core.duffel_async import MotorBusquedaAsync, _RespuestaAsync
+from core.rate_budget import RateBudget, prioridad_actual, PRIORIDAD_SEGUNDO_PLANO
+
+
+class TestPrediccionPrewarm(unittest.TestCase):
+    """Tests para las consultas previstas a partir del historial de DuffelSearch (SQLite en memoria)"""
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from database.models import DuffelSearch
+
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        DuffelSearch.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.ahora = datetime.utcnow()
+        futura = (self.ahora + timedelta(days=30)).date()
+        self.fecha = futura.isoformat()
+
+        db = self.Session()
+        buscadas = [
+            ('MAD', 'BCN', self.fecha, self.ahora - timedelta(hours=1)),
+            ('MAD', 'BCN', self.fecha, self.ahora - timedelta(hours=2)),
+            ('mad', 'bcn', futura.strftime('%d/%m/%Y'), self.ahora - timedelta(days=3)),
+            ('LON', 'PAR', self.fecha, self.ahora - timedelta(days=2)),
+            # Fecha de vuelo ya pasada y búsqueda fuera de la ventana de historial: se descartan
+            ('ROM', 'MIL', (self.ahora - timedelta(days=1)).date().isoformat(), self.ahora - timedelta(hours=3)),
+            ('BER', 'VIE', self.fecha, self.ahora - timedelta(days=app_module.FLIGHT_PREWARM_HISTORY_DAYS + 1)),
+        ]
+        for origen, destino, fecha, creada in buscadas:
+            db.add(DuffelSearch(origen=origen, destino=destino, fecha=fecha, adultos=1, ninos=0, bebes=0,
+                                clase='economy', results_count=10, fecha_creacion=creada))
+        db.commit()
+        db.close()
+
+    def test_consultas_salen_del_historial_ordenadas_por_puntuacion(self):
+        with patch('database.get_db_session', self.Session):
+            consultas = app_module._predict_prewarm_flight_queries(5, now=self.ahora)
+            top = app_module._predict_prewarm_flight_queries(1, now=self.ahora)
+
+        # Las dos grafías de la fecha cuentan como la misma consulta (misma clave de caché)
+        self.assertEqual([(c['origen'], c['destino']) for c in consultas], [('MAD', 'BCN'), ('LON', 'PAR')])
+        self.assertEqual(consultas[0], {
+            'origen': 'MAD', 'destino': 'BCN', 'fecha': self.fecha,
+            'adultos': 1, 'ninos': 0, 'bebes': 0, 'clase': 'economy'
+        })
+        self.assertEqual(top, consultas[:1])
+
+
+class TestPrewarmBusquedas(unittest.TestCase):
+    """Tests para prewarm_flight_searches sobre el presupuesto compartido de Duffel"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123', 'TEST_BUDGET_WAIT_BACKGROUND': '0'}):
+            self.motor = MotorBusqueda()
+            # 4 tokens y reserva del 50%: el segundo plano solo puede gastar 2 antes de tocar la reserva
+            self.motor.budget = RateBudget('test', capacity=4, refill_per_second=0.001, background_reserve=0.5,
+                                           redis_cache=Mock(available=False))
+        self.motor.redis_cache = None
+        self.cliente = MotorBusquedaAsync(self.motor, concurrency=1)
+        self.prioridades = []
+
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            self.prioridades.append(prioridad_actual())
+            return _RespuestaAsync(201, {}, '', {'data': {'offers': []}})
+
+        self.consultas = [{'origen': 'MAD', 'destino': d, 'fecha': '2099-03-01'} for d in ('BCN', 'LIS', 'ROM', 'PAR')]
+        parches = [
+            patch.object(app_module, 'motor', self.motor),
+            patch.object(app_module, 'motor_async', self.cliente),
+            patch.object(app_module, 'DUFFEL_TOKEN', 'test_token_123'),
+            patch.object(app_module, '_predict_prewarm_flight_queries', return_value=self.consultas),
+            patch.object(self.cliente, '_enviar', side_effect=fake_enviar),
+            patch.dict(app_module.FLIGHT_PREWARM_STATS, {'runs': 0, 'queries': 0, 'skipped_rate_limit': 0}),
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_consultas_previstas_en_segundo_plano_hasta_agotar_su_cupo(self):
+        app_module.prewarm_flight_searches()
+
+        app_module._predict_prewarm_flight_queries.assert_called_once_with(app_module.FLIGHT_PREWARM_TOP_QUERIES)
+        # Solo llegan a Duffel las que caben en el cupo de segundo plano; la reserva interactiva queda intacta
+        self.assertEqual(self.prioridades, [PRIORIDAD_SEGUNDO_PLANO] * 2)
+        stats = self.motor.budget.get_stats()['priorities'][PRIORIDAD_SEGUNDO_PLANO]
+        self.assertEqual((stats['granted'], stats['denied']), (2, 2))
+        self.assertTrue(self.motor.budget.acquire('interactive', timeout=0))
+        self.assertEqual(app_module.FLIGHT_PREWARM_STATS['queries'], 4)
+
+    def test_cooldown_no_lanza_ninguna_consulta(self):
+        self.motor.budget.set_cooldown(30)
+
+        app_module.prewarm_flight_searches()
+
+        app_module._predict_prewarm_flight_queries.assert_not_called()
+        self.assertEqual(self.prioridades, [])
+        self.assertEqual(app_module.FLIGHT_PREWARM_STATS['skipped_rate_limit'], 1)
+        self.assertEqual(app_module.FLIGHT_PREWARM_STATS['runs'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
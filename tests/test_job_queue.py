@@ -0,0 +1,121 @@
+"""
+Tests unitarios para core/job_queue.py
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+from datetime import datetime, timedelta
+import sys
+import os
+import threading
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.job_queue import ColaTrabajos
+
+
+class TestColaTrabajos(unittest.TestCase):
+    """Tests para la cola durable de trabajos (SQLite en memoria, procesado síncrono)"""
+
+    def setUp(self):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from database.models import TrabajoFondo
+
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        TrabajoFondo.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.cola = ColaTrabajos(session_factory=self.Session, workers=0)
+        self.emails = []
+
+    def _vencer(self, job_id, **campos):
+        from database.models import TrabajoFondo
+        db = self.Session()
+        trabajo = db.get(TrabajoFondo, job_id)
+        trabajo.disponible_en = datetime.utcnow() - timedelta(seconds=1)
+        for campo, valor in campos.items():
+            setattr(trabajo, campo, valor)
+        db.commit()
+        db.close()
+
+    def test_idempotencia_y_reintento_con_backoff(self):
+        fallos = [RuntimeError('SMTP 421')]
+
+        def enviar(to_email, subject):
+            if fallos:
+                raise fallos.pop()
+            self.emails.append((to_email, subject))
+
+        self.cola.registrar('email', enviar, max_intentos=3, backoff_segundos=60)
+        job_id = self.cola.encolar('email', {'to_email': 'a@b.com', 'subject': 'Hola'}, idempotency_key='pedido:1')
+        self.assertEqual(self.cola.encolar('email', {'to_email': 'a@b.com', 'subject': 'Hola'}, idempotency_key='pedido:1'), job_id)
+
+        self.assertEqual(self.cola.procesar_pendientes(), 1)
+        estado = self.cola.estado(job_id, detalle=True)
+        self.assertEqual((estado['estado'], estado['intentos'], estado['ultimo_error']), ('pendiente', 1, 'SMTP 421'))
+        self.assertNotIn('ultimo_error', self.cola.estado(job_id))
+        self.assertEqual(self.cola.procesar_pendientes(), 0)  # backoff: aún no disponible
+
+        self._vencer(job_id)
+        self.assertEqual(self.cola.procesar_pendientes(), 1)
+        self.assertEqual(self.cola.estado(job_id)['estado'], 'completado')
+        self.assertEqual(self.emails, [('a@b.com', 'Hola')])
+
+    def test_concurrencia_por_tipo_y_lease_caducado(self):
+        self.cola.registrar('scrape_tours', lambda: self.emails.append('scrape'), concurrencia=1, max_intentos=2)
+        primero = self.cola.encolar('scrape_tours')
+        segundo = self.cola.encolar('scrape_tours')
+
+        # Otro worker tiene el primero en curso con lease vigente: el segundo espera
+        self._vencer(primero, estado='en_curso', intentos=1, bloqueado_hasta=datetime.utcnow() + timedelta(minutes=5))
+        self.assertEqual(self.cola.procesar_pendientes(), 0)
+
+        # El worker se recicló: al caducar el lease se reclama y completa
+        self._vencer(primero, bloqueado_hasta=datetime.utcnow() - timedelta(seconds=1))
+        self.assertEqual(self.cola.procesar_pendientes(), 2)
+        self.assertEqual([self.cola.estado(j)['estado'] for j in (primero, segundo)], ['completado', 'completado'])
+        self.assertEqual(self.cola.get_stats()['types']['scrape_tours']['by_status'], {'completado': 2})
+
+    def test_sin_base_de_datos_ejecuta_en_hilo_local(self):
+        hecho = threading.Event()
+        cola = ColaTrabajos(session_factory=Mock(side_effect=RuntimeError('BD caída')), workers=0)
+        cola.registrar('email', lambda **kw: hecho.set())
+
+        self.assertIsNone(cola.encolar('email', {'to_email': 'x@y.com'}))
+        self.assertTrue(hecho.wait(2))
+        self.assertEqual(cola.get_stats()['ran_without_queue'], 1)
+
+    def test_cola_deshabilitada_no_deja_trabajos_pendientes(self):
+        from database.models import TrabajoFondo
+
+        hecho = threading.Event()
+        cola = ColaTrabajos(session_factory=self.Session, workers=0, habilitada=False)
+        cola.registrar('emitir_amadeus', lambda **kw: hecho.set())
+
+        self.assertIsNone(cola.encolar('emitir_amadeus', {'reserva_id': 1}, idempotency_key='amadeus:1'))
+        self.assertTrue(hecho.wait(2))
+        db = self.Session()
+        self.assertEqual(db.query(TrabajoFondo).count(), 0)
+        db.close()
+
+
+class TestEndpointsDeEstado(unittest.TestCase):
+    """Los endpoints de estado/métricas exponen datos internos: solo ADMIN"""
+
+    def test_requieren_login(self):
+        import app as app_module
+
+        app_module.app.config['TESTING'] = True
+        app_module.limiter.enabled = False
+        client = app_module.app.test_client()
+
+        with patch.object(app_module.cola_trabajos, 'estado') as estado:
+            for ruta in ('/jobs/1', '/jobs-stats', '/http-stats', '/scheduler-status', '/calendar-refresh-status'):
+                self.assertIn(client.get(ruta).status_code, (302, 401), ruta)
+        estado.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+"""
+Tests unitarios para core/mail_pipeline.py
+"""
+
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.mail_pipeline import BuzonSalida
+
+
+class TestBuzonSalida(unittest.TestCase):
+    """Tests para el envío SMTP por lotes sobre una conexión persistente"""
+
+    def setUp(self):
+        self.buzon = BuzonSalida('smtp.test', 587, 'user', 'pass', remitente='agencia@test.com',
+                                 espera_lote_ms=50, inactividad_segundos=5)
+
+    @patch('core.mail_pipeline.smtplib.SMTP')
+    def test_reutiliza_conexion_y_login(self, smtp_cls):
+        for i in range(3):
+            self.assertTrue(self.buzon.enviar(f'cliente{i}@test.com', 'Reserva', '<p>ok</p>'))
+        self.assertTrue(self.buzon.enviar('ultimo@test.com', 'Reserva', '<p>ok</p>', esperar=True))
+
+        smtp_cls.assert_called_once_with('smtp.test', 587, timeout=30.0)
+        smtp_cls.return_value.login.assert_called_once_with('user', 'pass')
+        self.assertEqual(smtp_cls.return_value.sendmail.call_count, 4)
+        self.assertEqual(self.buzon.get_stats()['sent'], 4)
+
+    @patch('core.mail_pipeline.smtplib.SMTP')
+    def test_reconecta_si_el_servidor_corta(self, smtp_cls):
+        import smtplib
+        smtp_cls.return_value.sendmail.side_effect = [smtplib.SMTPServerDisconnected('timeout'), {}]
+
+        self.assertTrue(self.buzon.enviar('a@test.com', 'Billetes', '<p>ok</p>', esperar=True))
+        self.assertEqual(smtp_cls.call_count, 2)
+
+        smtp_cls.return_value.sendmail.side_effect = smtplib.SMTPRecipientsRefused({'x@test.com': (550, b'no')})
+        self.assertFalse(self.buzon.enviar('x@test.com', 'Billetes', '<p>ok</p>', esperar=True))
+        self.assertEqual(smtp_cls.call_count, 2)  # un destinatario inválido no tira la conexión
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests unitarios para core/reference_cache.py
+"""
+
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.reference_cache import CacheReferencia
+from tests.redis_falso import RedisFalso
+
+
+class TestCacheReferencia(unittest.TestCase):
+    """Tests para la caché de datos de referencia Amadeus (aerolíneas por lotes, TTL negativo, Redis)"""
+
+    def setUp(self):
+        self.lotes = []
+
+        def cargar_aerolineas(codigos):
+            self.lotes.append(list(codigos))
+            return {c: {'iataCode': c} for c in codigos if c != 'ZZ'}
+
+        self.cargar = cargar_aerolineas
+
+    def _cache(self, client=None, max_indice=None):
+        cache = CacheReferencia(ttl_negativo=60, max_indice=max_indice,
+                                redis_cache=Mock(available=client is not None, redis_client=client))
+        cache.registrar('airlines', self.cargar, ttl=86400, tam_lote=50, refrescable=True)
+        return cache
+
+    def test_solo_pide_los_codigos_ausentes_en_una_llamada(self):
+        cache = self._cache()
+        cache.obtener_muchos('airlines', ['IB', 'BA'])
+        resultado = cache.obtener_muchos('airlines', ['IB', 'BA', 'UX', 'ZZ', 'UX'])
+
+        self.assertEqual(self.lotes, [['IB', 'BA'], ['UX', 'ZZ']])
+        self.assertEqual(resultado['UX'], {'iataCode': 'UX'})
+        self.assertIsNone(resultado['ZZ'])  # desconocido: se recuerda con TTL corto
+        self.assertEqual(cache.obtener('airlines', 'ZZ'), None)
+        self.assertEqual(len(self.lotes), 2)
+
+    def test_compartido_entre_workers_y_refresco(self):
+        client = RedisFalso()
+        worker_a, worker_b = self._cache(client), self._cache(client)
+
+        worker_a.obtener_muchos('airlines', ['IB', 'ZZ'])
+        self.assertEqual(worker_b.obtener('airlines', 'IB'), {'iataCode': 'IB'})
+        self.assertEqual(worker_b.get_stats()['hits_redis'], 1)
+        self.assertEqual(len(self.lotes), 1)
+        self.assertLessEqual(client.datos['amadeus:ref:airlines:ZZ'][1], time.time() + 60)
+        self.assertGreater(client.datos['amadeus:ref:airlines:IB'][1], time.time() + 3600)
+
+        # El refresco en bloque conoce las claves cargadas por cualquier worker (las vacías no)
+        self.assertEqual(worker_b.refrescar(), {'airlines': 1})
+        self.assertEqual(self.lotes[-1], ['IB'])
+        self.assertLessEqual(client.caducidades['amadeus:ref:index:airlines'], time.time() + 86400)
+
+    def test_indice_de_refresco_acotado(self):
+        client = RedisFalso()
+        cache = self._cache(client, max_indice=3)
+        ubicaciones = []
+        cache.registrar('locations', lambda claves: ubicaciones.extend(claves) or {c: {'data': [c]} for c in claves},
+                        ttl=86400)
+
+        # Texto libre del usuario: se cachea pero nunca entra en el refresco en bloque
+        cache.obtener_muchos('locations', ['MADRI|CITY', 'BARCE|CITY'])
+        cache.obtener_muchos('airlines', ['IB', 'BA', 'UX', 'VY', 'FR'])
+
+        self.assertEqual(client.smembers('amadeus:ref:index:locations'), set())
+        self.assertEqual(client.scard('amadeus:ref:index:airlines'), 3)
+        self.assertEqual(cache.refrescar(), {'airlines': 3})
+        self.assertEqual(len(ubicaciones), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
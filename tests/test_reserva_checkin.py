@@ -0,0 +1,79 @@
+"""
+Tests unitarios para el check-in de Reserva (database/models.py)
+"""
+
+import unittest
+from unittest.mock import Mock, patch
+from datetime import datetime
+import sys
+import os
+import json
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class TestReservaCheckinAbreEn(unittest.TestCase):
+    """Tests para la apertura de check-in precalculada en ReservaVuelo"""
+
+    def test_calcula_24h_antes_de_la_salida(self):
+        from database.models import ReservaVuelo
+
+        casos = [
+            ({'fecha_ida': '2026-05-10', 'hora_salida': '08:30'}, datetime(2026, 5, 9, 8, 30)),
+            ({'fecha_salida': '10/05/2026'}, datetime(2026, 5, 9, 0, 0)),
+            ({'departure_date': 'mañana'}, None),
+            ({}, None),
+        ]
+        for datos, esperado in casos:
+            reserva = ReservaVuelo(datos_vuelo=json.dumps(datos))
+            self.assertEqual(reserva.actualizar_checkin_abre_en(), esperado)
+            self.assertEqual(reserva.checkin_abre_en, esperado)
+
+    def test_asignar_datos_vuelo_recalcula(self):
+        from database.models import ReservaVuelo
+
+        reserva = ReservaVuelo(datos_vuelo=json.dumps({'fecha_ida': '2026-05-10', 'hora_salida': '08:30'}))
+        self.assertEqual(reserva.checkin_abre_en, datetime(2026, 5, 9, 8, 30))
+        reserva.datos_vuelo = json.dumps({'fecha_salida': '2026-06-01'})
+        self.assertEqual(reserva.checkin_abre_en, datetime(2026, 5, 31, 0, 0))
+        reserva.datos_vuelo = None
+        self.assertIsNone(reserva.checkin_abre_en)
+
+    def test_admin_guardar_datos_actualiza_checkin(self):
+        """Un cambio de horario hecho por el admin mueve la apertura del check-in"""
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from database.models import ReservaVuelo
+        import app as app_module
+
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        ReservaVuelo.__table__.create(engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        db.add(ReservaVuelo(codigo_reserva='ADM001', estado='CONFIRMADO', precio_vuelos=100.0, precio_total=100.0,
+                            email_cliente='cliente@example.com',
+                            datos_vuelo=json.dumps({'fecha_ida': '2026-05-10', 'hora_salida': '08:30'})))
+        db.commit()
+        db.close()
+
+        app_module.app.config.update(TESTING=True, LOGIN_DISABLED=True)
+        self.addCleanup(app_module.app.config.update, LOGIN_DISABLED=False)
+        app_module.limiter.enabled = False
+        with patch.object(app_module, 'get_db_session', Session), \
+                patch.object(app_module, 'current_user', Mock(username='admin')):
+            respuesta = app_module.app.test_client().post(
+                '/admin/reserva/ADM001/guardar-datos',
+                json={'datos_vuelo': {'fecha_ida': '2026-05-12', 'hora_salida': '19:45'}}
+            )
+        self.assertEqual(respuesta.status_code, 200)
+
+        db = Session()
+        reserva = db.query(ReservaVuelo).filter_by(codigo_reserva='ADM001').one()
+        self.assertEqual(reserva.checkin_abre_en, datetime(2026, 5, 11, 19, 45))
+        db.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+Tests unitarios para core/scheduler_leader.py
+"""
+
+import unittest
+from unittest.mock import Mock
+from datetime import datetime, timedelta
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.scheduler_leader import CoordinadorScheduler
+from tests.redis_falso import RedisFalso
+
+
+class TestCoordinadorScheduler(unittest.TestCase):
+    """Tests para la ejecución única de jobs entre workers (liderazgo + lock por job)"""
+
+    def _coordinador(self, client):
+        cache = Mock(available=True, redis_client=client)
+        cache.acquire_lock.side_effect = lambda key, ttl: 'tok' if client.set(key, 'tok', nx=True, ex=ttl) else None
+        cache.release_lock.side_effect = lambda key, token: client.eval('del', 1, key, token)
+        return CoordinadorScheduler(lease_seconds=30, redis_cache=cache)
+
+    def test_solo_el_lider_ejecuta_y_hereda_al_caducar(self):
+        client = RedisFalso()
+        lider, seguidor = self._coordinador(client), self._coordinador(client)
+        job = Mock(return_value='ok')
+
+        self.assertEqual(lider.ejecutar('checkin', job), 'ok')
+        self.assertIsNone(seguidor.ejecutar('checkin', job))
+        self.assertEqual(job.call_count, 1)
+        self.assertEqual(seguidor.get_stats()['jobs']['checkin']['skipped_follower'], 1)
+        self.assertEqual(seguidor.get_stats()['leader'], lider.identidad)
+
+        # El líder desaparece sin renunciar: el seguidor toma el relevo al caducar el lease
+        client.datos['scheduler:leader'] = (client.get('scheduler:leader'), time.time() - 1)
+        self.assertEqual(seguidor.ejecutar('checkin', job), 'ok')
+        self.assertFalse(lider.es_lider())
+
+    def test_no_solapa_ejecuciones_y_mide_duracion_y_lag(self):
+        coordinador = self._coordinador(RedisFalso())
+        ejecuciones = []
+
+        def job_lento():
+            # Una segunda ejecución mientras la primera sigue en curso se omite
+            ejecuciones.append(coordinador.ejecutar('calendario', Mock()))
+            time.sleep(0.01)
+            raise RuntimeError('Duffel caído')
+
+        coordinador.on_job_submitted(Mock(job_id='calendario', scheduled_run_times=[datetime.now() - timedelta(seconds=2)]))
+        self.assertIsNone(coordinador.ejecutar('calendario', job_lento))
+
+        metricas = coordinador.get_stats()['jobs']['calendario']
+        self.assertEqual(ejecuciones, [None])
+        self.assertEqual((metricas['runs'], metricas['errors'], metricas['skipped_overlap']), (1, 1, 1))
+        self.assertGreaterEqual(metricas['last_duration_seconds'], 0.01)
+        self.assertGreaterEqual(metricas['last_lag_seconds'], 2)
+        self.assertIn('calendario', coordinador.get_stats()['cluster_jobs'])
+
+        self.assertEqual(coordinador.ejecutar('calendario', lambda: 1), 1)  # el lock se liberó
+
+
+if __name__ == '__main__':
+    unittest.main()
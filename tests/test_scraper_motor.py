@@ -8,11 +8,18 @@ from decimal import Decimal
 from datetime import datetime, timedelta
 import sys
 import os
+import json
+import time
+import threading
 
 # Añadir el directorio raíz al path para imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from core.scraper_motor import MotorBusqueda
+from core.scraper_motor import MotorBusqueda, CacheLRU, SingleFlight
+from core.http_transport import HTTPTransport
+from core.duffel_async import MotorBusquedaAsync, _RespuestaAsync
+from core.rate_budget import RateBudget, PresupuestoAgotado, PRIORIDAD_INTERACTIVA, PRIORIDAD_SEGUNDO_PLANO
+from core.offer_model import OfertaCompacta, OfferBlobStore, offer_blobs
 
 
 class TestMotorBusqueda(unittest.TestCase):
@@ -55,7 +62,7 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(headers['Content-Type'], 'application/json')
         self.assertEqual(headers['Duffel-Version'], 'v2')
     
-    @patch('core.scraper_motor.requests.get')
+    @patch('core.scraper_motor.http_transport.get')
     def test_autocompletar_aeropuerto_success(self, mock_get):
         """Test de autocompletado exitoso"""
         mock_response = Mock()
@@ -83,7 +90,7 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(resultado[0]['value'], 'MAD')
         self.assertIn('Madrid', resultado[0]['label'])
     
-    @patch('core.scraper_motor.requests.get')
+    @patch('core.scraper_motor.http_transport.get')
     def test_autocompletar_aeropuerto_sin_resultados(self, mock_get):
         """Test de autocompletado sin resultados"""
         mock_response = Mock()
@@ -94,7 +101,7 @@ class TestMotorBusqueda(unittest.TestCase):
         resultado = self.motor.autocompletar_aeropuerto('zzzz')
         self.assertEqual(len(resultado), 0)
     
-    @patch('core.scraper_motor.requests.get')
+    @patch('core.scraper_motor.http_transport.get')
     def test_autocompletar_aeropuerto_error_api(self, mock_get):
         """Test de manejo de errores en autocompletado"""
         mock_get.side_effect = Exception("API Error")
@@ -102,7 +109,7 @@ class TestMotorBusqueda(unittest.TestCase):
         resultado = self.motor.autocompletar_aeropuerto('madrid')
         self.assertEqual(len(resultado), 0)
     
-    @patch('core.scraper_motor.requests.post')
+    @patch('core.scraper_motor.http_transport.post')
     def test_buscar_vuelos_success(self, mock_post):
         """Test de búsqueda de vuelos exitosa"""
         mock_response = Mock()
@@ -145,7 +152,7 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(resultado[0]['id'], 'off_test123')
         self.assertEqual(resultado[0]['source'], 'Duffel')
     
-    @patch('core.scraper_motor.requests.post')
+    @patch('core.scraper_motor.http_transport.post')
     def test_crear_order_duffel_success(self, mock_post):
         """Test de creación de orden exitosa"""
         mock_response = Mock()
@@ -176,7 +183,7 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(resultado['order_id'], 'ord_test456')
         self.assertEqual(resultado['booking_reference'], 'ABC123')
     
-    @patch('core.scraper_motor.requests.post')
+    @patch('core.scraper_motor.http_transport.post')
     def test_crear_payment_intent_success(self, mock_post):
         """Test de creación de payment intent"""
         mock_response = Mock()
@@ -200,7 +207,7 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(self.motor._parse_duration('PT2H'), '2h 0m')
         self.assertEqual(self.motor._parse_duration('PT45M'), '0h 45m')
     
-    @patch('core.scraper_motor.requests.post')
+    @patch('core.scraper_motor.http_transport.post')
     def test_cancelar_orden_success(self, mock_post):
         """Test de cancelación de orden"""
         mock_response = Mock()
@@ -228,6 +235,569 @@ class TestMotorBusqueda(unittest.TestCase):
         self.assertEqual(self.motor.cache[cache_key]['data'], test_data)
 
 
+class TestCacheLRU(unittest.TestCase):
+    """Tests para el motor de caché LRU + TTL"""
+
+    def test_lru_evicta_la_menos_usada(self):
+        cache = CacheLRU(max_entries=2, default_ttl=60)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')  # 'a' pasa a ser la más reciente
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl_por_entrada(self):
+        cache = CacheLRU(max_entries=10, default_ttl=60)
+        with patch('core.scraper_motor.time.monotonic', return_value=1000.0):
+            cache.put('corta', 'x', ttl=5)
+            cache.put('larga', 'y')
+        with patch('core.scraper_motor.time.monotonic', return_value=1010.0):
+            self.assertIsNone(cache.get('corta'))
+            self.assertEqual(cache.get('larga'), 'y')
+        self.assertEqual(cache.expirations, 1)
+
+    def test_limite_por_bytes(self):
+        cache = CacheLRU(max_entries=0, max_bytes=25, default_ttl=60, sizeof=lambda v: 10)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.put('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.total_bytes, 20)
+        self.assertNotIn('a', cache)
+
+    def test_sin_limite_por_bytes_no_estima_tamano(self):
+        sizeof = Mock(return_value=10)
+        cache = CacheLRU(max_entries=10, default_ttl=60, sizeof=sizeof)
+        cache.put('a', [{'precio': 1}] * 100)
+
+        sizeof.assert_not_called()
+        self.assertEqual(cache.total_bytes, 0)
+
+        # El tamaño indicado por quien guarda se usa sin estimar
+        limitada = CacheLRU(max_entries=0, max_bytes=25, default_ttl=60, sizeof=sizeof)
+        limitada.put('a', 1, size=20)
+        limitada.put('b', 2, size=20)
+        sizeof.assert_not_called()
+        self.assertEqual(list(limitada.keys()), ['b'])
+
+    @patch('core.scraper_motor.http_transport.post')
+    def test_buscar_vuelos_usa_cache(self, mock_post):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            motor = MotorBusqueda()
+        motor.cache.put('MAD_BCN_2026-03-01_1_0_0_economy', [{'id': 'off_cached'}])
+
+        resultado = motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+
+        self.assertEqual(resultado[0]['id'], 'off_cached')
+        mock_post.assert_not_called()
+        self.assertEqual(motor.get_cache_stats()['hits'], 1)
+
+
+class TestCacheDosNiveles(unittest.TestCase):
+    """Tests para la caché L1 (proceso) + L2 (Redis)"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            self.motor = MotorBusqueda()
+        self.motor.redis_cache = Mock(available=True)
+
+    @patch('core.scraper_motor.http_transport.post')
+    @patch('core.scraper_motor.get_cached_flight_search')
+    def test_hit_l2_rellena_l1(self, mock_l2_get, mock_post):
+        mock_l2_get.return_value = [{'id': 'off_redis'}]
+
+        primera = self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+        segunda = self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+
+        self.assertEqual(primera[0]['id'], 'off_redis')
+        self.assertEqual(segunda[0]['id'], 'off_redis')
+        mock_l2_get.assert_called_once()
+        mock_post.assert_not_called()
+
+        stats = self.motor.get_cache_stats()
+        self.assertEqual(stats['l1']['hits'], 1)
+        self.assertEqual(stats['l2']['hits'], 1)
+
+    @patch('core.scraper_motor.cache_flight_search')
+    @patch('core.scraper_motor.get_cached_flight_search', return_value=None)
+    def test_miss_guarda_en_ambos_niveles(self, mock_l2_get, mock_l2_set):
+        with patch.object(self.motor, '_normalizar_seleccion', return_value=[{'id': 'off_1', 'precio': 10}]), \
+                patch('core.scraper_motor.http_transport.post') as mock_post:
+            mock_post.return_value = Mock(status_code=201, json=Mock(return_value={'data': {'offers': []}}))
+            self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+
+        mock_l2_set.assert_called_once()
+        self.assertEqual(mock_l2_set.call_args.kwargs['ttl'], self.motor.TIEMPO_CACHE_L2_SEGUNDOS)
+        self.assertEqual(self.motor.get_cache_stats()['l2']['lookups'], 1)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Tests para la coalescencia de búsquedas idénticas concurrentes"""
+
+    def test_llamadas_concurrentes_comparten_resultado(self):
+        import threading
+        import time as _time
+
+        sf = SingleFlight()
+        llamadas = []
+        resultados = []
+
+        def lenta():
+            llamadas.append(1)
+            _time.sleep(0.2)
+            return ['ok']
+
+        hilos = [threading.Thread(target=lambda: resultados.append(sf.do('k', lenta))) for _ in range(5)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [['ok']] * 5)
+        self.assertEqual(sf.coalesced, 4)
+        self.assertEqual(sf.in_flight(), 0)
+
+    @patch('core.scraper_motor.get_cached_flight_search')
+    @patch('core.scraper_motor.http_transport.post')
+    def test_lock_de_otro_worker_espera_resultado_l2(self, mock_post, mock_l2_get):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            motor = MotorBusqueda()
+        motor.redis_cache = Mock(available=True)
+        motor.redis_cache.acquire_lock.return_value = None  # otro worker ya está buscando
+        mock_l2_get.side_effect = [None, None, [{'id': 'off_otro_worker'}]]
+
+        with patch('core.scraper_motor.time.sleep'):
+            resultado = motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+
+        self.assertEqual(resultado[0]['id'], 'off_otro_worker')
+        mock_post.assert_not_called()
+        self.assertEqual(motor.get_cache_stats()['single_flight']['cross_worker_waits'], 1)
+
+
+class TestHTTPTransport(unittest.TestCase):
+    """Tests para el transporte HTTP compartido (keep-alive + timeouts por endpoint)"""
+
+    def test_timeouts_por_endpoint_y_override_env(self):
+        with patch.dict('os.environ', {'HTTP_TIMEOUT_DUFFEL_SEARCH': '7', 'HTTP_TIMEOUT_AMADEUS_AUTH': '1,4'}):
+            transport = HTTPTransport()
+
+        self.assertEqual(transport.get_timeout('duffel_search'), (3.05, 7.0))
+        self.assertEqual(transport.get_timeout('amadeus_auth'), (1.0, 4.0))
+        self.assertEqual(transport.get_timeout('desconocido'), transport.timeouts['default'])
+
+    def test_reutiliza_conexion_keep_alive(self):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        hilo = threading.Thread(target=server.serve_forever, daemon=True)
+        hilo.start()
+        try:
+            transport = HTTPTransport(pool_maxsize=2)
+            url = f"http://127.0.0.1:{server.server_port}/ping"
+            for _ in range(3):
+                self.assertEqual(transport.get(url, endpoint='duffel_places').json(), {'ok': True})
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        stats = transport.get_stats()['hosts']['127.0.0.1']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 2)
+
+
+class TestMotorBusquedaAsync(unittest.TestCase):
+    """Tests para el cliente asyncio de Duffel y su puente síncrono"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            self.motor = MotorBusqueda()
+        self.motor.redis_cache = None
+        self.motor.budget = RateBudget('test', redis_cache=Mock(available=False))
+        self.cliente = MotorBusquedaAsync(self.motor, concurrency=2)
+
+    def test_lote_concurrente_acotado_por_semaforo(self):
+        import asyncio
+
+        activas = {'ahora': 0, 'max': 0}
+
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            activas['ahora'] += 1
+            activas['max'] = max(activas['max'], activas['ahora'])
+            await asyncio.sleep(0.05)
+            activas['ahora'] -= 1
+            destino = kwargs['json']['data']['slices'][0]['destination']
+            return _RespuestaAsync(201, {}, '', {'data': {'offers': [{'id': f'off_{destino}', 'total_amount': '10.00'}]}})
+
+        consultas = [{'origen': 'MAD', 'destino': d, 'fecha': '2026-03-01'} for d in ('BCN', 'LIS', 'ROM', 'PAR')]
+        with patch.object(self.cliente, '_enviar', side_effect=fake_enviar), \
+             patch.object(self.motor, '_normalizar_seleccion', side_effect=lambda sel, o, d: [{'id': sel.ordenadas()[0]['id']}]):
+            resultados = self.cliente.buscar_vuelos_lote(consultas, timeout=5)
+
+        self.assertEqual([r[0]['id'] for r in resultados], ['off_BCN', 'off_LIS', 'off_ROM', 'off_PAR'])
+        self.assertEqual(activas['max'], 2)
+        # Los resultados quedan en la caché compartida con MotorBusqueda
+        self.assertEqual(self.motor.cache.get('MAD_BCN_2026-03-01_1_0_0_economy'), [{'id': 'off_BCN'}])
+
+    def test_busquedas_identicas_comparten_peticion(self):
+        import asyncio
+
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            await asyncio.sleep(0.05)
+            return _RespuestaAsync(201, {}, '', {'data': {'offers': []}})
+
+        consulta = {'origen': 'MAD', 'destino': 'BCN', 'fecha': '01/03/2026'}
+        with patch.object(self.cliente, '_enviar', side_effect=fake_enviar) as mock_request:
+            resultados = self.cliente.buscar_vuelos_lote([consulta] * 3, timeout=5)
+
+        self.assertEqual(resultados, [[], [], []])
+        self.assertEqual(mock_request.call_count, 1)
+        self.assertEqual(self.cliente.coalesced, 2)
+
+    def test_rate_limit_429_activa_cooldown(self):
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            return _RespuestaAsync(429, {'ratelimit-reset': '20'}, 'Too Many Requests', None)
+
+        with patch.object(self.cliente, '_enviar', side_effect=fake_enviar):
+            resultado = self.cliente.ejecutar(self.cliente.buscar_vuelos('MAD', 'BCN', '2026-03-01'), timeout=5)
+
+        self.assertEqual(resultado, [])
+        self.assertTrue(self.motor.is_rate_limited())
+        self.assertGreater(self.motor.budget.cooldown_remaining(), 15)
+
+    def test_detalle_de_orden_ignora_el_cooldown(self):
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            return _RespuestaAsync(200, {}, '', {'data': {'id': 'ord_1'}})
+
+        self.motor.budget.set_cooldown(30)
+        with patch.object(self.cliente, '_enviar', side_effect=fake_enviar):
+            datos = self.cliente.ejecutar(self.cliente._get_data('https://duffel/orders/ord_1', 'duffel_orders', 'orden'), timeout=5)
+        self.assertEqual(datos, {'id': 'ord_1'})
+
+    def test_redis_lento_no_bloquea_el_loop(self):
+        def leer_cache_lento(*args, **kwargs):
+            time.sleep(0.3)  # p.ej. Redis con latencia
+            return None
+
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            return _RespuestaAsync(201, {}, '', {'data': {'offers': []}})
+
+        consultas = [{'origen': 'MAD', 'destino': d, 'fecha': '2026-03-01'} for d in ('BCN', 'LIS', 'ROM', 'PAR')]
+        with patch.object(self.motor, '_leer_cache', side_effect=leer_cache_lento), \
+             patch.object(self.cliente, '_enviar', side_effect=fake_enviar):
+            inicio = time.monotonic()
+            resultados = self.cliente.buscar_vuelos_lote(consultas, timeout=5)
+
+        self.assertEqual(resultados, [[], [], [], []])
+        self.assertLess(time.monotonic() - inicio, 0.9)  # en serie sobre el loop serían 1.2 s
+
+    @patch('core.scraper_motor.get_cached_flight_search')
+    def test_lock_de_otra_peticion_espera_resultado_l2(self, mock_l2_get):
+        """Calendario/prewarm no repiten la búsqueda que ya hace un usuario u otro worker"""
+        enviar = Mock()
+        self.motor.redis_cache = Mock(available=True)
+        self.motor.redis_cache.acquire_lock.return_value = None
+        mock_l2_get.side_effect = [None, [{'id': 'off_otro_worker'}]]
+
+        with patch.object(self.motor, '_leer_cache', return_value=None), \
+             patch.object(self.cliente, '_enviar', enviar), \
+             patch('core.scraper_motor.time.sleep'):
+            resultado = self.cliente.ejecutar(self.cliente.buscar_vuelos('MAD', 'BCN', '2026-03-01'), timeout=5)
+
+        self.assertEqual(resultado, [{'id': 'off_otro_worker'}])
+        enviar.assert_not_called()
+        self.motor.redis_cache.acquire_lock.assert_called_once_with(
+            'vuelos:lock:MAD_BCN_2026-03-01_1_0_0_economy', ttl=self.motor.SINGLE_FLIGHT_LOCK_SECONDS
+        )
+
+    def test_lider_libera_el_lock_de_redis(self):
+        async def fake_enviar(method, url, endpoint, **kwargs):
+            return _RespuestaAsync(201, {}, '', {'data': {'offers': []}})
+
+        self.motor.redis_cache = Mock(available=True)
+        self.motor.redis_cache.acquire_lock.return_value = 'token_1'
+        with patch.object(self.motor, '_leer_cache', return_value=None), \
+             patch.object(self.motor, '_procesar_respuesta_busqueda', return_value=[]), \
+             patch.object(self.cliente, '_enviar', side_effect=fake_enviar):
+            self.cliente.ejecutar(self.cliente.buscar_vuelos('MAD', 'BCN', '2026-03-01'), timeout=5)
+
+        self.motor.redis_cache.release_lock.assert_called_once_with('vuelos:lock:MAD_BCN_2026-03-01_1_0_0_economy', 'token_1')
+
+
+class TestRateBudget(unittest.TestCase):
+    """Tests para el presupuesto Duffel compartido (token bucket + cooldown + prioridades)"""
+
+    def setUp(self):
+        self.budget = RateBudget('test', capacity=4, refill_per_second=0.01, background_reserve=0.5,
+                                 redis_cache=Mock(available=False))
+
+    def test_segundo_plano_respeta_reserva_interactiva(self):
+        # Reserva del 50%: segundo plano solo consume mientras queden >= 3 tokens
+        self.assertTrue(self.budget.acquire(PRIORIDAD_SEGUNDO_PLANO, timeout=0))
+        self.assertTrue(self.budget.acquire(PRIORIDAD_SEGUNDO_PLANO, timeout=0))
+        with self.assertRaises(PresupuestoAgotado):
+            self.budget.acquire(PRIORIDAD_SEGUNDO_PLANO, timeout=0)
+
+        self.assertTrue(self.budget.acquire(PRIORIDAD_INTERACTIVA, timeout=0))
+        self.assertTrue(self.budget.acquire(PRIORIDAD_INTERACTIVA, timeout=0))
+        with self.assertRaises(PresupuestoAgotado):
+            self.budget.acquire(PRIORIDAD_INTERACTIVA, timeout=0)
+
+    def test_cooldown_bloquea_a_todos(self):
+        self.budget.set_cooldown(30)
+        with self.assertRaises(PresupuestoAgotado) as ctx:
+            self.budget.acquire(PRIORIDAD_INTERACTIVA)
+        self.assertGreater(ctx.exception.retry_after, 25)
+
+    @patch('core.scraper_motor.http_transport.post')
+    def test_motor_sin_cupo_no_busca_en_duffel(self, mock_post):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            motor = MotorBusqueda()
+        motor.budget = self.budget
+        self.budget.set_cooldown(30)
+
+        resultado = motor._solicitar_vuelos_duffel('k', 'MAD', 'BCN', '2026-03-01', 1, 0, 0, 'economy')
+        self.assertEqual(resultado, [])
+        self.assertTrue(motor.is_rate_limited())
+        mock_post.assert_not_called()
+
+    @patch('core.scraper_motor.http_transport.post')
+    def test_pedido_ignora_el_cooldown(self, mock_post):
+        """Un 429 de búsquedas en segundo plano no debe tumbar la orden de un cliente"""
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            motor = MotorBusqueda()
+        motor.budget = self.budget
+        self.budget.set_cooldown(30)
+        mock_post.return_value = Mock(
+            status_code=201, json=Mock(return_value={'data': {'id': 'ord_1', 'booking_reference': 'ABC123'}})
+        )
+
+        resultado = motor.crear_order_duffel('off_123', [{'id': 'pas_1'}])
+
+        self.assertTrue(resultado['success'])
+        self.assertEqual(resultado['order_id'], 'ord_1')
+        mock_post.assert_called_once()
+        self.assertEqual(mock_post.call_args.kwargs['endpoint'], 'duffel_orders')
+
+
+def _oferta_cruda(offer_id, precio, origen='MAD', destino='BCN'):
+    """Oferta Duffel mínima con un segmento (para tests del pipeline)"""
+    return {
+        'id': offer_id,
+        'total_amount': precio,
+        'total_currency': 'EUR',
+        'owner': {'name': 'Test Airlines', 'iata_code': 'TA'},
+        'passengers': [{'id': 'pas_1', 'type': 'adult'}],
+        'slices': [{
+            'origin': {'iata_code': origen},
+            'destination': {'iata_code': destino},
+            'duration': 'PT1H30M',
+            'segments': [{
+                'origin': {'iata_code': origen, 'name': origen},
+                'destination': {'iata_code': destino, 'name': destino},
+                'operating_carrier': {'iata_code': 'TA', 'name': 'Test Airlines'},
+                'departing_at': '2026-03-01T10:00:00Z',
+                'arriving_at': '2026-03-01T11:30:00Z',
+                'duration': 'PT1H30M'
+            }]
+        }],
+        'conditions': {},
+        'available_services': []
+    }
+
+
+class TestPipelineTopK(unittest.TestCase):
+    """Tests para la selección top-K + normalización de supervivientes en _procesar_ofertas"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            self.motor = MotorBusqueda()
+        precios = [173, 95, 310, 95, 120, 88, 240, 150, 99, 205, 130, 101]
+        self.offers = [_oferta_cruda(f'off_{i}', f'{p}.00') for i, p in enumerate(precios)]
+
+    def test_top_k_igual_a_conjunto_completo_recortado(self):
+        completo = self.motor._procesar_ofertas(self.offers, 'MAD', 'BCN', top_k=None)
+        top = self.motor._procesar_ofertas(self.offers, 'MAD', 'BCN', top_k=4)
+
+        self.assertEqual(len(completo), len(self.offers))
+        self.assertEqual([o['id'] for o in top], [o['id'] for o in completo[:4]])
+        self.assertEqual([o['id'] for o in top], ['off_5', 'off_1', 'off_3', 'off_8'])
+
+    def test_oferta_invalida_se_sustituye_por_la_siguiente(self):
+        self.offers[5]['slices'][0]['segments'][0].pop('departing_at')  # la más barata no se puede normalizar
+        self.offers.append({'id': 'off_sin_precio'})
+
+        with patch.object(self.motor, '_normalizar_oferta', wraps=self.motor._normalizar_oferta) as normalizar:
+            top = self.motor._procesar_ofertas(self.offers, 'MAD', 'BCN', top_k=3)
+
+        self.assertEqual([o['id'] for o in top], ['off_1', 'off_3', 'off_8'])
+        # Solo se normalizan las supervivientes (y la fallida), no las 13 ofertas
+        self.assertEqual(normalizar.call_count, 4)
+
+    def test_parseo_streaming_de_offer_requests(self):
+        import io
+        import json
+        import requests
+
+        cuerpo = json.dumps({'data': {'id': 'orq_1', 'offers': self.offers, 'slices': []}}).encode()
+        response = requests.Response()
+        response.status_code = 201
+        response.raw = io.BytesIO(cuerpo)
+        self.motor.redis_cache = None
+        self.motor.search_results_limit = 3
+
+        with patch('core.scraper_motor.http_transport.post', return_value=response) as mock_post:
+            resultado = self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+
+        self.assertTrue(mock_post.call_args.kwargs['stream'])
+        self.assertEqual([o['id'] for o in resultado], ['off_5', 'off_1', 'off_3'])
+        self.assertEqual(resultado[0]['precio_base'], 88.0)
+
+
+class TestModeloCompacto(unittest.TestCase):
+    """Tests para las ofertas compactas en caché y los blobs resueltos por id"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            self.motor = MotorBusqueda()
+        self.offer = _oferta_cruda('off_compacta', '120.00')
+        self.offer['slices'][0]['segments'].append(dict(
+            self.offer['slices'][0]['segments'][0],
+            origin={'iata_code': 'BCN', 'name': 'Barcelona', 'city_name': 'Barcelona'},
+            destination={'iata_code': 'LIS', 'name': 'Lisboa'},
+            departing_at='2026-03-01T13:00:00Z',
+            arriving_at='2026-03-01T14:45:00Z',
+        ))
+        self.offer['conditions'] = {'change_before_departure': {'allowed': True, 'penalty_amount': '30.00'}}
+        self.offer['available_services'] = [
+            {'id': f'ase_{i}', 'type': 'baggage', 'total_amount': '25.00', 'total_currency': 'EUR',
+             'passenger_ids': ['pas_1'], 'segment_ids': ['seg_1'],
+             'metadata': {'type': 'checked', 'maximum_weight_kg': 23}}
+            for i in range(20)
+        ]
+
+    def test_to_dict_conserva_formato_json(self):
+        oferta = self.motor._procesar_ofertas([self.offer], 'MAD', 'LIS')[0]
+        datos = oferta.to_dict()
+
+        self.assertIsInstance(oferta, OfertaCompacta)
+        self.assertEqual(set(datos), {
+            'id', 'source', 'aerolinea', 'img_logo', 'origen', 'destino', 'trayectos', 'hora_salida',
+            'hora_llegada', 'duracion', 'precio_base', 'precio', 'currency', 'escala', 'segmentos',
+            'passengers', 'condiciones', 'con_maleta', 'available_services', 'familia_tarifaria'
+        })
+        self.assertEqual(datos['hora_salida'], '10:00')
+        self.assertEqual(datos['hora_llegada'], '14:45')
+        self.assertEqual(datos['escala'], 1)
+        self.assertEqual(datos['segmentos'], datos['trayectos'][0]['segmentos'])
+        self.assertEqual(datos['segmentos'][0]['escala_duracion'], '1h 30m')
+        self.assertEqual(datos['segmentos'][1]['img_logo'], 'https://pics.avs.io/64/64/TA.png')
+        self.assertEqual(datos['available_services'], self.offer['available_services'])
+        self.assertEqual(oferta.get('condiciones'), self.offer['conditions'])
+        self.assertEqual(oferta['segmentos'][1]['ciudad_salida'], 'Barcelona')
+
+    def test_entrada_de_cache_varias_veces_menor(self):
+        import pickle
+
+        oferta = self.motor._procesar_ofertas([self.offer], 'MAD', 'LIS')[0]
+        compacta = len(pickle.dumps([oferta], protocol=pickle.HIGHEST_PROTOCOL))
+        legado = len(pickle.dumps([oferta.to_dict()], protocol=pickle.HIGHEST_PROTOCOL))
+
+        self.assertLess(compacta * 4, legado)
+
+    @patch('core.scraper_motor.http_transport.get')
+    def test_blob_evictado_no_llama_a_duffel_al_serializar(self, mock_get):
+        oferta = self.motor._procesar_ofertas([self.offer], 'MAD', 'LIS')[0]
+        store = OfferBlobStore(max_entries=10, redis_cache=Mock(available=False))
+
+        with patch('core.offer_model.offer_blobs', store):
+            datos = oferta.to_dict()
+
+        mock_get.assert_not_called()
+        self.assertEqual(datos['available_services'], [])
+        self.assertEqual(datos['passengers'], self.offer['passengers'])  # necesario para reservar: en línea
+        # Las condiciones reales no dependen del blob: la lista no muestra "No reembolsable" por error
+        self.assertEqual(datos['condiciones'], self.offer['conditions'])
+        self.assertEqual(oferta['condiciones'], self.offer['conditions'])
+        self.assertEqual(store.get_stats()['misses'], 1)
+
+    def test_oferta_amadeus_completa_sobrevive_a_la_caché(self):
+        import pickle
+
+        crudo = {'id': '1', 'itineraries': [], 'price': {'grandTotal': '99.00'}}
+        oferta = OfertaCompacta('amadeus_1', 'Amadeus', 'IB', 'IB', 'MAD', 'BCN', '1h', [], 99.0, 99.0, 'EUR',
+                                False, 'Basic', extra={'reservable': True, 'amadeus_full_offer': crudo})
+        copia = pickle.loads(pickle.dumps(oferta))
+
+        with patch('core.offer_model.offer_blobs', OfferBlobStore(redis_cache=Mock(available=False))):
+            self.assertEqual(copia.to_dict()['amadeus_full_offer'], crudo)
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    """Tests para servir entradas stale con refresco en segundo plano y la caché negativa"""
+
+    def setUp(self):
+        with patch.dict('os.environ', {'DUFFEL_API_TOKEN': 'test_token_123'}):
+            self.motor = MotorBusqueda()
+        self.motor.redis_cache = None
+        self.cache_key = 'MAD_BCN_2026-03-01_1_0_0_economy'
+
+    def test_entrada_stale_se_sirve_y_refresca_una_vez(self):
+        import threading
+
+        self.motor.TIEMPO_CACHE_MINUTOS = 0  # cualquier entrada con datos queda stale al instante
+        self.motor._guardar_l1(self.cache_key, [{'id': 'off_stale'}])
+        liberar = threading.Event()
+        refresco = Mock(side_effect=lambda *a: liberar.wait(2))
+
+        with patch.object(self.motor, '_refrescar_busqueda', refresco), \
+             patch('core.scraper_motor.http_transport.post') as mock_post:
+            primera = self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+            segunda = self.motor.buscar_vuelos('MAD', 'BCN', '2026-03-01')
+            liberar.set()
+            self.motor._refrescos.shutdown(wait=True)
+
+        self.assertEqual(primera[0]['id'], 'off_stale')
+        self.assertEqual(segunda[0]['id'], 'off_stale')
+        refresco.assert_called_once()
+        mock_post.assert_not_called()
+        self.assertEqual(self.motor.get_cache_stats()['stale_while_revalidate']['stale_hits'], 2)
+
+    def test_429_usa_ttl_negativo_sin_pisar_datos(self):
+        respuesta = Mock(status_code=429, text='rate limited', headers={})
+
+        self.motor._procesar_respuesta_busqueda(respuesta, self.cache_key, 'MAD', 'BCN', '2026-03-01', 1, 0, 0, 'economy')
+        self.assertEqual(self.motor.cache.get(self.cache_key), [])
+        with patch('core.lru_cache.time.monotonic', return_value=time.monotonic() + self.motor.CACHE_NEGATIVA_SEGUNDOS + 1):
+            self.assertIsNone(self.motor.cache.get(self.cache_key))
+
+        self.motor._guardar_l1(self.cache_key, [{'id': 'off_ok'}])
+        self.motor._procesar_respuesta_busqueda(respuesta, self.cache_key, 'MAD', 'BCN', '2026-03-01', 1, 0, 0, 'economy')
+        self.assertEqual(self.motor.cache.get(self.cache_key)[0]['id'], 'off_ok')
+
+
 class TestMotorBusquedaSinToken(unittest.TestCase):
     """Tests para escenarios sin configuración"""
     
@@ -263,6 +833,15 @@ def run_tests():
     suite = unittest.TestSuite()
     
     suite.addTests(loader.loadTestsFromTestCase(TestMotorBusqueda))
+    suite.addTests(loader.loadTestsFromTestCase(TestCacheLRU))
+    suite.addTests(loader.loadTestsFromTestCase(TestCacheDosNiveles))
+    suite.addTests(loader.loadTestsFromTestCase(TestSingleFlight))
+    suite.addTests(loader.loadTestsFromTestCase(TestHTTPTransport))
+    suite.addTests(loader.loadTestsFromTestCase(TestMotorBusquedaAsync))
+    suite.addTests(loader.loadTestsFromTestCase(TestRateBudget))
+    suite.addTests(loader.loadTestsFromTestCase(TestPipelineTopK))
+    suite.addTests(loader.loadTestsFromTestCase(TestModeloCompacto))
+    suite.addTests(loader.loadTestsFromTestCase(TestStaleWhileRevalidate))
     suite.addTests(loader.loadTestsFromTestCase(TestMotorBusquedaSinToken))
     suite.addTests(loader.loadTestsFromTestCase(TestMotorBusquedaIntegration))
     
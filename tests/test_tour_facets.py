@@ -0,0 +1,113 @@
+"""
+Tests unitarios para core/tour_facets.py
+"""
+
+import unittest
+from unittest.mock import Mock
+import sys
+import os
+import time
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.tour_facets import FacetasTours, registrar_eventos
+
+
+class TestFacetasTours(unittest.TestCase):
+    """Tests para las facetas precalculadas del catálogo (una consulta, invalidación por commit, Redis)"""
+
+    def setUp(self):
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.dialects.postgresql import TSVECTOR
+        from sqlalchemy.ext.compiler import compiles
+        from sqlalchemy.orm import sessionmaker, Session
+        from sqlalchemy.pool import StaticPool
+        from database.models import Tour
+
+        @compiles(TSVECTOR, 'sqlite')
+        def _tsvector_sqlite(tipo, compilador, **kw):
+            return 'TEXT'
+
+        engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        Tour.__table__.create(engine)
+        self.Session = sessionmaker(bind=engine)
+        self.Tour = Tour
+
+        db = self.Session()
+        for i, (continente, pais, proveedor, precio, activo) in enumerate([
+            ('Europa', 'Italia', 'sama', 900.0, True),
+            ('Europa', 'Francia', 'sama', 450.0, True),
+            ('Asia', 'Japon', 'otro', 2100.0, True),
+            ('Asia', 'Japon', 'sama', 99999.0, False),
+        ]):
+            db.add(Tour(titulo=f'T{i}', slug=f't{i}', continente=continente, pais=pais, proveedor=proveedor,
+                        tipo_viaje='Cultural', precio_desde=precio, duracion_dias=5 + i, activo=activo, num_visitas=0))
+        db.commit()
+        db.close()
+
+        self.redis = {}
+        self.cache = Mock(available=True)
+        self.cache.get.side_effect = self.redis.get
+        self.cache.set.side_effect = lambda clave, valor, ttl: self.redis.__setitem__(clave, valor)
+        self.facetas = FacetasTours(self.Session, redis_cache=self.cache, comprobar_segundos=0, espera_segundos=0)
+
+        listeners = registrar_eventos(self.facetas)
+        for nombre, func in zip(('after_flush', 'after_commit', 'after_rollback'), listeners):
+            self.addCleanup(event.remove, Session, nombre, func)
+
+    def test_una_consulta_para_ambos_endpoints(self):
+        filtros = self.facetas.filtros_disponibles()
+        self.assertEqual(filtros['total_tours'], 3)
+        self.assertEqual(filtros['continentes'], [{'nombre': 'Europa', 'count': 2}, {'nombre': 'Asia', 'count': 1}])
+        self.assertEqual(filtros['proveedores'][0], {'nombre': 'sama', 'count': 2})
+        self.assertEqual((filtros['precio_min'], filtros['precio_max']), (450, 2100))
+        self.assertEqual(self.facetas.filtros_destinos()['tipos'], [{'nombre': 'Cultural', 'count': 3}])
+        self.assertEqual(self.facetas.get_stats()['refreshes'], 1)
+
+    def _esperar_refrescos(self, n):
+        for _ in range(100):
+            if self.facetas.get_stats()['refreshes'] >= n:
+                return
+            time.sleep(0.02)
+
+    def test_commit_de_campos_facetados_invalida(self):
+        self.facetas.obtener()
+        db = self.Session()
+        tour = db.query(self.Tour).filter_by(slug='t0').one()
+        tour.num_visitas += 1  # contador: no invalida
+        db.commit()
+        self.assertEqual(self.facetas.get_stats()['invalidations'], 0)
+
+        tour.precio_desde = 3000.0
+        db.commit()
+        db.close()
+        self._esperar_refrescos(2)
+        self.assertEqual(self.facetas.obtener()['precio_max'], 3000)
+
+        # Otro worker recoge la versión publicada en Redis sin consultar la base de datos
+        otro_worker = FacetasTours(session_factory=Mock(side_effect=AssertionError), redis_cache=self.cache, comprobar_segundos=0)
+        self.assertEqual(otro_worker.obtener()['precio_max'], 3000)
+        self.assertEqual(otro_worker.get_stats()['reloads_from_redis'], 1)
+
+    def test_varias_instantaneas_registradas_se_invalidan_todas(self):
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+
+        otra = FacetasTours(self.Session, redis_cache=Mock(available=False), espera_segundos=0)
+        otra.invalidar = Mock()
+        listeners = registrar_eventos(otra)
+        for nombre, func in zip(('after_flush', 'after_commit', 'after_rollback'), listeners):
+            self.addCleanup(event.remove, Session, nombre, func)
+
+        db = self.Session()
+        db.query(self.Tour).filter_by(slug='t1').one().activo = False
+        db.commit()
+        db.close()
+
+        self.assertEqual(self.facetas.get_stats()['invalidations'], 1)
+        otra.invalidar.assert_called_once_with('commit')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+"""
+Tests unitarios para core/tours_pagination.py
+"""
+
+import unittest
+from unittest.mock import Mock
+from datetime import datetime, timedelta
+import sys
+import os
+
+# Añadir el directorio raíz al path para imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.tours_pagination import (
+    ContadorTours, CursorInvalido, ORDENES_TOURS, claves_orden, aplicar_orden,
+    codificar_cursor, decodificar_cursor, pagina_keyset
+)
+
+
+class TestPaginacionKeyset(unittest.TestCase):
+    """Tests para la paginación por cursor de /api/tours/buscar (todos los órdenes, con NULLs)"""
+
+    @classmethod
+    def setUpClass(cls):
+        from sqlalchemy import create_engine, Column, Integer, Float, Boolean, DateTime
+        from sqlalchemy.orm import declarative_base, sessionmaker
+
+        Base = declarative_base()
+
+        class TourPrueba(Base):
+            __tablename__ = 'tours_prueba'
+            id = Column(Integer, primary_key=True)
+            precio_desde = Column(Float)
+            duracion_dias = Column(Integer)
+            num_solicitudes = Column(Integer)
+            num_visitas = Column(Integer)
+            destacado = Column(Boolean)
+            fecha_creacion = Column(DateTime)
+
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        cls.Modelo = TourPrueba
+        cls.session = sessionmaker(bind=engine)()
+        for i in range(1, 38):
+            cls.session.add(TourPrueba(
+                id=i,
+                precio_desde=[None, 99.0, 150.0, 150.0, 300.5][i % 5],
+                duracion_dias=[None, 3, 7][i % 3],
+                num_solicitudes=[None, 0, 2, 2][i % 4],
+                num_visitas=i % 6,
+                destacado=[True, False, None][i % 3],
+                fecha_creacion=None if i % 7 == 0 else datetime(2026, 1, 1) + timedelta(days=i % 4),
+            ))
+        cls.session.commit()
+
+    def _recorrer(self, query, claves, per_page=5):
+        vistos, valores = [], None
+        while len(vistos) <= 100:
+            # El cursor viaja como texto opaco entre peticiones
+            cursor = codificar_cursor('h', valores) if valores is not None else None
+            tours, valores = pagina_keyset(
+                query, claves, per_page, decodificar_cursor(cursor, 'h', len(claves)) if cursor else None
+            )
+            vistos += [t.id for t in tours]
+            if valores is None:
+                break
+        return vistos
+
+    def test_recorrer_por_cursor_igual_que_offset(self):
+        for sort in ORDENES_TOURS:
+            claves = claves_orden(self.Modelo, sort)
+            query = self.session.query(self.Modelo)
+            esperado = [t.id for t in aplicar_orden(query, claves).all()]
+            self.assertEqual(self._recorrer(query, claves), esperado, sort)
+
+    def test_ranking_con_empates_en_el_borde_de_pagina(self):
+        from sqlalchemy.dialects import postgresql
+
+        # Muchos empates de ranking (num_visitas va de 0 a 5): el desempate por id debe actuar
+        rank = self.Modelo.num_visitas * 0.1
+        for sort in ('relevancia', 'precio-asc'):
+            claves = claves_orden(self.Modelo, sort, rank)
+            query = self.session.query(self.Modelo)
+            esperado = [t.id for t in aplicar_orden(query, claves).all()]
+            self.assertEqual(self._recorrer(query, claves, per_page=4), esperado, sort)
+            self.assertEqual(len(set(esperado)), 37)
+
+        # En Postgres el ranking (real) se ordena y compara como double precision
+        sql = str(claves[0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn('AS FLOAT(53)', sql)
+
+    def test_cursor_ligado_a_filtros_y_total_cacheado(self):
+        cursor = codificar_cursor('filtros-a', [150.0, 4])
+        self.assertEqual(decodificar_cursor(cursor, 'filtros-a', 2), [150.0, 4])
+        with self.assertRaises(CursorInvalido):
+            decodificar_cursor(cursor, 'filtros-b', 2)
+        with self.assertRaises(CursorInvalido):
+            decodificar_cursor('no-es-un-cursor', 'filtros-a', 2)
+
+        contador = ContadorTours(redis_cache=Mock(available=False))
+        query = self.session.query(self.Modelo)
+        self.assertEqual(contador.contar(query, 'cached', 'f'), (37, False))
+        self.assertEqual(contador.contar(query.filter(self.Modelo.id < 5), 'cached', 'f'), (37, False))
+        self.assertEqual(contador.contar(query, 'estimated', 'g'), (37, False))  # sin Postgres: exacto
+        self.assertEqual(contador.contar(query, 'none', 'f'), (None, False))
+        self.assertEqual(contador.get_stats()['exact_counts'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()